@@ -0,0 +1,191 @@
+"""
+В данном файле описан индекс траектории по длине дуги: таблица, по которой состояние в любой точке s получается за O(1).
+
+ShortTrajectory.state(s) каждый раз интегрирует cos и sin угла направления от 0 до s. Регулятору движения или проверке
+столкновений, которые опрашивают много точек одного примитива (например, с частотой 100 Гц по многим активным примитивам),
+это обходится дорого. ArcLengthIndex один раз строит по траектории кусочно-полиномиальное представление x(s), y(s):
+[0, L] делится на n равных отрезков, значения x, y в узлах считаются одним накопленным интегрированием
+(integrator.cumulative), а на каждом отрезке x(s) и y(s) заменяются эрмитовыми полиномами 5 степени, которые совпадают
+с кривой в концах отрезка вместе с первой и второй производными (их мы знаем точно: x' = cos(theta), x'' = -k sin(theta),
+y' = sin(theta), y'' = k cos(theta)). Погрешность такого приближения убывает как h^6 (h - длина отрезка).
+
+Погрешность контролируется при построении: число отрезков удваивается, пока приближение по вдвое более грубой сетке не
+совпадёт с точными значениями в серединах её отрезков с точностью tol. В таблицу идёт более подробная сетка, так что
+её погрешность заведомо меньше tol. Угол направления и кривизна - полиномы, они считаются точно.
+
+Запрос: номер отрезка - int(s / h) (сетка равномерная), затем значение полинома 5 степени по схеме Горнера.
+"""
+
+import numpy as np
+from typing import Tuple
+from PRIM_structs import *
+
+
+
+def _quintic_hermite(p: np.ndarray, v: np.ndarray, acc: np.ndarray, h: float) -> np.ndarray:
+    """
+    Коэффициенты (n, 6) эрмитовых полиномов 5 степени по локальной переменной t = (s - s_i) / h на каждом из n отрезков.
+        p, v, acc: значения функции, первой и второй производной (по s) в n+1 узлах.
+    """
+
+    p0, p1 = p[:-1], p[1:]
+    v0, v1 = v[:-1] * h, v[1:] * h                 # производные по t
+    a0, a1 = acc[:-1] * h ** 2, acc[1:] * h ** 2
+    dp = p1 - p0
+    return np.stack([p0, v0, a0 / 2,
+                     10 * dp - 6 * v0 - 4 * v1 - 1.5 * a0 + 0.5 * a1,
+                     -15 * dp + 8 * v0 + 7 * v1 + 1.5 * a0 - a1,
+                     6 * dp - 3 * v0 - 3 * v1 - 0.5 * a0 + 0.5 * a1], axis=1)
+
+
+def _horner(coefs: np.ndarray, t):
+    result = coefs[..., 5]
+    for j in range(4, -1, -1):
+        result = result * t + coefs[..., j]
+    return result
+
+
+
+class ArcLengthIndex:
+    """
+    Таблица для быстрых запросов состояния траектории по длине дуги s. После построения от траектории не зависит
+    (её можно менять дальше). Точки s вне [0, length] прижимаются к концам траектории.
+
+        traj: траектория с установленными параметрами,
+        tol: допустимая погрешность координат x, y,
+        segments: начальное число отрезков (None - по одному на каждые 0.5 единицы длины),
+        max_segments: предельное число отрезков (если и с ним точность tol не достигнута, используется оно).
+    """
+
+    def __init__(self, traj: ShortTrajectory, tol: float = 1e-6, segments: int = None, max_segments: int = 1 << 16) -> None:
+        self.start = traj.start
+        self.length = float(traj.length)
+        self.theta_coefs = traj.theta_coefs()
+        self.k_coefs = np.array([traj.k0, traj.a, traj.b, traj.c])
+
+        n = max(1, int(np.ceil(self.length / 0.5))) if segments is None else max(1, segments)
+        while True:
+            coefs_x, coefs_y, error = self._build(traj.integrator, n)
+            if error <= tol or 2 * n > max_segments:
+                break
+            n *= 2
+        self.segments = 2 * n
+        self.step = self.length / self.segments
+        self.error = error  # оценка погрешности таблицы сверху (погрешность вдвое более грубой сетки)
+        self.coefs_x, self.coefs_y = coefs_x, coefs_y
+        # для запросов по одной точке - те же коэффициенты в виде обычных чисел (так в разы быстрее, чем через NumPy)
+        self._rows = [tuple(row) for row in np.hstack([coefs_x, coefs_y]).tolist()]
+        self._theta = tuple(self.theta_coefs.tolist())
+        self._k = tuple(self.k_coefs.tolist())
+
+
+    def _build(self, integrator, n: int):
+        # таблица на 2n отрезках и погрешность таблицы на n отрезках в серединах её отрезков
+        grid = np.linspace(0.0, self.length, 2 * n + 1)
+        xs, ys = integrator.cumulative(self.theta_coefs, grid)
+        thetas = np.polynomial.polynomial.polyval(grid, self.theta_coefs)
+        ks = np.polynomial.polynomial.polyval(grid, self.k_coefs)
+        cos, sin = np.cos(thetas), np.sin(thetas)
+        h = self.length / (2 * n)
+
+        fine_x = _quintic_hermite(xs, cos, -ks * sin, h)
+        fine_y = _quintic_hermite(ys, sin, ks * cos, h)
+        coarse_x = _quintic_hermite(xs[::2], cos[::2], -ks[::2] * sin[::2], 2 * h)
+        coarse_y = _quintic_hermite(ys[::2], sin[::2], ks[::2] * cos[::2], 2 * h)
+        error = max(np.max(np.abs(_horner(coarse_x, 0.5) - xs[1::2])), np.max(np.abs(_horner(coarse_y, 0.5) - ys[1::2])))
+        return fine_x, fine_y, float(error)
+
+
+    def _locate(self, s):
+        # номер отрезка и локальная переменная t в нём (для числа или массива s)
+        if self.step == 0.0:
+            return np.zeros_like(s, dtype=np.int64), np.zeros_like(s, dtype=float)
+        u = np.clip(s, 0.0, self.length) / self.step
+        i = np.minimum(np.floor(u), self.segments - 1).astype(np.int64)
+        return i, u - i
+
+
+    def position(self, s: float) -> Tuple[float, float]:
+        """ Координаты (x, y) точки s. """
+
+        if self.step == 0.0:
+            return self.start.x, self.start.y
+        u = min(max(float(s), 0.0), self.length) / self.step
+        i = min(int(u), self.segments - 1)
+        t = u - i
+        x0, x1, x2, x3, x4, x5, y0, y1, y2, y3, y4, y5 = self._rows[i]
+        return (self.start.x + x0 + t * (x1 + t * (x2 + t * (x3 + t * (x4 + t * x5)))),
+                self.start.y + y0 + t * (y1 + t * (y2 + t * (y3 + t * (y4 + t * y5)))))
+
+
+    def positions(self, s: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Координаты x, y во всех точках массива s. """
+
+        i, t = self._locate(np.asarray(s, dtype=float))
+        return self.start.x + _horner(self.coefs_x[i], t), self.start.y + _horner(self.coefs_y[i], t)
+
+
+    def heading(self, s):
+        """ Угол направления в точке (или точках) s. """
+        return np.polynomial.polynomial.polyval(np.clip(s, 0.0, self.length), self.theta_coefs)
+
+
+    def curvature(self, s):
+        """ Кривизна в точке (или точках) s. """
+        return np.polynomial.polynomial.polyval(np.clip(s, 0.0, self.length), self.k_coefs)
+
+
+    def state(self, s: float) -> State:
+        """ Состояние в точке s (то же, что ShortTrajectory.state(s), но без интегрирования). """
+
+        x, y = self.position(s)
+        s = min(max(float(s), 0.0), self.length)
+        theta0, k0, a2, b3, c4 = self._theta
+        _, a, b, c = self._k
+        return State(x, y, theta0 + s * (k0 + s * (a2 + s * (b3 + s * c4))), k0 + s * (a + s * (b + s * c)))
+
+
+    def states(self, s: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """ Массивы x, y, theta, k во всех точках массива s (как sample_states, но в произвольных точках). """
+
+        s = np.asarray(s, dtype=float)
+        xs, ys = self.positions(s)
+        return xs, ys, self.heading(s), self.curvature(s)
+
+
+    def project(self, points: np.ndarray, iters: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Ближайшие точки траектории для точек плоскости points (M, 2) (или одной точки (2,)).
+        Возвращает длины дуги s (M,) ближайших точек и расстояния (M,) до них.
+
+        Сначала для каждой точки выбирается ближайший узел таблицы, затем положение уточняется несколькими шагами метода
+        Ньютона для условия перпендикулярности (P(s) - q) . T(s) = 0 (T - касательная) в пределах соседних с узлом отрезков.
+        """
+
+        points = np.asarray(points, dtype=float)
+        single = points.ndim == 1
+        points = points.reshape(-1, 2)
+
+        grid = np.linspace(0.0, self.length, self.segments + 1)
+        node_x = np.append(self.coefs_x[:, 0], _horner(self.coefs_x[-1], 1.0)) + self.start.x
+        node_y = np.append(self.coefs_y[:, 0], _horner(self.coefs_y[-1], 1.0)) + self.start.y
+        nearest = np.argmin((points[:, :1] - node_x) ** 2 + (points[:, 1:] - node_y) ** 2, axis=1)  # (M,)
+        s = grid[nearest]
+        low, high = np.maximum(s - self.step, 0.0), np.minimum(s + self.step, self.length)
+
+        for _ in range(iters):
+            xs, ys, thetas, ks = self.states(s)
+            cos, sin = np.cos(thetas), np.sin(thetas)
+            dx, dy = xs - points[:, 0], ys - points[:, 1]
+            g = dx * cos + dy * sin                 # производная половины квадрата расстояния по s
+            dg = 1.0 + ks * (dy * cos - dx * sin)   # её производная
+            with np.errstate(divide='ignore', invalid='ignore'):
+                s_new = np.where(dg > 1e-12, s - g / dg, s - np.sign(g) * self.step / 2)
+            s = np.clip(s_new, low, high)
+
+        xs, ys = self.positions(s)
+        distance = np.hypot(xs - points[:, 0], ys - points[:, 1])
+        node_distance = np.hypot(node_x[nearest] - points[:, 0], node_y[nearest] - points[:, 1])
+        worse = node_distance < distance  # Ньютон увёл дальше, чем ближайший узел (например, на изломе петли)
+        s[worse], distance[worse] = grid[nearest][worse], node_distance[worse]
+        return (s[0], distance[0]) if single else (s, distance)
@@ -0,0 +1,184 @@
+"""
+В данном файле описана векторизованная проверка примитивов на столкновения с препятствиями на карте-сетке.
+
+Карта - двумерный массив NumPy grid занятости клеток: grid[iy, ix] истинно (или ненулевое), если клетка (ix, iy) занята.
+Клетка (ix, iy) - квадрат со стороной resolution с центром в точке (ix * resolution, iy * resolution), вершины решётки
+планировщика лежат в центрах клеток (как в PRIM_footprint.py).
+
+Агент задаётся набором кругов (VehicleFootprint): один круг - агент-точка с запасом, несколько кругов вдоль продольной оси -
+приближение прямоугольного корпуса. Для каждого примитива (примитивы control set не зависят от вершины, из которой выходят,
+поэтому достаточно одного канонического экземпляра) один раз считаются смещения (dx, dy) всех клеток, которые задевает
+какой-нибудь из кругов при движении по примитиву. Растеризация консервативная, как в PRIM_footprint.compute_footprints:
+радиус круга увеличивается на половину наибольшего расстояния между соседними семплами его центра.
+
+После этого проверка S стартовых клеток сразу для всех N примитивов - это одна выборка grid[cells_y, cells_x] по массиву
+индексов (S, K) (K - суммарное число клеток всех примитивов) и логическое "или" по клеткам каждого примитива
+(np.logical_or.reduceat). Раскрытие вершины решётки - одна такая операция над всем control set.
+"""
+
+import numpy as np
+from typing import Optional, Sequence, Tuple
+from PRIM_structs import *
+from PRIM_footprint import rasterize_polyline
+
+
+
+CHECK_CHUNK_ELEMENTS = 1 << 20  # сколько пар (стартовая клетка, клетка примитива) проверяется за один векторный проход
+
+
+class VehicleFootprint:
+    """
+    Форма агента - объединение кругов, заданных в системе координат агента.
+
+        discs: массив (D, 3) - для каждого круга смещение центра вперёд (вдоль направления движения) и влево от
+               опорной точки агента (точки, которая движется по примитиву), и радиус.
+    """
+
+    def __init__(self, discs) -> None:
+        self.discs = np.asarray(discs, dtype=float).reshape(-1, 3)
+        assert len(self.discs) > 0 and np.all(self.discs[:, 2] >= 0), "Нужен хотя бы один круг неотрицательного радиуса!"
+
+    @classmethod
+    def disc(cls, radius: float) -> "VehicleFootprint":
+        """ Один круг радиуса radius с центром в опорной точке. """
+        return cls([[0.0, 0.0, radius]])
+
+    @classmethod
+    def rectangle(cls, length: float, width: float, count: int = 3, rear: float = 0.0) -> "VehicleFootprint":
+        """
+        count одинаковых кругов, которые вместе покрывают прямоугольник length x width. Опорная точка отстоит на rear от
+        заднего края прямоугольника (например, rear - расстояние до задней оси), rear = length / 2 - центр прямоугольника.
+        """
+
+        piece = length / count
+        centers = -rear + piece * (np.arange(count) + 0.5)  # центры равных частей прямоугольника вдоль оси
+        radius = np.hypot(piece / 2, width / 2)              # круг, описанный вокруг части
+        return cls(np.column_stack([centers, np.zeros(count), np.full(count, radius)]))
+
+    @property
+    def is_centered_disc(self) -> bool:
+        return len(self.discs) == 1 and self.discs[0, 0] == 0.0 and self.discs[0, 1] == 0.0
+
+
+
+def _sampled_states(source, i: int, ds: float) -> np.ndarray:
+    # ломаная (n, 4) из x, y, theta, k i-го примитива: из библиотеки, если там есть семплы, иначе семплированием
+    if getattr(source, "has_samples", False):
+        return np.asarray(source.samples(i))
+    prims = source.primitives if hasattr(source, "primitives") else source
+    return np.column_stack(prims.trajectory(i).sample_states(ds))
+
+
+
+def footprint_cells(states: np.ndarray, start: Tuple[float, float], resolution: float,
+                    footprint: VehicleFootprint) -> np.ndarray:
+    """
+    Клетки (M, 2) - смещения (dx, dy) относительно клетки старта, которые задевает агент формы footprint при движении
+    через состояния states (n, 4) (x, y, theta, k) ломаной примитива, выходящего из точки start.
+    """
+
+    points = states[:, :2] - np.asarray(start, dtype=float)
+    cos, sin = np.cos(states[:, 2]), np.sin(states[:, 2])
+    cells = []
+    for forward, left, radius in footprint.discs:
+        centers = points + np.column_stack([forward * cos - left * sin, forward * sin + left * cos])
+        gap = np.max(np.hypot(*np.diff(centers, axis=0).T)) if len(centers) > 1 else 0.0  # шаг семплов центра круга
+        cells.append(rasterize_polyline(centers, resolution, radius + gap / 2))
+    return np.unique(np.concatenate(cells), axis=0)
+
+
+
+class CollisionChecker:
+    """
+    Заранее посчитанные клетки примитивов набора для проверки на столкновения с картой.
+
+        source: набор примитивов PrimitiveArray или библиотека PrimitiveLibrary (если в ней сохранены ломаные, они и
+                используются; если сохранены заметаемые клетки для того же шага сетки и агента-круга с центром в опорной
+                точке - используются они, без пересчёта),
+        resolution: шаг сетки карты,
+        footprint: форма агента (None - точка),
+        ds: шаг семплирования примитивов, если их приходится семплировать (None - четверть шага сетки).
+
+    Несошедшиеся примитивы (и примитивы без клеток) считаются всегда недопустимыми.
+    """
+
+    def __init__(self, source, resolution: float, footprint: Optional[VehicleFootprint] = None, ds: Optional[float] = None) -> None:
+        self.resolution = float(resolution)
+        self.footprint = VehicleFootprint.disc(0.0) if footprint is None else footprint
+        prims = source.primitives if hasattr(source, "primitives") else source
+        ds = self.resolution / 4 if ds is None else ds
+
+        stored = getattr(source, "footprints", None)
+        reuse = (stored is not None and stored.resolution == self.resolution and self.footprint.is_centered_disc
+                 and stored.radius == self.footprint.discs[0, 2])
+
+        per_prim = []
+        for i in range(len(prims)):
+            cells = np.zeros((0, 2), dtype=np.int64)
+            if prims.data["status"][i] == STATUS_CONVERGED:
+                if reuse:
+                    cells = stored.cells(i)
+                else:
+                    cells = footprint_cells(_sampled_states(source, i, ds), prims.data["start"][i, :2], self.resolution,
+                                            self.footprint)
+            per_prim.append(cells)
+
+        counts = np.array([len(cells) for cells in per_prim], dtype=np.int64)
+        self.size = len(prims)
+        self.usable = counts > 0                                       # примитивы, которые вообще можно проверять
+        self.offsets = np.concatenate([[0], np.cumsum(counts[self.usable])])[:-1]  # начала клеток примитивов в cells
+        self.cells = np.concatenate(per_prim).astype(np.int64) if per_prim else np.zeros((0, 2), dtype=np.int64)
+        self.counts = counts
+
+
+    def __len__(self) -> int:
+        return self.size
+
+
+    def check(self, grid: np.ndarray, starts, subset: Optional[Sequence[int]] = None, outside_free: bool = False) -> np.ndarray:
+        """
+        Маска (S, N) допустимых (не задевающих занятых клеток) примитивов для каждой из S стартовых клеток.
+
+            grid: карта занятости (H, W), grid[iy, ix],
+            starts: стартовые клетки (S, 2) - пары (ix, iy) (или одна пара),
+            subset: номера проверяемых примитивов (например, примитивы с нужным начальным углом направления); тогда маска
+                    имеет размер (S, len(subset)),
+            outside_free: считать ли клетки за пределами карты свободными (по умолчанию - занятыми).
+        """
+
+        grid = np.asarray(grid).astype(bool, copy=False)
+        starts = np.asarray(starts, dtype=np.int64).reshape(-1, 2)
+        ids = np.arange(self.size) if subset is None else np.asarray(subset, dtype=np.int64)
+
+        usable = self.usable[ids]
+        if subset is None:
+            cells, offsets = self.cells, self.offsets
+        else:  # клетки только выбранных примитивов (подряд, в порядке subset)
+            starts_all = np.concatenate([[0], np.cumsum(self.counts)])
+            chosen = ids[usable]
+            lengths = self.counts[chosen]
+            first = np.repeat(starts_all[chosen] - np.concatenate([[0], np.cumsum(lengths)])[:-1], lengths)
+            cells = self.cells[np.arange(int(np.sum(lengths))) + first]
+            offsets = np.concatenate([[0], np.cumsum(lengths)])[:-1]
+
+        free = np.zeros((len(starts), len(ids)), dtype=bool)
+        if len(offsets) == 0:
+            return free
+        height, width = grid.shape
+        flat_grid = grid.ravel()
+        step = max(1, CHECK_CHUNK_ELEMENTS // len(cells))  # стартов за раз: массивы (step, K) не должны быть слишком большими
+        for lo in range(0, len(starts), step):
+            chunk = starts[lo:lo + step]
+            xs = chunk[:, :1] + cells[:, 0]  # (S, K)
+            ys = chunk[:, 1:] + cells[:, 1]
+            inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+            hit = flat_grid[np.where(inside, ys * width + xs, 0)]
+            hit = (hit & inside) | (~inside & (not outside_free))
+            free[lo:lo + step, usable] = ~np.logical_or.reduceat(hit, offsets, axis=1)
+        return free
+
+
+    def check_node(self, grid: np.ndarray, cell, subset: Optional[Sequence[int]] = None, outside_free: bool = False) -> np.ndarray:
+        """ Маска (N,) допустимых примитивов из одной клетки cell = (ix, iy) - раскрытие вершины решётки. """
+        return self.check(grid, [cell], subset, outside_free)[0]
+
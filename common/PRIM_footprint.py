@@ -0,0 +1,171 @@
+"""
+В данном файле описаны заметаемые клетки (footprint) примитивов движения: какие клетки сетки задевает агент,
+проезжая по примитиву.
+
+Планировщику на решётке (например, MeshA*) при раскрытии вершины нужно проверить, не задевает ли примитив препятствия.
+Вместо того чтобы каждый раз семплировать кривую, для каждого примитива control set заранее (один раз) считается список
+занятых клеток при заданном шаге сетки resolution и радиусе агента radius (агент - круг). Растеризация консервативная:
+клетка считается занятой, если квадрат клетки пересекает круг радиуса radius + h/2 вокруг какой-нибудь точки ломаной,
+где h - шаг семплирования (любая точка кривой удалена от ближайшей точки ломаной не больше чем на h/2 по длине дуги, а значит и
+по расстоянию), поэтому ни одна действительно задетая клетка не теряется.
+
+Клетки нумеруются смещениями (dx, dy) относительно клетки, в которой находится start примитива: клетка (i, j) - это квадрат
+со стороной resolution с центром в точке start + (i * resolution, j * resolution) (центры клеток - узлы решётки).
+Списки клеток хранятся сжатыми построчно (run-length encoding): каждая серия - тройка (dy, dx_start, length) - подряд идущие
+клетки строки dy. Серии всех примитивов лежат в одном массиве, i-му примитиву принадлежат серии с offsets[i] по offsets[i+1]
+(так же, как ломаные в PRIM_library.py), поэтому footprint'ы записываются в библиотеку примитивов отдельной секцией.
+
+Обратный индекс (reverse index) для каждой клетки хранит номера примитивов, которые её задевают. Тогда проверка примитивов
+на столкновения сводится к поиску по множеству: примитивы, задевающие занятые клетки окрестности вершины, запрещены.
+"""
+
+import numpy as np
+from typing import Optional
+from PRIM_structs import *
+
+
+
+RUN_DTYPE = np.dtype("<i4")  # тип элементов серий (dy, dx_start, length)
+
+
+
+def rasterize_polyline(points: np.ndarray, resolution: float, radius: float) -> np.ndarray:
+    """
+    Клетки (M, 2) - смещения (dx, dy), которые задевает круг радиуса radius, центр которого пробегает точки points (n, 2)
+    (координаты относительно start). Проверяется пересечение круга с квадратом клетки, а не только попадание центра.
+    """
+
+    reach = int(np.ceil(radius / resolution)) + 1
+    offsets = np.arange(-reach, reach + 1)
+    centers = np.floor(points / resolution + 0.5).astype(np.int64)       # клетка, в которую попадает точка
+    cells = centers[:, None, None, :] + np.stack(np.meshgrid(offsets, offsets, indexing="ij"), axis=-1)  # (n, w, w, 2)
+    gap = np.maximum(np.abs(points[:, None, None, :] - cells * resolution) - resolution / 2, 0.0)    # до квадрата клетки
+    touched = np.sum(gap ** 2, axis=-1) <= radius ** 2
+    return np.unique(cells[touched], axis=0).reshape(-1, 2)
+
+
+
+def rle_encode(cells: np.ndarray) -> np.ndarray:
+    """ Сжимает набор клеток (M, 2) в серии (K, 3): (dy, dx_start, length). """
+
+    if len(cells) == 0:
+        return np.zeros((0, 3), dtype=RUN_DTYPE)
+    cells = cells[np.lexsort((cells[:, 0], cells[:, 1]))]  # по строкам dy, внутри строки - по dx
+    breaks = np.flatnonzero((np.diff(cells[:, 1]) != 0) | (np.diff(cells[:, 0]) != 1)) + 1
+    starts = np.concatenate([[0], breaks])
+    lengths = np.diff(np.concatenate([starts, [len(cells)]]))
+    return np.column_stack([cells[starts, 1], cells[starts, 0], lengths]).astype(RUN_DTYPE)
+
+
+
+def rle_decode(runs: np.ndarray) -> np.ndarray:
+    """ Разворачивает серии (K, 3) обратно в клетки (M, 2) со столбцами dx, dy. """
+
+    runs = np.asarray(runs, dtype=np.int64).reshape(-1, 3)
+    lengths = runs[:, 2]
+    first = np.repeat(np.cumsum(lengths) - lengths, lengths)  # номер первой клетки серии для каждой клетки
+    dx = np.repeat(runs[:, 1], lengths) + np.arange(int(np.sum(lengths))) - first
+    return np.column_stack([dx, np.repeat(runs[:, 0], lengths)])
+
+
+
+class Footprints:
+    """
+    Заметаемые клетки набора из N примитивов (в сжатом виде) и обратный индекс по клеткам.
+
+        resolution, radius: шаг сетки и радиус агента, для которых посчитаны клетки,
+        offsets: (N+1,) - границы серий каждого примитива в массиве runs,
+        runs: (K, 3) - серии (dy, dx_start, length) всех примитивов подряд.
+    """
+
+    __slots__ = ("resolution", "radius", "offsets", "runs", "_index_keys", "_index_starts", "_index_prims")
+
+    def __init__(self, resolution: float, radius: float, offsets: np.ndarray, runs: np.ndarray) -> None:
+        self.resolution = float(resolution)
+        self.radius = float(radius)
+        self.offsets = offsets
+        self.runs = runs
+        self._index_keys = None  # обратный индекс строится лениво, при первом обращении
+
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+    def cells(self, i: int) -> np.ndarray:
+        """ Клетки (M, 2) - смещения (dx, dy), которые задевает i-й примитив. """
+        return rle_decode(self.runs[int(self.offsets[i]):int(self.offsets[i + 1])])
+
+
+    @staticmethod
+    def _pack(dx, dy):
+        return (np.asarray(dx, dtype=np.int64) << 32) + np.asarray(dy, dtype=np.int64)  # клетка -> одно целое число
+
+
+    def _build_index(self) -> None:
+        cells = rle_decode(self.runs)
+        runs_per_prim = np.diff(np.asarray(self.offsets, dtype=np.int64))
+        cells_per_run = np.asarray(self.runs[:, 2], dtype=np.int64)
+        prim_of_run = np.repeat(np.arange(len(self)), runs_per_prim)
+        prims = np.repeat(prim_of_run, cells_per_run)
+        keys = self._pack(cells[:, 0], cells[:, 1])
+        order = np.argsort(keys, kind="stable")
+        keys, self._index_prims = keys[order], prims[order]
+        self._index_keys, first = np.unique(keys, return_index=True)
+        self._index_starts = np.append(first, len(keys))
+
+
+    def touching(self, dx: int, dy: int) -> np.ndarray:
+        """ Номера примитивов, задевающих клетку со смещением (dx, dy) (обратный индекс). """
+
+        if self._index_keys is None:
+            self._build_index()
+        key = self._pack(dx, dy)
+        j = np.searchsorted(self._index_keys, key)
+        if j == len(self._index_keys) or self._index_keys[j] != key:
+            return np.zeros(0, dtype=np.int64)
+        return self._index_prims[self._index_starts[j]:self._index_starts[j + 1]]
+
+
+    def blocked(self, occupied: np.ndarray) -> np.ndarray:
+        """
+        Маска (N,) примитивов, задевающих хотя бы одну из занятых клеток.
+            occupied: (M, 2) - смещения (dx, dy) занятых клеток относительно клетки, из которой выходят примитивы.
+        """
+
+        if self._index_keys is None:
+            self._build_index()
+        occupied = np.asarray(occupied, dtype=np.int64).reshape(-1, 2)
+        keys = self._pack(occupied[:, 0], occupied[:, 1])
+        j = np.clip(np.searchsorted(self._index_keys, keys), 0, max(len(self._index_keys) - 1, 0))
+        hit = j[self._index_keys[j] == keys] if len(self._index_keys) else j[:0]
+        mask = np.zeros(len(self), dtype=bool)
+        for start, end in zip(self._index_starts[hit], self._index_starts[hit + 1]):
+            mask[self._index_prims[start:end]] = True
+        return mask
+
+
+
+def compute_footprints(prims: PrimitiveArray, resolution: float, radius: float = 0.0, ds: Optional[float] = None) -> Footprints:
+    """
+    Считает заметаемые клетки всех примитивов набора (несошедшиеся примитивы получают пустой список).
+
+        prims: набор примитивов,
+        resolution: шаг сетки,
+        radius: радиус агента (0 - агент-точка),
+        ds: шаг семплирования кривой (None - четверть шага сетки).
+    """
+
+    ds = resolution / 4 if ds is None else ds
+    offsets, runs = np.zeros(len(prims) + 1, dtype="<u8"), []
+    for i in range(len(prims)):
+        encoded = np.zeros((0, 3), dtype=RUN_DTYPE)
+        if prims.data["status"][i] == STATUS_CONVERGED:
+            traj = prims.trajectory(i)
+            grid = traj.sample_s(ds)
+            xs, ys, _, _ = traj.sample_states(ds)
+            points = np.column_stack([xs - traj.start.x, ys - traj.start.y])
+            encoded = rle_encode(rasterize_polyline(points, resolution, radius + (grid[1] - grid[0]) / 2))
+        runs.append(encoded)
+        offsets[i + 1] = offsets[i] + len(encoded)
+    return Footprints(resolution, radius, offsets, np.concatenate(runs) if runs else np.zeros((0, 3), dtype=RUN_DTYPE))
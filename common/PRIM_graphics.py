@@ -75,8 +75,7 @@ def create_live_visualizer(start_state: State, target_state: State,
         if iter % frequency != 0:  # отрисовываем раз в frequency итераций
             return
         
-        xs = trajectory.sample_x()  # получаем новые координаты точек траектории
-        ys = trajectory.sample_y()
+        xs, ys, _, _ = trajectory.sample_states()  # получаем новые координаты точек траектории (за один проход)
 
         line.set_data(xs, ys)       # ОБНОВЛЯЕМ данные в существующих объектах (очень быстро)
         if len(xs) > 0:             # обновляем точку конца траектории (опционально)
@@ -146,8 +145,7 @@ def show_trajectory(traj: ShortTrajectory, col: str = 'r', arrow: bool = True, a
     
     board = plt if (ax is None) else ax  # определяем, где рисовать
     
-    xc = traj.sample_x()  # получаем набор точек кривой, изобразив которые, получим вид траектории
-    yc = traj.sample_y()
+    xc, yc, _, _ = traj.sample_states()  # получаем набор точек кривой, изобразив которые, получим вид траектории
     board.plot(xc, yc, "-"+col)
     
     if arrow:
@@ -165,8 +163,7 @@ def redraw_trajectory(prim: ShortTrajectory, col: str = 'r') -> None:
         col: цвет траектории.
     """
     
-    xc = prim.sample_x()  # точки траектории 
-    yc = prim.sample_y()      
+    xc, yc, _, _ = prim.sample_states()  # точки траектории 
     x, y, theta = prim.goal.x, prim.goal.y, prim.goal.theta  # финальные координаты и угол направления (к которым траектория стремится)
     
     clear_output(wait=True)  # очищаем предыдущий вывод
@@ -0,0 +1,174 @@
+"""
+В данном файле описан бинарный формат библиотеки примитивов движения (файла с целым control set) и функции для его записи и чтения.
+
+Файл устроен так (все числа - little-endian):
+    заголовок (96 байт): сигнатура LIBRARY_MAGIC, версия формата, размер записи, число примитивов,
+                          смещение и размер секции с семплами, шаг семплирования,
+                          смещение и размер секции с заметаемыми клетками, шаг сетки и радиус агента для них,
+    записи примитивов: N записей фиксированной длины с типом PRIMITIVE_DTYPE (см. PRIM_structs.PrimitiveArray),
+    (необязательно) секция семплов: N+1 смещений (uint64), а затем точки всех ломаных подряд - массив (M, 4) из x, y, theta, k.
+                          Точки i-го примитива - это строки с offsets[i] по offsets[i+1].
+    (необязательно) секция заметаемых клеток: N+1 смещений (uint64), а затем серии всех примитивов подряд - массив (K, 3)
+                          из int32 (dy, dx_start, length), см. PRIM_footprint.py.
+
+Чтение делается через np.memmap: файл не загружается в память целиком и не распаковывается (как было бы с pickle),
+поэтому даже библиотека из миллионов примитивов открывается за миллисекунды, а страницы файла разделяются
+между всеми процессами-обработчиками, открывшими одну и ту же библиотеку.
+"""
+
+import numpy as np
+import os
+import struct
+from typing import Optional
+from PRIM_structs import *
+from PRIM_footprint import Footprints, RUN_DTYPE
+
+
+
+LIBRARY_MAGIC = b"PRIMLIB\0"  # сигнатура файла библиотеки
+LIBRARY_VERSION = 3           # версия формата (2 - в записи примитива добавлен столбец curvature_cost, 3 - секция заметаемых клеток)
+HEADER_FORMAT = "<8sIIQQQdQQdd16x"  # сигнатура, версия, размер записи, число примитивов, смещение секции семплов, число точек, шаг,
+                                    # смещение секции клеток, число серий, шаг сетки, радиус агента, выравнивание
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)  # = 96 байт
+
+RECORD_DTYPE = PRIMITIVE_DTYPE.newbyteorder("<")  # тип записи на диске (явно little-endian)
+SAMPLE_DTYPE = np.dtype("<f8")
+
+
+
+def _align(offset: int, alignment: int = 8) -> int:
+    return (offset + alignment - 1) // alignment * alignment
+
+
+
+def save_library(filename: str, prims: PrimitiveArray, sample_ds: Optional[float] = None,
+                 footprints: Optional[Footprints] = None) -> None:
+    """
+    Записывает набор примитивов в файл библиотеки.
+
+        filename: имя файла,
+        prims: набор примитивов,
+        sample_ds: если задан, то для каждого сошедшегося примитива дополнительно сохраняется заранее посчитанная ломаная
+                   (точки x, y, theta, k с шагом sample_ds, см. ShortTrajectory.sample_states); у несошедшихся ломаная пустая,
+        footprints: (необязательно) заметаемые клетки примитивов (см. PRIM_footprint.compute_footprints).
+    """
+
+    records = prims.data.astype(RECORD_DTYPE)
+    records_end = HEADER_SIZE + records.nbytes
+    samples_offset, samples_count = 0, 0
+
+    offsets, polylines = None, []
+    if sample_ds is not None:
+        offsets = np.zeros(len(prims) + 1, dtype="<u8")
+        for i in range(len(prims)):
+            if prims.data["status"][i] == STATUS_CONVERGED:
+                polylines.append(np.column_stack(prims.trajectory(i).sample_states(sample_ds)))
+            else:
+                polylines.append(np.zeros((0, 4)))
+            offsets[i + 1] = offsets[i] + len(polylines[-1])
+        samples_offset, samples_count = _align(records_end), int(offsets[-1])
+    samples_end = records_end if offsets is None else samples_offset + 8 * len(offsets) + 32 * samples_count
+
+    footprints_offset, footprints_count, resolution, radius = 0, 0, 0.0, 0.0
+    if footprints is not None:
+        assert len(footprints) == len(prims), "Число footprint'ов должно совпадать с числом примитивов!"
+        footprints_offset, footprints_count = _align(samples_end), len(footprints.runs)
+        resolution, radius = footprints.resolution, footprints.radius
+
+    with open(filename, "wb") as f:
+        f.write(struct.pack(HEADER_FORMAT, LIBRARY_MAGIC, LIBRARY_VERSION, RECORD_DTYPE.itemsize, len(records),
+                            samples_offset, samples_count, 0.0 if sample_ds is None else float(sample_ds),
+                            footprints_offset, footprints_count, resolution, radius))
+        f.write(records.tobytes())
+        if offsets is not None:
+            f.write(b"\0" * (samples_offset - records_end))  # выравниваем секцию семплов на 8 байт
+            f.write(offsets.tobytes())
+            for polyline in polylines:
+                f.write(polyline.astype(SAMPLE_DTYPE).tobytes())
+        if footprints is not None:
+            f.write(b"\0" * (footprints_offset - samples_end))
+            f.write(np.asarray(footprints.offsets, dtype="<u8").tobytes())
+            f.write(np.asarray(footprints.runs, dtype=RUN_DTYPE).tobytes())
+
+
+
+class PrimitiveLibrary:
+    """
+    Открытая только для чтения библиотека примитивов (отображённая в память через np.memmap).
+
+        primitives: PrimitiveArray поверх записей файла (данные подгружаются с диска по мере обращения),
+        sample_ds: шаг, с которым сохранены ломаные (None, если секции семплов нет),
+        footprints: заметаемые клетки примитивов Footprints (поверх данных файла; None, если секции клеток нет).
+    """
+
+    __slots__ = ("filename", "primitives", "sample_ds", "footprints", "_offsets", "_points")
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        with open(filename, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            raise ValueError(f"Файл '{filename}' слишком короткий для библиотеки примитивов!")
+
+        magic, version, record_size, count, samples_offset, samples_count, sample_ds, \
+            footprints_offset, footprints_count, resolution, radius = struct.unpack(HEADER_FORMAT, header)
+        if magic != LIBRARY_MAGIC:
+            raise ValueError(f"Файл '{filename}' не является библиотекой примитивов!")
+        if version != LIBRARY_VERSION or record_size != RECORD_DTYPE.itemsize:
+            raise ValueError(f"Неподдерживаемая версия библиотеки примитивов: {version} (размер записи {record_size})!")
+        size = HEADER_SIZE + count * record_size  # где должен кончаться файл по данным заголовка
+        if samples_offset:
+            size = max(size, samples_offset + 8 * (count + 1) + SAMPLE_DTYPE.itemsize * 4 * samples_count)
+        if footprints_offset:
+            size = max(size, footprints_offset + 8 * (count + 1) + RUN_DTYPE.itemsize * 3 * footprints_count)
+        if os.path.getsize(filename) < size:
+            raise ValueError(f"Файл библиотеки примитивов '{filename}' обрезан: {os.path.getsize(filename)} байт вместо {size}!")
+
+        records = np.memmap(filename, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,)) if count else \
+                  np.zeros(0, dtype=RECORD_DTYPE)
+        self.primitives = PrimitiveArray(records.view(PRIMITIVE_DTYPE))
+
+        self.sample_ds, self._offsets, self._points = None, None, None
+        if samples_offset:
+            self.sample_ds = sample_ds
+            self._offsets = np.memmap(filename, dtype="<u8", mode="r", offset=samples_offset, shape=(count + 1,))
+            if samples_count:
+                self._points = np.memmap(filename, dtype=SAMPLE_DTYPE, mode="r", offset=samples_offset + 8 * (count + 1),
+                                         shape=(samples_count, 4))
+            else:
+                self._points = np.zeros((0, 4))
+
+        self.footprints = None
+        if footprints_offset:
+            offsets = np.memmap(filename, dtype="<u8", mode="r", offset=footprints_offset, shape=(count + 1,))
+            runs = np.memmap(filename, dtype=RUN_DTYPE, mode="r", offset=footprints_offset + 8 * (count + 1),
+                             shape=(footprints_count, 3)) if footprints_count else np.zeros((0, 3), dtype=RUN_DTYPE)
+            self.footprints = Footprints(resolution, radius, offsets, runs)
+
+
+    def __len__(self) -> int:
+        return len(self.primitives)
+
+
+    @property
+    def has_samples(self) -> bool:
+        return self._offsets is not None
+
+
+    def samples(self, i: int) -> np.ndarray:
+        """
+        Заранее посчитанная ломаная i-го примитива: массив (n, 4) из x, y, theta, k (вид на данные файла, без копирования).
+        """
+
+        assert self.has_samples, "В библиотеке нет секции с семплами!"
+        return self._points[int(self._offsets[i]):int(self._offsets[i + 1])]
+
+
+
+def load_library(filename: str) -> PrimitiveLibrary:
+    """
+    Открывает файл библиотеки примитивов (без чтения данных в память).
+        filename: имя файла.
+    """
+
+    return PrimitiveLibrary(filename)
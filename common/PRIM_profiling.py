@@ -0,0 +1,183 @@
+"""
+Встроенное профилирование генерации примитивов по стадиям: квадратура (интегрирование координат), смена параметризации
+(set_curve_params), вычисление невязки, построение матрицы Якоби и шаг метода Ньютона.
+
+Модули сами объявляют, какие их функции и методы относятся к какой стадии (register_stages). Пока профилирование выключено,
+эти функции ничем не обёрнуты и работают с исходной скоростью. При включении (enable или контекстный менеджер profiling)
+они подменяются обёртками, которые считают число вызовов и время, а при выключении - возвращаются на место.
+
+Для каждой стадии считается полное время (вместе с вложенными стадиями: например, построение матрицы Якоби конечными
+разностями включает 6 вычислений невязки, а те - квадратуру) и собственное время (за вычетом вложенных стадий).
+Сумма собственных времён - это время, которое объясняется стадиями. Вложенный вызов той же стадии (например, integrate_batch
+эталонного движка вызывает integrate) отдельно не учитывается.
+
+Статистика - словарь {стадия: [вызовов, полное время, собственное время]}; её можно забрать из процесса-обработчика
+(snapshot) и сложить с другими (merge), см. experiments/task_pool.py.
+
+Пример:
+    with profiling() as stats:
+        optimization_Newton(start, goal)
+    print(format_report(stats))
+"""
+
+import time
+import cProfile
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Optional
+
+
+
+_targets = []      # (владелец, имя атрибута, стадия): владелец - модуль или класс
+_originals = {}    # (id владельца, имя атрибута) -> исходная функция (только пока профилирование включено)
+_stats = {}        # стадия -> [вызовов, полное время, собственное время]
+_stack = []        # открытые стадии: [стадия, время вложенных стадий]
+_enabled = False
+
+
+
+def timed(function, stage: str):
+    """
+    Обёртка function, учитывающая её вызовы в стадии stage (обёртка считает всегда, поэтому её стоит ставить только
+    на время профилирования). Так, например, учитывается целая задача эксперимента (см. experiments/task_pool.py).
+    """
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if _stack and _stack[-1][0] == stage:  # вложенный вызов той же стадии
+            return function(*args, **kwargs)
+        frame = [stage, 0.0]
+        _stack.append(frame)
+        t_start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - t_start
+            _stack.pop()
+            if _stack:
+                _stack[-1][1] += elapsed
+            record = _stats.setdefault(stage, [0, 0.0, 0.0])
+            record[0] += 1
+            record[1] += elapsed
+            record[2] += elapsed - frame[1]
+    return wrapper
+
+
+def _patch(owner, name: str, stage: str) -> None:
+    original = owner.__dict__[name] if isinstance(owner, type) else getattr(owner, name)
+    _originals[(id(owner), name)] = (owner, original)
+    setattr(owner, name, timed(original, stage))
+
+
+
+def register_stages(owner, stages: Dict[str, str]) -> None:
+    """
+    Объявляет функции (или методы) владельца owner - модуля или класса - частью стадий: stages = {имя атрибута: стадия}.
+    Подменяется атрибут самого владельца, поэтому учитываются вызовы через него (вызов функции модуля по имени внутри
+    этого модуля, вызов метода у объекта), но не копии, импортированные в другие модули через from ... import.
+    Повторная регистрация того же атрибута (например, при повторном импорте модуля) ничего не делает.
+    """
+
+    for name, stage in stages.items():
+        if any(target is owner and target_name == name for target, target_name, _ in _targets):
+            continue
+        _targets.append((owner, name, stage))
+        if _enabled:
+            _patch(owner, name, stage)
+
+
+def enable() -> None:
+    """ Включает учёт стадий (подменяет зарегистрированные функции обёртками). """
+
+    global _enabled
+    if _enabled:
+        return
+    for owner, name, stage in _targets:
+        _patch(owner, name, stage)
+    _enabled = True
+
+
+def disable() -> None:
+    """ Выключает учёт стадий (возвращает исходные функции). Накопленная статистика сохраняется. """
+
+    global _enabled
+    for name_key, (owner, original) in list(_originals.items()):
+        setattr(owner, name_key[1], original)
+    _originals.clear()
+    _stack.clear()
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+
+def snapshot(reset: bool = False) -> Dict[str, list]:
+    """ Копия накопленной статистики; reset=True - обнулить её (так процесс-обработчик отдаёт свою порцию статистики). """
+
+    stats = {stage: list(record) for stage, record in _stats.items()}
+    if reset:
+        _stats.clear()
+    return stats
+
+
+def merge(stats: Dict[str, list], into: Optional[Dict[str, list]] = None) -> Dict[str, list]:
+    """ Прибавляет статистику stats к into (по умолчанию - к статистике текущего процесса). """
+
+    into = _stats if into is None else into
+    for stage, (calls, total, own) in stats.items():
+        record = into.setdefault(stage, [0, 0.0, 0.0])
+        record[0] += calls
+        record[1] += total
+        record[2] += own
+    return into
+
+
+def reset() -> None:
+    _stats.clear()
+
+
+
+def format_report(stats: Optional[Dict[str, list]] = None, wall_time: Optional[float] = None) -> str:
+    """
+    Таблица по стадиям (по убыванию собственного времени): число вызовов, полное и собственное время, доля собственного
+    времени и среднее время вызова. Если задано общее время wall_time, доля считается от него (а остаток - время вне стадий).
+    """
+
+    stats = _stats if stats is None else stats
+    explained = sum(own for _, _, own in stats.values())
+    base = wall_time if wall_time else explained
+    lines = [f"{'стадия':18s} {'вызовов':>12s} {'полное, с':>11s} {'собств., с':>11s} {'доля':>7s} {'мкс/вызов':>10s}"]
+    for stage, (calls, total, own) in sorted(stats.items(), key=lambda item: -item[1][2]):
+        share = own / base * 100 if base else 0.0
+        lines.append(f"{stage:18s} {calls:12d} {total:11.3f} {own:11.3f} {share:6.1f}% {total / max(calls, 1) * 1e6:10.1f}")
+    if wall_time:
+        lines.append(f"{'вне стадий':18s} {'':12s} {'':11s} {wall_time - explained:11.3f} "
+                     f"{(wall_time - explained) / wall_time * 100:6.1f}%")
+    return "\n".join(lines)
+
+
+
+@contextmanager
+def profiling(output: Optional[str] = None):
+    """
+    Контекстный менеджер: обнуляет статистику, включает учёт стадий на время блока и отдаёт словарь статистики
+    (заполняется по выходе из блока). Если задан output, блок дополнительно профилируется cProfile, а результат
+    сохраняется в этот файл (формат pstats: python -m pstats output).
+    """
+
+    stats = {}
+    reset()
+    profiler = cProfile.Profile() if output else None
+    enable()
+    if profiler:
+        profiler.enable()
+    try:
+        yield stats
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(output)
+        disable()
+        stats.update(snapshot())
@@ -4,7 +4,485 @@
 
 import numpy as np
 from scipy.integrate import quad
+from typing import Callable, Optional, Tuple
 from typing_extensions import Self  # Self появился в typing только в 3.11 Питон... в ранних версиях используем typing_extensions
+from PRIM_profiling import register_stages
+
+
+
+"""
+Движки интегрирования.
+
+Координаты x(s), y(s) точки траектории - это интегралы от cos и sin угла направления theta(s), который является полиномом
+4 степени. Эти интегралы не берутся в элементарных функциях, поэтому считаются численно. Раньше для каждого вычисления
+вызывался адаптивный scipy.integrate.quad (с python-лямбдой внутри), и именно он доминировал во времени генерации примитива.
+Теперь способ интегрирования вынесен в отдельный подключаемый объект (движок), который хранится в ShortTrajectory:
+    QuadIntegrator - исходный адаптивный quad (оставлен как эталонный режим для проверки точности),
+    GaussLegendreIntegrator - составная квадратура Гаусса-Лежандра фиксированного порядка (используется по умолчанию),
+    SimpsonIntegrator - составная формула Симпсона.
+Любой движок реализует метод integrate(coefs, s), возвращающий пару интегралов (от cos и от sin угла theta) на отрезке [0, s],
+где coefs - коэффициенты полинома theta(s) по возрастанию степеней (см. ShortTrajectory.theta_coefs), а также его пакетную
+версию integrate_batch(coefs, s) - сразу для N траекторий (coefs имеет размер (N, 5), s - размер (N,)).
+"""
+
+
+class QuadIntegrator:
+    """
+    Эталонный движок: адаптивное интегрирование scipy.integrate.quad (ровно так, как это делалось изначально).
+    Медленный, но точный - удобен, чтобы проверять точность быстрых движков.
+    """
+
+    def __init__(self, limit: int = 200, limlst: int = 10) -> None:
+        self.limit = limit
+        self.limlst = limlst
+
+    def integrate(self, coefs: np.ndarray, s: float) -> Tuple[float, float]:
+        """
+        Возвращает интегралы от cos(theta) и sin(theta) на отрезке [0, s].
+            coefs: коэффициенты полинома угла направления theta (по возрастанию степеней),
+            s: верхний предел интегрирования (точка на траектории).
+        """
+
+        theta0, k0, a2, b3, c4 = map(float, coefs)
+        theta = lambda t: theta0 + t * (k0 + t * (a2 + t * (b3 + t * c4)))  # полином угла направления по схеме Горнера
+        int_cos = quad(lambda t: np.cos(theta(t)), 0, s, limit=self.limit, limlst=self.limlst)[0]
+        int_sin = quad(lambda t: np.sin(theta(t)), 0, s, limit=self.limit, limlst=self.limlst)[0]
+        return int_cos, int_sin
+
+    def integrate_batch(self, coefs: np.ndarray, s: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Пакетная версия integrate (для эталонного движка - просто цикл по траекториям).
+        """
+
+        result = np.array([self.integrate(c, l) for c, l in zip(coefs, s)]).reshape(-1, 2)
+        return result[:, 0], result[:, 1]
+
+    def cumulative(self, coefs: np.ndarray, grid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Накопленные интегралы от cos(theta) и sin(theta) от 0 до каждой точки возрастающей сетки grid (grid[0] = 0):
+        каждый отрезок сетки интегрируется отдельным quad, результаты суммируются.
+        """
+
+        theta0, k0, a2, b3, c4 = map(float, coefs)
+        theta = lambda t: theta0 + t * (k0 + t * (a2 + t * (b3 + t * c4)))
+        pieces = np.array([[quad(lambda t: np.cos(theta(t)), l, r, limit=self.limit, limlst=self.limlst)[0],
+                            quad(lambda t: np.sin(theta(t)), l, r, limit=self.limit, limlst=self.limlst)[0]]
+                           for l, r in zip(grid[:-1], grid[1:])]).reshape(-1, 2)
+        result = np.vstack([np.zeros((1, 2)), np.cumsum(pieces, axis=0)])
+        return result[:, 0], result[:, 1]
+
+    def moments_batch(self, coefs: np.ndarray, s: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Моменты int_0^s u^m cos(theta(u)) du и int_0^s u^m sin(theta(u)) du для m = 0..4 (см. FixedQuadratureIntegrator.moments_batch).
+        Эталонный движок считает каждый момент отдельным адаптивным quad.
+        """
+
+        moments_cos, moments_sin = np.zeros((len(s), 5)), np.zeros((len(s), 5))
+        for i, (c, l) in enumerate(zip(coefs, s)):
+            theta = lambda t: np.polynomial.polynomial.polyval(t, c)
+            for m in range(5):
+                moments_cos[i, m] = quad(lambda t: t**m * np.cos(theta(t)), 0, l, limit=self.limit, limlst=self.limlst)[0]
+                moments_sin[i, m] = quad(lambda t: t**m * np.sin(theta(t)), 0, l, limit=self.limit, limlst=self.limlst)[0]
+        return moments_cos, moments_sin
+
+    def moments(self, coefs: np.ndarray, s: float) -> Tuple[np.ndarray, np.ndarray]:
+        """ Моменты одной траектории (см. FixedQuadratureIntegrator.moments). """
+
+        moments_cos, moments_sin = self.moments_batch(np.asarray(coefs, dtype=float).reshape(1, 5), np.array([float(s)]))
+        return moments_cos[0], moments_sin[0]
+
+
+
+class FixedQuadratureIntegrator:
+    """
+    Базовый класс для составных квадратур с фиксированными узлами: интеграл на [0, s] заменяется взвешенной суммой
+    значений подынтегральной функции в заранее известных узлах s * t_i (узлы t_i и веса w_i заданы на отрезке [0, 1]).
+    Значения угла во всех узлах считаются векторно по схеме Горнера, и весь интеграл (сразу и от cos, и от sin) - парой
+    векторных выражений NumPy, без python-циклов. Все вычисления поэлементные (без умножения матриц: BLAS складывает
+    слагаемые в разном порядке для одной строки и для пакета), поэтому интеграл траектории не зависит от того, считается
+    он отдельно (integrate) или в составе пакета (integrate_batch), - одиночный и пакетный метод Ньютона идут одинаково
+    до последнего бита. Пакеты обрабатываются кусками по CHUNK_NODES значений, чтобы временные массивы оставались в кэше.
+
+    Дополнительно поддерживается режим с оценкой ошибки (tol): число отрезков удваивается, пока разность
+    между двумя последовательными приближениями не станет меньше tol (но не больше max_segments отрезков).
+
+    Фиксированного числа узлов не хватает на длинных "закрученных" траекториях: если угол направления на одном отрезке
+    меняется на много радиан, cos и sin на нём колеблются быстрее, чем разрешают узлы, и интеграл (а с ним и невязка,
+    которую видит метод Ньютона) получается неверным. Поэтому число отрезков для каждой траектории выбирается по оценке
+    изменения угла: s * max|k| (кривизна k = theta' берётся в нескольких точках [0, s]) делится на max_phase - допустимое
+    изменение угла на одном отрезке - и округляется вверх до segments, умноженного на степень двойки (не больше
+    max_segments). Для обычных примитивов (поворот в пределах нескольких оборотов) остаётся segments отрезков.
+    Траектории пакета с разным числом отрезков интегрируются группами.
+    """
+
+    PHASE_PROBES = np.linspace(0.0, 1.0, 9)  # точки (в долях s), в которых оценивается наибольшая кривизна
+    CHUNK_NODES = 1 << 14                    # значений угла (траекторий пакета * узлов) за один проход
+    _probes = tuple(PHASE_PROBES.tolist())
+
+    def __init__(self, segments: int = 8, tol: Optional[float] = None, max_segments: int = 1024,
+                 max_phase: Optional[float] = None) -> None:
+        """
+            segments: число отрезков, на которые разбивается [0, s] (на каждом - своя квадратура),
+            tol: допустимая оценка ошибки интеграла (None - без оценки ошибки, фиксированное число узлов),
+            max_segments: предельное число отрезков (в режиме с оценкой ошибки и при сгущении по изменению угла),
+            max_phase: допустимое изменение угла направления на одном отрезке в радианах (None - не сгущать разбиение).
+        """
+
+        assert segments >= 1, "Число отрезков должно быть положительным!"
+        self.segments = segments
+        self.tol = tol
+        self.max_segments = max_segments
+        self.max_phase = max_phase
+        self._cache = {}  # узлы и веса для разного числа отрезков (считаются один раз)
+
+    def _base_rule(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ Узлы и веса одной (несоставной) квадратуры на отрезке [0, 1]. """
+        raise NotImplementedError
+
+    def nodes(self, segments: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Узлы и веса составной квадратуры на отрезке [0, 1].
+            segments: число отрезков (по умолчанию - self.segments).
+        """
+
+        return self._rule(segments)[:2]
+
+    def _rule(self, segments: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # узлы, веса и матрица степеней узлов (t^0, ..., t^4) для заданного числа отрезков (считаются один раз и кэшируются)
+        segments = self.segments if segments is None else segments
+        if segments not in self._cache:
+            t, w = self._base_rule()
+            left = np.arange(segments).reshape(-1, 1) / segments  # левые концы отрезков разбиения
+            t = (left + t / segments).ravel()
+            self._cache[segments] = (t, np.tile(w / segments, segments), t.reshape(-1, 1) ** np.arange(5))
+        return self._cache[segments]
+
+    def segments_for(self, coefs: np.ndarray, s):
+        """
+        Число отрезков разбиения для траекторий с коэффициентами угла направления coefs ((5,) или (N, 5)) и длинами s
+        (число или (N,)): segments, сгущённое по изменению угла (см. описание класса).
+        """
+
+        if np.ndim(s) == 0:
+            return self._segments_one(np.asarray(coefs, dtype=float).tolist(), float(s))
+        if self.max_phase is None:
+            return np.full(len(s), self.segments)
+        limit = max(self.max_segments, self.segments)
+
+        u = s.reshape(-1, 1) * self.PHASE_PROBES                                   # (N, число точек)
+        k = coefs[:, 1:2] + u * (2 * coefs[:, 2:3] + u * (3 * coefs[:, 3:4] + u * 4 * coefs[:, 4:5]))  # k = theta'
+        with np.errstate(all='ignore'):
+            phase = s * np.max(np.abs(k), axis=1) / self.max_phase / self.segments
+            doublings = np.ceil(np.log2(np.clip(np.where(np.isnan(phase), 1.0, phase), 1.0, limit)))
+        return np.minimum(self.segments * 2 ** doublings.astype(int), limit)
+
+    def _segments_one(self, coefs: list, length: float) -> int:
+        # segments_for для одной траектории на обычных числах (так в разы быстрее, чем через NumPy)
+        if self.max_phase is None:
+            return self.segments
+        _, c1, c2, c3, c4 = coefs
+        curvature = lambda u: c1 + u * (2 * c2 + u * (3 * c3 + u * 4 * c4))  # k = theta'
+        # кривизна - кубический многочлен, поэтому на [0, s] |k| не больше max |k| в узлах 0, s/3, 2s/3, s, умноженного
+        # на константу Лебега этих узлов (1.6311): если даже такой оценки хватает, пробные точки не нужны
+        nodes = max(abs(c1), abs(curvature(length / 3)), abs(curvature(2 * length / 3)), abs(curvature(length)))
+        if length * 1.64 * nodes <= self.max_phase * self.segments:
+            return self.segments
+
+        limit = max(self.max_segments, self.segments)
+        k_max = 0.0
+        for t in self._probes:  # те же вычисления, что в пакетной ветви segments_for
+            k = abs(curvature(length * t))
+            if k > k_max:
+                k_max = k
+        phase = length * k_max / self.max_phase / self.segments  # во сколько раз не хватает отрезков
+        if phase == np.inf:
+            return limit
+        segments = self.segments
+        while segments < self.segments * phase and segments < limit:
+            segments *= 2
+        return min(segments, limit)
+
+    def _refine(self, compute: Callable, coefs: np.ndarray, s) -> tuple:
+        """
+        Вычисляет compute(coefs, s, segments) с разбиением segments_for (траектории пакета - группами с одинаковым числом
+        отрезков), а в режиме с оценкой ошибки сгущает разбиение каждой группы, пока результат (кортеж чисел или массивов)
+        не стабилизируется с точностью tol.
+        """
+
+        segments = self.segments_for(coefs, s)
+        if np.ndim(s) == 0:
+            return self._refine_group(compute, coefs, s, segments)
+        groups = np.unique(segments)
+        if len(groups) <= 1:
+            return self._refine_group(compute, coefs, s, int(groups[0]) if len(groups) else self.segments)
+
+        result = None
+        for group in groups:
+            rows = np.flatnonzero(segments == group)
+            part = self._refine_group(compute, coefs[rows], s[rows], int(group))
+            if result is None:
+                result = tuple(np.empty((len(s),) + np.shape(item)[1:]) for item in part)
+            for full, item in zip(result, part):
+                full[rows] = item
+        return result
+
+    def _refine_group(self, compute: Callable, coefs: np.ndarray, s, segments: int) -> tuple:
+        result = compute(coefs, s, segments)
+        if self.tol is None:
+            return result
+
+        while 2 * segments <= self.max_segments:  # режим с оценкой ошибки: сгущаем разбиение, пока результат не стабилизируется
+            segments *= 2
+            fine = compute(coefs, s, segments)
+            error = max(np.max(np.abs(np.subtract(f, r)), initial=0.0) for f, r in zip(fine, result))
+            result = fine
+            if error <= self.tol:
+                break
+        return result
+
+    @staticmethod
+    def _angles(coefs: np.ndarray, s, t: np.ndarray) -> np.ndarray:
+        # угол направления в узлах s * t: (число узлов,) для одной траектории (coefs (5,), s - число) или
+        # (N, число узлов) для пакета (coefs (N, 5), s (N,))
+        u = np.multiply.outer(s, t)
+        c = coefs[..., None]
+        th = u * c[..., 4, :]
+        for j in (3, 2, 1):
+            th += c[..., j, :]
+            th *= u
+        th += c[..., 0, :]
+        return th
+
+    def _integrate_fixed(self, coefs: np.ndarray, s, segments: int):
+        t, w, _ = self._rule(segments)
+        th = self._angles(coefs, s, t)  # значения угла направления сразу во всех узлах s * t_i
+        cos = np.cos(th)
+        cos *= w
+        np.sin(th, out=th)
+        th *= w
+        return s * np.sum(cos, axis=-1), s * np.sum(th, axis=-1)
+
+    @staticmethod
+    def _angles_one(coefs: list, s: float, t: np.ndarray) -> np.ndarray:
+        # _angles для одной траектории с коэффициентами - обычными числами: те же операции в том же порядке
+        # (результат совпадает до последнего бита), но без накладных расходов на индексацию и общие функции NumPy
+        c0, c1, c2, c3, c4 = coefs
+        u = t * s
+        th = u * c4
+        th += c3
+        th *= u
+        th += c2
+        th *= u
+        th += c1
+        th *= u
+        th += c0
+        return th
+
+    def _integrate_one(self, coefs: list, s: float, segments: int):
+        # _integrate_fixed для одной траектории (совпадает с ним до последнего бита)
+        t, w, _ = self._rule(segments)
+        th = self._angles_one(coefs, s, t)
+        cos = np.cos(th)
+        cos *= w
+        np.sin(th, out=th)
+        th *= w
+        return s * cos.sum(), s * th.sum()
+
+    def integrate(self, coefs: np.ndarray, s: float) -> Tuple[float, float]:
+        """
+        Возвращает интегралы от cos(theta) и sin(theta) на отрезке [0, s].
+            coefs: коэффициенты полинома угла направления theta (по возрастанию степеней),
+            s: верхний предел интегрирования (точка на траектории).
+        """
+
+        if self.tol is None:  # без оценки ошибки - напрямую, минуя общий механизм _refine (одиночное решение вызывает это
+                              # на каждой итерации)
+            coefs, s = np.asarray(coefs, dtype=float).tolist(), float(s)
+            return self._integrate_one(coefs, s, self._segments_one(coefs, s))
+        return self._refine(self._integrate_fixed, coefs, s)
+
+    def _integrate_batch_fixed(self, coefs: np.ndarray, s: np.ndarray, segments: int) -> Tuple[np.ndarray, np.ndarray]:
+        xs, ys = np.empty(len(s)), np.empty(len(s))
+        rows = max(self.CHUNK_NODES // len(self._rule(segments)[0]), 1)
+        for first in range(0, len(s), rows):
+            part = slice(first, first + rows)
+            xs[part], ys[part] = self._integrate_fixed(coefs[part], s[part], segments)
+        return xs, ys
+
+    def integrate_batch(self, coefs: np.ndarray, s: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Пакетная версия integrate: интегралы сразу для N траекторий.
+            coefs: (N, 5) - коэффициенты полиномов угла направления,
+            s: (N,) - верхние пределы интегрирования.
+        """
+
+        return self._refine(self._integrate_batch_fixed, coefs, s)
+
+    def cumulative(self, coefs: np.ndarray, grid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Накопленные интегралы от cos(theta) и sin(theta) от 0 до каждой точки возрастающей сетки grid (grid[0] = 0).
+        Каждый отрезок сетки интегрируется одной (несоставной) квадратурой, все отрезки - одним векторным выражением,
+        а затем значения суммируются нарастающим итогом. Так получаются все точки кривой за один проход, вместо
+        отдельного интеграла от 0 до s для каждой точки.
+            coefs: коэффициенты полинома угла направления theta (по возрастанию степеней),
+            grid: возрастающая сетка точек на траектории, начинающаяся с 0.
+        """
+
+        t, w = self._base_rule()
+        left, width = grid[:-1].reshape(-1, 1), np.diff(grid).reshape(-1, 1)
+        th = np.polynomial.polynomial.polyval(left + width * t, coefs)  # (число отрезков, число узлов на отрезке)
+        pieces_cos, pieces_sin = width[:, 0] * (np.cos(th) @ w), width[:, 0] * (np.sin(th) @ w)
+        return np.concatenate([[0.0], np.cumsum(pieces_cos)]), np.concatenate([[0.0], np.cumsum(pieces_sin)])
+
+    def _moments_batch_fixed(self, coefs: np.ndarray, s: np.ndarray, segments: int) -> Tuple[np.ndarray, np.ndarray]:
+        t, w, powers = self._rule(segments)
+        th = (coefs * s.reshape(-1, 1) ** np.arange(5)) @ powers.T
+        scale = s.reshape(-1, 1) ** np.arange(1, 6)  # замена переменной u = s * t даёт множитель s^(m+1)
+        return scale * ((np.cos(th) * w) @ powers), scale * ((np.sin(th) * w) @ powers)
+
+    def moments_batch(self, coefs: np.ndarray, s: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Моменты интегралов: для m = 0..4 считаются int_0^s u^m cos(theta(u)) du и int_0^s u^m sin(theta(u)) du
+        (нулевые моменты - это обычные интегралы integrate_batch). Все моменты получаются из одних и тех же значений
+        cos и sin в узлах квадратуры, то есть за один проход. Используются при точном вычислении матрицы Якоби.
+            coefs: (N, 5) - коэффициенты полиномов угла направления,
+            s: (N,) - верхние пределы интегрирования.
+        Возвращает два массива размера (N, 5).
+        """
+
+        return self._refine(self._moments_batch_fixed, coefs, s)
+
+    def _moments_one(self, coefs: list, s: float, segments: int) -> Tuple[np.ndarray, np.ndarray]:
+        t, w, powers = self._rule(segments)
+        th = self._angles_one(coefs, s, t)
+        cos = np.cos(th)
+        cos *= w
+        np.sin(th, out=th)
+        th *= w
+        s2 = s * s
+        scale = np.array([s, s2, s2 * s, s2 * s2, s2 * s2 * s])  # s^(m+1), как в _moments_batch_fixed
+        return scale * (cos @ powers), scale * (th @ powers)
+
+    def moments(self, coefs: np.ndarray, s: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Моменты одной траектории (как moments_batch, но coefs (5,), s - число): два массива (5,). Без оценки ошибки
+        считаются напрямую, как integrate, - это нужно точной матрице Якоби при решении задач по одной.
+        """
+
+        if self.tol is None:
+            coefs, s = np.asarray(coefs, dtype=float).tolist(), float(s)
+            return self._moments_one(coefs, s, self._segments_one(coefs, s))
+        moments_cos, moments_sin = self.moments_batch(np.asarray(coefs, dtype=float).reshape(1, 5), np.array([float(s)]))
+        return moments_cos[0], moments_sin[0]
+
+
+
+class GaussLegendreIntegrator(FixedQuadratureIntegrator):
+    """
+    Составная квадратура Гаусса-Лежандра: на каждом из segments отрезков используется order узлов.
+    Точна для полиномов степени до 2*order-1 на каждом отрезке, поэтому для гладкого cos(theta(s)) уже 64 узлов
+    хватает с огромным запасом относительно точности eps=1e-2, с которой решается задача генерации примитива, - пока угол
+    направления на отрезке меняется не больше чем на max_phase (при 8 узлах и изменении на 3 радиана относительная
+    погрешность отрезка ~1e-15). На длинных закрученных траекториях разбиение сгущается (см. FixedQuadratureIntegrator).
+    """
+
+    def __init__(self, order: int = 8, segments: int = 8, tol: Optional[float] = None, max_segments: int = 1024,
+                 max_phase: Optional[float] = 3.0) -> None:
+        """
+            order: число узлов Гаусса-Лежандра на одном отрезке (при меньшем порядке стоит уменьшить и max_phase),
+            остальные параметры - см. FixedQuadratureIntegrator.
+        """
+
+        assert order >= 1, "Порядок квадратуры должен быть положительным!"
+        self.order = order
+        super().__init__(segments, tol, max_segments, max_phase)
+
+    def _base_rule(self) -> Tuple[np.ndarray, np.ndarray]:
+        t, w = np.polynomial.legendre.leggauss(self.order)  # узлы и веса на отрезке [-1, 1]
+        return (t + 1) / 2, w / 2                            # переводим на отрезок [0, 1]
+
+
+
+class SimpsonIntegrator(FixedQuadratureIntegrator):
+    """
+    Составная формула Симпсона (на каждом отрезке - 3 узла: концы и середина).
+    Сходится медленнее Гаусса-Лежандра, поэтому по умолчанию разбиение более мелкое (и на отрезке допускается меньшее
+    изменение угла: при 0.25 радиана относительная погрешность отрезка ~1e-6).
+    """
+
+    def __init__(self, segments: int = 64, tol: Optional[float] = None, max_segments: int = 4096,
+                 max_phase: Optional[float] = 0.25) -> None:
+        super().__init__(segments, tol, max_segments, max_phase)
+
+    def _base_rule(self) -> Tuple[np.ndarray, np.ndarray]:
+        return np.array([0.0, 0.5, 1.0]), np.array([1/6, 4/6, 1/6])
+
+
+
+DEFAULT_INTEGRATOR = GaussLegendreIntegrator()  # движок интегрирования, используемый по умолчанию
+
+# стадия профилирования "quadrature" (см. PRIM_profiling.py); SimpsonIntegrator и GaussLegendreIntegrator наследуют эти методы
+_QUADRATURE_METHODS = {"integrate": "quadrature", "integrate_batch": "quadrature", "cumulative": "quadrature", "moments": "quadrature",
+                       "moments_batch": "quadrature"}
+register_stages(QuadIntegrator, _QUADRATURE_METHODS)
+register_stages(FixedQuadratureIntegrator, _QUADRATURE_METHODS)
+
+
+
+"""
+Матрица перехода от второй параметризации к первой для траектории единичной длины: если K = (k0, k1, k2, kf) - значения кривизны
+в точках 0, 1/3, 2/3, 1, то коэффициенты полиномиальной кривизны (k0, a, b, c) = CURVE_TO_COEF_MATRIX @ K. Для траектории длины L
+точки умножаются на L, поэтому коэффициенты при s^j делятся на L^j: (k0, a, b, c) = diag(1, 1/L, 1/L^2, 1/L^3) @ CURVE_TO_COEF_MATRIX @ K.
+"""
+CURVE_TO_COEF_MATRIX = np.array([[   1.0,    0.0,    0.0,   0.0],   # обратная к матрице Вандермонда по точкам 0, 1/3, 2/3, 1
+                                 [-11/2,    9.0,   -9/2,   1.0],   # (записана в явном виде, чтобы не обращать матрицу
+                                 [   9.0, -45/2,   18.0,  -9/2],   # при каждой смене параметризации)
+                                 [ -9/2,   27/2,  -27/2,   9/2]])
+
+CHECK_REPARAMETERIZATION = True  # проверять ли корректность смены параметризации (в production можно отключить)
+REPARAMETERIZATION_TOL = 1e-8    # допустимая (относительная) погрешность такой проверки
+
+_COEF_ROWS = tuple(map(tuple, CURVE_TO_COEF_MATRIX[1:].tolist()))  # строки матрицы для a, b, c (в виде обычных чисел - так быстрее)
+
+
+
+def curve_to_coef_params(k0, k1, k2, kf, log_length):
+    """
+    Переход от второй параметризации к первой в явном виде (без обращения матриц):
+    (k0, a, b, c) = diag(1, 1/L, 1/L^2, 1/L^3) @ CURVE_TO_COEF_MATRIX @ (k0, k1, k2, kf), где L = exp(log_length).
+    Все аргументы могут быть как числами, так и массивами одинаковой формы (тогда переход делается сразу для набора траекторий).
+
+        k0, k1, k2, kf: значения кривизны в точках 0, L/3, 2L/3, L,
+        log_length: логарифм длины.
+
+    Возвращает четвёрку a, b, c, length.
+    """
+
+    length = np.exp(log_length)
+    a, b, c = (m0 * k0 + m1 * k1 + m2 * k2 + m3 * kf for m0, m1, m2, m3 in _COEF_ROWS)  # явное умножение на строки матрицы:
+                                                                                       # одинаково работает и для чисел, и для массивов
+    square = length * length  # умножения вместо степеней: у чисел и массивов NumPy степень считается по-разному (до последнего бита)
+    return a / length, b / square, c / (square * length), length
+
+
+def coef_to_curve_params(k0, a, b, c, length):
+    """
+    Обратный переход: от первой параметризации ко второй. Аргументы - числа или массивы одинаковой формы.
+    Возвращает четвёрку k1, k2, kf, log_length.
+    """
+
+    curvature = lambda s: k0 + s * (a + s * (b + s * c))  # полиномиальная кривизна по схеме Горнера
+    return curvature(length / 3), curvature(2 * length / 3), curvature(length), np.log(length)
+
+
+def curvature_cost(k0, a, b, c, length):
+    """
+    Интеграл квадрата кривизны int_0^L k(s)^2 ds в явном виде (k(s)^2 - полином 6 степени, интегрируется почленно) -
+    стандартная мера "резкости" примитива. Аргументы - числа или массивы одинаковой формы.
+    """
+
+    coefs = (k0, a, b, c)
+    return sum(coefs[i] * coefs[j] * length ** (i + j + 1) / (i + j + 1) for i in range(4) for j in range(4))
 
 
 
@@ -12,12 +490,26 @@ class State:
     """
     Класс для описания 4-ёх мерного состояния мобильного агента: координаты, угол направления, кривизна
     """
+
+    __slots__ = ("x", "y", "theta", "k")  # без __dict__ у каждого экземпляра: состояний в памяти бывает очень много
     
     def __init__(self, x: float, y: float, theta: float, k: float = 0.0) -> None:
         self.x = x
         self.y = y
         self.theta = theta
         self.k = k
+
+
+
+def states_to_array(states) -> np.ndarray:
+    """
+    Переводит набор состояний в массив размера (N, 4) со столбцами x, y, theta, k (удобно для пакетных вычислений).
+        states: список объектов State или уже готовый массив (N, 4).
+    """
+
+    if isinstance(states, np.ndarray):
+        return states.astype(float).reshape(-1, 4)
+    return np.array([[st.x, st.y, st.theta, st.k] for st in states], dtype=float).reshape(-1, 4)
     
 
       
@@ -36,20 +528,26 @@ class ShortTrajectory:
     Таким образом, этот класс используется следующим образом: сначала фиксируются конкретные начальное и целевое состояния.
     Далее запускается оптимизация, которая подбирает параметры, чтобы final_state стал равен goal.
     """
+
+    __slots__ = ("start", "goal", "k0", "integrator",
+                 "a", "b", "c", "length", "log_length", "k1", "k2", "kf",
+                 "_vect_x", "_vect_y")
     
     
-    def __init__(self, start: State, goal: State) -> None:
+    def __init__(self, start: State, goal: State, integrator=None) -> None:
         """
         Инициализация.
         
             start: начальное состояние, из которого выходит траектория,
-            goal: состояние, в которое "в идеале" должна идти траектория.
+            goal: состояние, в которое "в идеале" должна идти траектория,
+            integrator: движок численного интегрирования координат (None - DEFAULT_INTEGRATOR).
         """
         
         # фиксированные кончики траектории:
         self.start = start
         self.goal = goal
         self.k0 = self.start.k  # начальная кривизна
+        self.integrator = DEFAULT_INTEGRATOR if integrator is None else integrator
         
         # первая (базовая) параметризация короткой траектории: a, b, c - коэффициенты кривизны и длина:
         self.a = None
@@ -63,10 +561,25 @@ class ShortTrajectory:
         self.k2 = None
         self.kf = None
 
-        # векторизуем функции получения координат (x,y) точки на траектории, чтобы можно было получать 
-        # сразу набор координат по набору переменных s (точки на траектории):
-        self.vect_x = np.vectorize(self.x)
-        self.vect_y = np.vectorize(self.y)
+        # векторизованные функции получения координат создаются лениво, при первом обращении (см. vect_x, vect_y):
+        # большинство траекторий (например, временные копии при вычислении матрицы Якоби) никогда не семплируются
+        self._vect_x = None
+        self._vect_y = None
+
+
+    # векторизуем функции получения координат (x,y) точки на траектории, чтобы можно было получать 
+    # сразу набор координат по набору переменных s (точки на траектории):
+    @property
+    def vect_x(self):
+        if self._vect_x is None:
+            self._vect_x = np.vectorize(self.x)
+        return self._vect_x
+
+    @property
+    def vect_y(self):
+        if self._vect_y is None:
+            self._vect_y = np.vectorize(self.y)
+        return self._vect_y
         
 
     def set_coef_params(self, a: float, b: float, c: float, length: float) -> Self:
@@ -86,9 +599,7 @@ class ShortTrajectory:
         self.c = c
         
         # вычисляем параметры второй:
-        self.log_length = np.log(length)
-        self.k1 = self.k(1/3 * length)
-        self.k2 = self.k(2/3 * length)
+        self.k1, self.k2, _, self.log_length = coef_to_curve_params(self.k0, a, b, c, length)
         self.kf = self.goal.k  # удобство второй параметризации в том, что один параметр - конечная кривизна - сразу однозначно задан из goal 
 
         return self
@@ -108,15 +619,14 @@ class ShortTrajectory:
         self.k2 = k2
         self.kf = self.goal.k
         
-        # вычисляем параметры первой параметризации:
-        self.length = np.exp(log_length)
-        vect_s = np.array([0, 1/3 * self.length, 2/3 * self.length, self.length]).reshape(-1, 1)
-        mat_s = np.hstack((vect_s ** 0, vect_s ** 1, vect_s ** 2, vect_s ** 3))  # получаем матрицу
-        params = np.linalg.inv(mat_s) @ np.array([self.k0, self.k1, self.k2, self.kf])  # делаем переход от второй параметризации к первой
-        k0, a, b, c = params
-        self.a, self.b, self.c = a, b, c  # устанавливаем параметры
-        assert k0 == self.k0, "Что-то не так, кривизна k0 не меняется сменой параметризации!"  # проверяем, что всё корректно: полученное k0 - тот же самый, что был до этого в первой параметризации
-                                                                                               # (это просто одна и та же переменная, которая для удобства участвует в смене параметризации, но сама не меняется)
+        # вычисляем параметры первой параметризации (переход в явном виде, см. curve_to_coef_params):
+        self.a, self.b, self.c, self.length = curve_to_coef_params(self.k0, self.k1, self.k2, self.kf, log_length)
+        if CHECK_REPARAMETERIZATION:  # проверяем, что всё корректно: полиномиальная кривизна с найденными коэффициентами действительно
+                                      # приходит в kf (сравнение с допуском, ведь точного равенства в арифметике с плавающей точкой ждать нельзя)
+            kf = self.k0 + self.length * (self.a + self.length * (self.b + self.length * self.c))
+            scale = 1 + abs(self.k0) + abs(self.k1) + abs(self.k2) + abs(self.kf)
+            assert not abs(kf - self.kf) > REPARAMETERIZATION_TOL * scale, \
+                "Что-то не так, смена параметризации не сохраняет кривизну на концах траектории!"
         return self
 
 
@@ -151,7 +661,27 @@ class ShortTrajectory:
         assert s >= 0, "Параметр s должен быть неотрицателен!"
         theta0, k0 = self.start.theta, self.k0
         a, b, c = self.a, self.b, self.c
-        return theta0 + k0 * s + a/2 * s**2 + b/3 * s**3 + c/4 * s**4  # используем уравнения угла направления
+        return theta0 + s * (k0 + s * (a/2 + s * (b/3 + s * (c/4))))  # используем уравнения угла направления (по схеме Горнера,
+                                                                     # как polyval в пакетных функциях)
+
+
+    def theta_coefs(self) -> np.ndarray:
+        """
+        Коэффициенты полинома угла направления theta(s) по возрастанию степеней s (в таком виде их принимают движки интегрирования).
+        """
+
+        return np.array([self.start.theta, self.k0, self.a/2, self.b/3, self.c/4])
+
+
+    def displacement(self, s: float) -> Tuple[float, float]:
+        """
+        Получение смещения (dx, dy) точки s относительно начала траектории: оба интеграла считаются
+        за один вызов движка интегрирования.
+            s: точка на траектории
+        """
+
+        assert s >= 0, "Параметр s должен быть неотрицателен!"
+        return self.integrator.integrate(self.theta_coefs(), s)
 
 
     def x(self, s: float) -> float:
@@ -162,7 +692,7 @@ class ShortTrajectory:
         
         assert s >= 0, "Параметр s должен быть неотрицателен!"
         x0 = self.start.x
-        return x0 + quad(lambda x: np.cos(self.theta(x)), 0, s, limit=200, limlst=10)[0]  # вычисляем интеграл численно
+        return x0 + self.displacement(s)[0]  # вычисляем интеграл численно (выбранным движком интегрирования)
     
     
     def y(self, s: float) -> float:
@@ -173,17 +703,42 @@ class ShortTrajectory:
         
         assert s >= 0, "Параметр s должен быть неотрицателен!"
         y0 = self.start.y
-        return y0 + quad(lambda x: np.sin(self.theta(x)), 0, s, limit=200, limlst=10)[0]
+        return y0 + self.displacement(s)[1]
+
+
+    def sample_s(self, ds: float = 0.02) -> np.ndarray:
+        """
+        Равномерная сетка точек s на траектории с шагом (расстоянием между соседними точками) примерно ds.
+        """
+
+        num = max(int(self.length / ds), 2)
+        return np.linspace(0, self.length, num=num, endpoint=True)  # endpoint=True, чтобы конечная точка (координаты финального состояния) тоже была
+
+
+    def sample_states(self, ds: float = 0.02) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Семплирование траектории с шагом ds: возвращает массивы x, y, theta, k во всех точках сетки sample_s(ds).
+        Угол направления считается на всей сетке сразу, а координаты - накопленным интегрированием по отрезкам сетки
+        (integrator.cumulative), то есть за один проход, а не отдельным интегралом от 0 до s для каждой точки.
+        Именно этой функцией стоит пользоваться для отрисовки траектории и проверки столкновений.
+
+            ds: шаг семплирования.
+        """
+
+        grid = self.sample_s(ds)
+        coefs = self.theta_coefs()
+        xs, ys = self.integrator.cumulative(coefs, grid)
+        thetas = np.polynomial.polynomial.polyval(grid, coefs)
+        ks = np.polynomial.polynomial.polyval(grid, [self.k0, self.a, self.b, self.c])
+        return self.start.x + xs, self.start.y + ys, thetas, ks
 
 
     # семплирование координат x и y на траектории с шагом (расстояние между соседними точками) ds:
     def sample_x(self, ds: float = 0.02) -> np.ndarray:
-        num = int(self.length / ds)
-        return self.vect_x(np.linspace(0, self.length, num=num, endpoint=True))  # endpoint=True, чтобы конечная точка (координаты финального состояния) тоже была
+        return self.sample_states(ds)[0]
     
     def sample_y(self, ds: float = 0.02) -> np.ndarray:
-        num = int(self.length / ds)
-        return self.vect_y(np.linspace(0, self.length, num=num, endpoint=True))  # т.к. функции x и y векторизованы, можем сразу набор (np.ndarray) координат считать по множеству точек s
+        return self.sample_states(ds)[1]  # если нужны обе координаты, выгоднее один раз вызвать sample_states
 
 
     def state(self, s: float) -> State:
@@ -201,7 +756,8 @@ class ShortTrajectory:
         к кривой и осью абсцисс), кривизна изменится как k(s)) - просто потому, что эта кривая является проекцией траектории.
         """
         
-        return State(self.x(s), self.y(s), self.theta(s), self.k(s))  # собираем состояние в точке s из компонент: координат, угла направления и кривизны
+        dx, dy = self.displacement(s)  # оба интеграла (для x и для y) за один проход движка интегрирования
+        return State(self.start.x + dx, self.start.y + dy, self.theta(s), self.k(s))  # собираем состояние в точке s из компонент: координат, угла направления и кривизны
                                                                       # (проекцией этого состояния на плоскость рабочего пространства будет просто пара точек x(s),y(s))
 
 
@@ -214,3 +770,221 @@ class ShortTrajectory:
         """
         
         return self.state(self.length)
+
+
+register_stages(ShortTrajectory, {"set_curve_params": "reparameterization", "set_coef_params": "reparameterization"})
+
+
+
+"""
+Компактное хранение большого числа примитивов.
+
+Держать сотни тысяч примитивов в виде отдельных объектов ShortTrajectory (каждый со своими State) дорого по памяти.
+PrimitiveArray хранит набор примитивов по столбцам в одном структурированном массиве NumPy (PRIMITIVE_DTYPE):
+начальное и целевое состояния, обе параметризации, стоимость (интеграл квадрата кривизны), статус решения и число итераций. Отдельный объект ShortTrajectory
+создаётся только по запросу (методом trajectory).
+"""
+
+# коды статуса решения задачи генерации примитива:
+STATUS_NOT_SOLVED = 0  # примитив ещё не генерировался
+STATUS_CONVERGED = 1   # метод Ньютона сошёлся
+STATUS_FAILED = 2      # метод Ньютона не сошёлся (причина не уточняется)
+STATUS_MAX_ITER = 3    # исчерпан лимит итераций
+STATUS_SINGULAR = 4    # матрица Якоби вырождена
+STATUS_DIVERGED = 5    # параметры или невязка ушли в бесконечность (или стали недопустимыми)
+# досрочные остановки (см. trajectory-generation/divergence.py):
+STATUS_BUDGET = 6           # исчерпан бюджет времени или интегрирований
+STATUS_RUNAWAY_LENGTH = 7   # длина траектории ушла далеко от расстояния между start и goal
+STATUS_ILL_CONDITIONED = 8  # матрица Якоби плохо обусловлена
+STATUS_WINDING = 9          # траектория накручивает петли сверх требуемого поворота
+STATUS_STALLED = 10         # невязка за окно итераций не уменьшается
+STATUS_CANCELLED = 11       # поиск отменён извне (например, задачу уже решила параллельная попытка)
+STATUS_INACCURATE = 12      # невязка мала только при интегрировании быстрой квадратурой, а проверка с контролем точности
+                            # её не подтвердила (см. verify_converged в trajectory-generation/trajectory_optimization.py)
+
+STATUS_NAMES = {STATUS_NOT_SOLVED: "not_solved", STATUS_CONVERGED: "converged", STATUS_FAILED: "failed",
+                STATUS_MAX_ITER: "max_iter", STATUS_SINGULAR: "singular", STATUS_DIVERGED: "diverged",
+                STATUS_BUDGET: "budget", STATUS_RUNAWAY_LENGTH: "runaway_length", STATUS_ILL_CONDITIONED: "ill_conditioned",
+                STATUS_WINDING: "winding", STATUS_STALLED: "stalled", STATUS_CANCELLED: "cancelled",
+                STATUS_INACCURATE: "inaccurate"}
+
+PRIMITIVE_DTYPE = np.dtype([
+    ("start", np.float64, (4,)),  # начальное состояние: x, y, theta, k
+    ("goal", np.float64, (4,)),   # целевое состояние: x, y, theta, k
+    ("a", np.float64), ("b", np.float64), ("c", np.float64), ("length", np.float64),  # первая параметризация
+    ("k1", np.float64), ("k2", np.float64), ("log_length", np.float64),               # вторая параметризация (kf = goal.k)
+    ("curvature_cost", np.float64),  # интеграл квадрата кривизны (см. curvature_cost; длина - в столбце length)
+    ("status", np.int8),          # один из кодов STATUS_*
+    ("iterations", np.int32),     # число итераций метода Ньютона
+])
+
+
+
+class PrimitiveArray:
+    """
+    Столбцовый контейнер для набора примитивов (например, целого control set), хранящий всё в структурированном массиве data.
+
+    Столбцы доступны по имени: prims["length"], prims["start"] (массив (N, 4)) и т.д. Индексация числом возвращает
+    объект ShortTrajectory, а срезом или маской - новый PrimitiveArray (вид на те же данные).
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data=0) -> None:
+        """
+            data: либо число примитивов (создаётся пустой массив со статусом STATUS_NOT_SOLVED),
+                  либо готовый структурированный массив с типом PRIMITIVE_DTYPE.
+        """
+
+        if isinstance(data, np.ndarray):
+            assert data.dtype == PRIMITIVE_DTYPE, "Массив должен иметь тип PRIMITIVE_DTYPE!"
+            self.data = data
+        else:
+            self.data = np.zeros(int(data), dtype=PRIMITIVE_DTYPE)
+
+
+    @classmethod
+    def from_batch(cls, starts, goals, success: np.ndarray, steps: np.ndarray, params: np.ndarray) -> "PrimitiveArray":
+        """
+        Собирает контейнер из результата пакетного решения (см. optimization_Newton_batch).
+            starts, goals: начальные и целевые состояния (списки State или массивы (N, 4)),
+            success, steps, params: то, что вернул optimization_Newton_batch (вместо success можно передать массив кодов STATUS_*).
+        """
+
+        starts, goals = states_to_array(starts), states_to_array(goals)
+        prims = cls(len(starts))
+        data = prims.data
+        data["start"], data["goal"] = starts, goals
+        data["k1"], data["k2"], data["log_length"] = params[:, 0], params[:, 1], params[:, 2]
+        with np.errstate(all="ignore"):
+            data["a"], data["b"], data["c"], data["length"] = curve_to_coef_params(starts[:, 3], params[:, 0], params[:, 1],
+                                                                                    goals[:, 3], params[:, 2])
+        success = np.asarray(success)
+        data["status"] = np.where(success, STATUS_CONVERGED, STATUS_FAILED) if success.dtype == bool else success  # или сразу коды статуса
+        data["iterations"] = steps
+        prims.update_costs()
+        return prims
+
+
+    @classmethod
+    def from_trajectories(cls, trajs, iterations=None) -> "PrimitiveArray":
+        """
+        Собирает контейнер из списка траекторий ShortTrajectory (с уже установленными параметрами).
+            trajs: список траекторий (None в списке означает несошедшуюся задачу, такие записи пропускаются),
+            iterations: (необязательно) число итераций для каждой траектории (в том же порядке, что и trajs).
+        """
+
+        if iterations is not None:
+            iterations = [it for traj, it in zip(trajs, iterations) if traj is not None]
+        trajs = [traj for traj in trajs if traj is not None]
+        prims = cls(len(trajs))
+        data = prims.data
+        data["start"] = states_to_array([traj.start for traj in trajs])
+        data["goal"] = states_to_array([traj.goal for traj in trajs])
+        for name in ("a", "b", "c", "length", "k1", "k2", "log_length"):
+            data[name] = [getattr(traj, name) for traj in trajs]
+        data["status"] = STATUS_CONVERGED
+        if iterations is not None:
+            data["iterations"] = iterations
+        prims.update_costs()
+        return prims
+
+
+    @classmethod
+    def concatenate(cls, arrays) -> "PrimitiveArray":
+        """ Объединяет несколько контейнеров в один. """
+        return cls(np.concatenate([prims.data for prims in arrays]))
+
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+    def __getitem__(self, key):
+        if isinstance(key, str):  # столбец
+            return self.data[key]
+        if isinstance(key, (int, np.integer)):  # отдельный примитив
+            return self.trajectory(key)
+        return PrimitiveArray(self.data[key])  # срез, маска или массив индексов
+
+
+    def trajectory(self, i: int, integrator=None) -> ShortTrajectory:
+        """
+        Создаёт объект ShortTrajectory для i-го примитива.
+            i: номер примитива,
+            integrator: движок интегрирования для создаваемой траектории (None - DEFAULT_INTEGRATOR).
+        """
+
+        row = self.data[i]
+        traj = ShortTrajectory(State(*row["start"].tolist()), State(*row["goal"].tolist()), integrator)
+        return traj.set_coef_params(float(row["a"]), float(row["b"]), float(row["c"]), float(row["length"]))
+
+
+    def update_costs(self) -> None:
+        """ Пересчитывает столбец curvature_cost по параметрам a, b, c, length (у несошедшихся примитивов - нули). """
+        data = self.data
+        ok = data["status"] == STATUS_CONVERGED
+        data["curvature_cost"] = 0.0
+        data["curvature_cost"][ok] = curvature_cost(data["start"][ok, 3], data["a"][ok], data["b"][ok], data["c"][ok], data["length"][ok])
+
+
+    def converged(self) -> "PrimitiveArray":
+        """ Только успешно сгенерированные примитивы. """
+        return self[self.data["status"] == STATUS_CONVERGED]
+
+
+
+class SolveResult:
+    """
+    Результат генерации одного примитива (то, что возвращают optimization_Newton и baseline_optimization_Newton).
+
+        status: код STATUS_* (сошёлся / исчерпан лимит итераций / вырожденная матрица Якоби / расхождение / досрочная остановка),
+        traj: найденная траектория (None, если метод не сошёлся),
+        params: последние значения параметров метода Ньютона,
+        iterations: число сделанных итераций,
+        residual_norm: норма невязки на последней итерации,
+        residual_history: нормы невязки на всех итерациях,
+        wall_time: время решения в секундах (time.perf_counter),
+        integrations: число проходов численного интегрирования по всей траектории (вычислений подынтегральной функции
+                      во всех узлах квадратуры) - основная часть стоимости решения,
+        jacobian_builds: число вычислений матрицы Якоби,
+        strategy: какая стратегия запасного портфеля нашла решение (см. trajectory-generation/fallback.py; None - обычное решение).
+
+    Для совместимости со старым кодом результат можно распаковать как пару: steps, traj = optimization_Newton(...),
+    а в логическом контексте он истинен только при успешном решении.
+    """
+
+    __slots__ = ("status", "traj", "params", "iterations", "residual_norm", "residual_history",
+                 "wall_time", "integrations", "jacobian_builds", "strategy")
+
+    def __init__(self, status: int, traj: Optional[ShortTrajectory], params: np.ndarray, iterations: int,
+                 residual_history: list, wall_time: float, integrations: int, jacobian_builds: int,
+                 strategy: Optional[str] = None) -> None:
+        self.status = status
+        self.traj = traj
+        self.params = params
+        self.iterations = iterations
+        self.residual_history = residual_history
+        self.residual_norm = residual_history[-1] if residual_history else np.inf
+        self.wall_time = wall_time
+        self.integrations = integrations
+        self.jacobian_builds = jacobian_builds
+        self.strategy = strategy
+
+    @property
+    def converged(self) -> bool:
+        return self.status == STATUS_CONVERGED
+
+    @property
+    def status_name(self) -> str:
+        return STATUS_NAMES[self.status]
+
+    def __bool__(self) -> bool:
+        return self.converged
+
+    def __iter__(self):
+        return iter((self.iterations, self.traj))
+
+    def __repr__(self) -> str:
+        return (f"SolveResult(status={self.status_name}, iterations={self.iterations}, residual_norm={self.residual_norm:.3g}, "
+                f"wall_time={self.wall_time:.4f}, integrations={self.integrations}, jacobian_builds={self.jacobian_builds})")
@@ -0,0 +1,263 @@
+""" Воспроизводимые замеры производительности генерации примитивов и сравнение замеров между собой (поиск регрессий). """
+
+import numpy as np
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+from functools import partial
+from multiprocessing import cpu_count
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, "../common/"))
+sys.path.append(os.path.join(HERE, "../trajectory-generation/"))
+from PRIM_structs import State, ShortTrajectory
+from PRIM_arclength import ArcLengthIndex
+from trajectory_optimization import optimization_Newton, calc_Jacobian_matrix
+from baseline_trajectory_optimization import baseline_optimization_Newton
+import fast_newton
+from run_experiment import generate_experiments
+from run_grid_experiment import generate_grid_tasks
+from task_pool import run_tasks, warm_up_solvers
+
+
+
+SOLVERS = {'baseline': baseline_optimization_Newton, 'proposed': optimization_Newton}
+SOLVE_PARAMS = {'iters': 100, 'lr': 0.1, 'eps': 1e-2}  # как в run_experiment.py
+
+# метрики, которые тем лучше, чем больше (остальные - чем меньше, тем лучше)
+HIGHER_IS_BETTER = ('success_rate', 'primitives_per_sec_single', 'primitives_per_sec_multi')
+
+# метрики, зависящие от движка fast_newton: замеры с разными движками (Numba и NumPy отличаются в десятки раз) не сравниваются
+FAST_BACKEND_META = ('fast_backend', 'have_numba')
+FAST_BACKEND_METRICS = ('micro_us.fast_solve',)
+
+
+
+# --- Наборы сценариев ---
+
+def load_scenarios(name, limit=None, seed=0):
+    """
+    Сценарии (start, goal) для замеров: 'experiments' (generate_experiments) или 'grid' (generate_grid_tasks).
+    Если задан limit, берётся случайная (с фиксированным seed) выборка из limit сценариев - она одинакова во всех запусках.
+    """
+    if name == 'experiments':
+        scenarios = generate_experiments()
+    elif name == 'grid':
+        scenarios = [(start, goal) for _, _, _, start, goal in generate_grid_tasks()]
+    else:
+        raise ValueError(f"Неизвестный набор сценариев: {name}")
+    if limit is not None and limit < len(scenarios):
+        chosen = np.sort(np.random.default_rng(seed).choice(len(scenarios), size=limit, replace=False))
+        scenarios = [scenarios[i] for i in chosen]
+    return scenarios
+
+
+
+# --- Замеры решателей ---
+
+def _solve_row(row, solver_name='proposed'):
+    # задача для run_tasks: строка (start: x, y, theta, k, goal: x, y, theta, k) -> успех
+    return SOLVERS[solver_name](State(*row[:4].tolist()), State(*row[4:].tolist()), **SOLVE_PARAMS).converged
+
+
+def bench_solver(name, scenarios, workers=0):
+    """
+    Замер одного решателя на наборе сценариев в текущем процессе: перцентили времени одного решения (time.perf_counter),
+    доля успехов, число примитивов в секунду и работа (проходы интегрирования, матрицы Якоби, итерации) на сошедшийся примитив.
+    Если workers > 0, дополнительно замеряется пропускная способность в пуле из workers процессов (см. task_pool.py).
+    """
+    solver = SOLVERS[name]
+    latencies, converged = [], []
+    integrations, jacobian_builds, iterations = 0, 0, 0
+    for start, goal in scenarios:
+        t_start = time.perf_counter()
+        result = solver(start, goal, **SOLVE_PARAMS)
+        latencies.append(time.perf_counter() - t_start)
+        converged.append(result.converged)
+        if result.converged:
+            integrations += result.integrations
+            jacobian_builds += result.jacobian_builds
+            iterations += result.iterations
+
+    latencies = np.array(latencies)
+    solved = max(int(np.sum(converged)), 1)
+    stats = {
+        'tasks': len(scenarios),
+        'success_rate': float(np.mean(converged)),
+        'latency_ms': {f'p{q}': float(np.percentile(latencies, q) * 1e3) for q in (50, 95, 99)},
+        'primitives_per_sec_single': float(np.sum(converged) / np.sum(latencies)),
+        'integrations_per_primitive': integrations / solved,
+        'jacobian_builds_per_primitive': jacobian_builds / solved,
+        'iterations_per_primitive': iterations / solved,
+    }
+    stats['latency_ms']['mean'] = float(np.mean(latencies) * 1e3)
+
+    if workers > 0:
+        rows = [[start.x, start.y, start.theta, start.k, goal.x, goal.y, goal.theta, goal.k] for start, goal in scenarios]
+        t_start = time.perf_counter()
+        successes = sum(run_tasks(rows, partial(_solve_row, solver_name=name), workers=workers, warmup=warm_up_solvers))
+        stats['primitives_per_sec_multi'] = successes / (time.perf_counter() - t_start)
+        stats['workers'] = workers
+    return stats
+
+
+
+# --- Микро-замеры отдельных операций ---
+
+def _time_call(fn, repeat=5, min_time=0.05):
+    """ Медианное (по repeat повторам) время одного вызова fn в микросекундах; число вызовов в повторе подбирается по min_time. """
+    number = 1
+    while True:
+        t_start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - t_start >= min_time:
+            break
+        number *= 2
+    times = []
+    for _ in range(repeat):
+        t_start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - t_start) / number)
+    return float(np.median(times) * 1e6)
+
+
+def bench_micro(scenarios, count=20):
+    """
+    Микро-замеры на первых count сошедшихся примитивах набора: final_state, calc_Jacobian_matrix, set_curve_params,
+    семплирование (sample_states с шагом 0.02), состояние в середине траектории - напрямую (state) и через индекс по длине
+    дуги (arc_index_state, см. PRIM_arclength.py), и решение задачи целиком выбранным движком fast_newton (fast_solve; доли
+    миллисекунды - только с Numba, без него это optimization_Newton с точной матрицей Якоби). Возвращает медиану по примитивам времени одного вызова в микросекундах.
+    """
+    trajs = []
+    for start, goal in scenarios:
+        result = optimization_Newton(start, goal, **SOLVE_PARAMS)
+        if result.converged:
+            trajs.append(result.traj)
+        if len(trajs) == count:
+            break
+
+    micro = {'final_state': [], 'calc_Jacobian_matrix': [], 'set_curve_params': [], 'sample_states': [],
+             'state': [], 'arc_index_state': [], 'fast_solve': []}
+    for traj in trajs:
+        params = np.array([traj.k1, traj.k2, traj.log_length])
+        probe = ShortTrajectory(traj.start, traj.goal)
+        micro['final_state'].append(_time_call(traj.final_state))
+        micro['calc_Jacobian_matrix'].append(_time_call(lambda: calc_Jacobian_matrix(traj, params)))
+        micro['set_curve_params'].append(_time_call(lambda: probe.set_curve_params(*params)))
+        micro['sample_states'].append(_time_call(lambda: traj.sample_states(0.02)))
+        index = ArcLengthIndex(traj)
+        micro['state'].append(_time_call(lambda: traj.state(traj.length / 2)))
+        micro['arc_index_state'].append(_time_call(lambda: index.state(traj.length / 2)))
+        micro['fast_solve'].append(_time_call(lambda: fast_newton.solve(traj.start, traj.goal, **SOLVE_PARAMS)))
+    return {name: float(np.median(times)) if times else None for name, times in micro.items()}
+
+
+
+def run_benchmark(scenario='experiments', limit=None, seed=0, workers=0, solvers=tuple(SOLVERS)):
+    scenarios = load_scenarios(scenario, limit, seed)
+    warm_up_solvers()
+    fast_newton.warm_up()
+    return {
+        'meta': {
+            'scenario': scenario, 'tasks': len(scenarios), 'limit': limit, 'seed': seed, 'solve_params': SOLVE_PARAMS,
+            'python': platform.python_version(), 'numpy': np.__version__, 'fast_backend': fast_newton.get_backend(),
+            'have_numba': fast_newton.HAVE_NUMBA,
+            'machine': platform.machine(),
+            'cpu_count': cpu_count(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'solvers': {name: bench_solver(name, scenarios, workers) for name in solvers},
+        'micro_us': bench_micro(scenarios),
+    }
+
+
+
+# --- Сравнение двух замеров ---
+
+def _flatten(tree, prefix=''):
+    flat = {}
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f'{prefix}{key}'] = float(value)
+    return flat
+
+
+def fast_backends_differ(old, new):
+    """ Сделаны ли замеры разными движками fast_newton (у старых замеров без 'have_numba' движок считается неизвестным). """
+    return any(old['meta'].get(key) != new['meta'].get(key) for key in FAST_BACKEND_META)
+
+
+def compare_results(old, new, tolerance=0.1):
+    """
+    Сравнивает метрики двух замеров (meta не сравнивается). Регрессия - ухудшение метрики больше чем на долю tolerance.
+    Метрики FAST_BACKEND_METRICS замеров с разными движками fast_newton пропускаются.
+    Возвращает список строк (метрика, было, стало, относительное изменение, регрессия ли).
+    """
+    old_flat = _flatten({k: v for k, v in old.items() if k != 'meta'})
+    new_flat = _flatten({k: v for k, v in new.items() if k != 'meta'})
+    skip = FAST_BACKEND_METRICS if fast_backends_differ(old, new) else ()
+    rows = []
+    for key in sorted(old_flat.keys() & new_flat.keys()):
+        if key.endswith(('.tasks', '.workers')) or key in skip:
+            continue
+        before, after = old_flat[key], new_flat[key]
+        change = (after - before) / abs(before) if before else 0.0
+        worse = -change if key.rsplit('.', 1)[-1] in HIGHER_IS_BETTER else change
+        rows.append((key, before, after, change, worse > tolerance))
+    return rows
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замеры производительности генерации примитивов.")
+    subparsers = parser.add_subparsers(dest='action', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Выполнить замеры и сохранить их в JSON.")
+    run_parser.add_argument('--scenario', choices=['experiments', 'grid'], default='experiments', help="Набор сценариев.")
+    run_parser.add_argument('--limit', type=int, default=300, help="Число сценариев (выборка с фиксированным seed; 0 - все).")
+    run_parser.add_argument('--seed', type=int, default=0, help="Seed выборки сценариев.")
+    run_parser.add_argument('--workers', type=int, default=cpu_count(), help="Процессов для замера пропускной способности (0 - не замерять).")
+    run_parser.add_argument('--solvers', nargs='+', choices=list(SOLVERS), default=list(SOLVERS), help="Замеряемые решатели.")
+    run_parser.add_argument('--output', default='benchmark.json', help="JSON-файл для результатов.")
+
+    compare_parser = subparsers.add_parser('compare', help="Сравнить два JSON-файла замеров.")
+    compare_parser.add_argument('baseline', help="Эталонный замер.")
+    compare_parser.add_argument('candidate', help="Новый замер.")
+    compare_parser.add_argument('--tolerance', type=float, default=0.1, help="Допустимое относительное ухудшение метрики.")
+
+    args = parser.parse_args()
+
+    if args.action == 'run':
+        results = run_benchmark(args.scenario, args.limit or None, args.seed, args.workers, args.solvers)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        for name, stats in results['solvers'].items():
+            latency = stats['latency_ms']
+            print(f"{name}: success {stats['success_rate'] * 100:.1f}%, p50/p95/p99 = {latency['p50']:.2f}/{latency['p95']:.2f}/"
+                  f"{latency['p99']:.2f} мс, {stats['primitives_per_sec_single']:.1f} примитивов/с на одном ядре")
+        print("Микро-замеры (мкс): " + ", ".join(f"{k} = {v:.1f}" for k, v in results['micro_us'].items() if v is not None))
+        if results['meta']['fast_backend'] != 'numba':
+            print("fast_solve замерен на движке numpy (Numba не установлен): цель в доли миллисекунды на задачу "
+                  "достижима только с Numba")
+        print(f"Результаты сохранены в '{args.output}'")
+
+    elif args.action == 'compare':
+        with open(args.baseline) as f:
+            old = json.load(f)
+        with open(args.candidate) as f:
+            new = json.load(f)
+        if fast_backends_differ(old, new):
+            engines = [{key: m['meta'].get(key) for key in FAST_BACKEND_META} for m in (old, new)]
+            print(f"Замеры сделаны разными движками fast_newton ({engines[0]} и {engines[1]}), "
+                  f"{', '.join(FAST_BACKEND_METRICS)} не сравниваются")
+        rows = compare_results(old, new, args.tolerance)
+        for key, before, after, change, regression in rows:
+            print(f"{'РЕГРЕССИЯ ' if regression else '          '}{key:50s} {before:12.4g} -> {after:12.4g} ({change * 100:+.1f}%)")
+        regressions = sum(regression for *_, regression in rows)
+        print(f"\nРегрессий: {regressions} (допуск {args.tolerance * 100:.0f}%)")
+        sys.exit(1 if regressions else 0)
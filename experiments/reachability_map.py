@@ -0,0 +1,312 @@
+""" Адаптивные карты достижимости: сетка целей сгущается только там, где меняется исход решения (на границе успех/неудача). """
+
+import numpy as np
+import os
+import io
+import sys
+import json
+import time
+import argparse
+from itertools import product
+from functools import partial
+from multiprocessing import cpu_count
+from tqdm import tqdm
+HERE = os.path.dirname(os.path.abspath(__file__))  # пути от расположения скрипта, а не от текущей директории
+sys.path.append(os.path.join(HERE, "../common/"))
+sys.path.append(os.path.join(HERE, "../trajectory-generation/"))
+from PRIM_structs import State, STATUS_NOT_SOLVED, STATUS_CONVERGED, STATUS_NAMES
+from trajectory_optimization import optimization_Newton
+from baseline_trajectory_optimization import baseline_optimization_Newton
+from divergence import SolveBudget
+from task_pool import run_tasks, warm_up_solvers
+
+
+
+METHODS = {'baseline': baseline_optimization_Newton, 'proposed': optimization_Newton}
+SOLVE_PARAMS = {'iters': 300, 'lr': 0.1, 'eps': 1e-2}  # как в run_grid_experiment.py
+START = State(0.0, 0.0, 0.0, 0.0)
+
+
+
+"""
+Карта хранится на самой подробной решётке целей (x, y, theta) уровня levels: по x и y узлы с шагом base_step / 2^levels
+(концы диапазонов - узлы), по theta - base_shape[2] * 2^levels направлений на [-pi, pi) (ось циклическая).
+Уровень 0 - каждый 2^levels-й узел (исходная грубая сетка), он решается целиком. На уровне l рассматриваются ячейки
+(кубы из 8 узлов) решётки с шагом 2^(levels-l+1): если все вершины ячейки решены методом, но исход (сошёлся ли метод)
+в них разный, ячейка делится пополам по каждой оси и этот метод решает её узлы с шагом 2^(levels-l). Ячейки с одинаковым
+исходом во всех вершинах дальше не делятся - внутри них исход считается тем же. Каждый метод сгущается независимо:
+граница успеха у разных методов своя, и "шумная" граница одного метода не заставляет решать лишние узлы другой.
+Совместное сгущение (все методы решают одни и те же узлы, удобно для их сравнения) - параметр refine_on.
+
+Для каждого метода и узла хранятся код статуса STATUS_* (STATUS_NOT_SOLVED - узел ещё не решался), число итераций
+и итоговая норма невязки - три N-мерных массива в файле .npz вместе с описанием карты (meta). Повторный запуск с тем же
+файлом решает только узлы, которых в нём ещё нет, поэтому можно прервать построение, продолжить его, увеличить число
+уровней (старая карта вкладывается в более подробную решётку) или пересчитать один из методов после его изменения.
+"""
+
+
+class ReachabilityMap:
+    """
+    Карта достижимости целей из START.
+
+        x_range, y_range: диапазоны координат цели,
+        base_shape: число узлов грубой сетки по x, y и число направлений theta,
+        levels: число уровней сгущения,
+        methods: методы, для которых строится карта (ключи METHODS),
+        settings: всё, что влияет на результат решения (параметры метода, досрочная остановка и т.п.) - по нему
+                  проверяется, что сохранённые результаты можно переиспользовать.
+    """
+
+    def __init__(self, x_range=(-5.0, 5.0), y_range=(-5.0, 5.0), base_shape=(11, 11, 12), levels=3,
+                 methods=tuple(METHODS), settings=None) -> None:
+        self.x_range, self.y_range = tuple(map(float, x_range)), tuple(map(float, y_range))
+        self.base_shape = tuple(map(int, base_shape))
+        self.levels = int(levels)
+        self.methods = list(methods)
+        self.settings = dict(settings or {})
+        scale = 2 ** self.levels
+        self.shape = ((self.base_shape[0] - 1) * scale + 1, (self.base_shape[1] - 1) * scale + 1, self.base_shape[2] * scale)
+        self.status = {m: np.full(self.shape, STATUS_NOT_SOLVED, dtype=np.int8) for m in self.methods}
+        self.iterations = {m: np.zeros(self.shape, dtype=np.int32) for m in self.methods}
+        self.residual = {m: np.full(self.shape, np.nan, dtype=np.float32) for m in self.methods}
+
+
+    @property
+    def meta(self) -> dict:
+        return {'x_range': self.x_range, 'y_range': self.y_range, 'base_shape': self.base_shape, 'levels': self.levels,
+                'methods': self.methods, 'settings': self.settings}
+
+
+    def goals(self, flat: np.ndarray) -> np.ndarray:
+        """ Целевые состояния (M, 3): x, y, theta для узлов с номерами flat (в развёрнутом массиве карты). """
+
+        i, j, k = np.unravel_index(flat, self.shape)
+        xs = np.linspace(*self.x_range, self.shape[0])[i]
+        ys = np.linspace(*self.y_range, self.shape[1])[j]
+        thetas = -np.pi + 2 * np.pi * k / self.shape[2]
+        return np.column_stack([xs, ys, thetas])
+
+
+    def solved(self, methods=None) -> np.ndarray:
+        """ Маска узлов, решённых всеми методами methods (None - всеми методами карты). """
+        return np.logical_and.reduce([self.status[m] != STATUS_NOT_SOLVED for m in (methods or self.methods)])
+
+
+    @staticmethod
+    def _corner(values: np.ndarray, S: int, dx: int, dy: int, dt: int) -> np.ndarray:
+        # значения в вершине (dx, dy, dt) всех ячеек решётки с шагом S (по theta ось циклическая, ячеек столько же, сколько узлов)
+        sub = np.roll(values[::S, ::S, ::S], -dt, axis=2)
+        return sub[dx:sub.shape[0] - 1 + dx, dy:sub.shape[1] - 1 + dy]
+
+
+    def _split_nodes(self, level: int, solved: np.ndarray, deciders) -> np.ndarray:
+        # узлы (номера в развёрнутом массиве) ячеек уровня level, все вершины которых решены (маска solved),
+        # а исход хотя бы одного из методов deciders в вершинах разный
+        S = 2 ** (self.levels - level + 1)  # шаг ячеек, которые делятся на этом уровне
+        s = S // 2
+        corners_solved, disagree = None, None
+        for dx, dy, dt in product((0, 1), repeat=3):
+            corner = self._corner(solved, S, dx, dy, dt)
+            corners_solved = corner if corners_solved is None else corners_solved & corner
+            success = np.stack([self._corner(self.status[m] == STATUS_CONVERGED, S, dx, dy, dt) for m in deciders])
+            if disagree is None:
+                first, disagree = success, np.zeros(corner.shape, dtype=bool)
+            disagree |= np.any(success != first, axis=0)
+
+        cells = np.argwhere(corners_solved & disagree) * S  # нижние вершины делимых ячеек
+        if len(cells) == 0:
+            return np.zeros(0, dtype=np.int64)
+        steps = np.array(list(product((0, s, 2 * s), repeat=3)))
+        nodes = (cells[:, None, :] + steps[None, :, :]).reshape(-1, 3)
+        nodes[:, 2] %= self.shape[2]
+        return np.unique(np.ravel_multi_index(nodes.T, self.shape))
+
+
+    def candidates(self, level: int, refine_on=None) -> dict:
+        """
+        Узлы, которые нужно решить на уровне level: словарь {метод: номера узлов (в развёрнутом массиве), ещё не решённых
+        этим методом}. По умолчанию каждый метод сгущается по своему исходу; refine_on - совместное сгущение: ячейка
+        делится для всех методов карты, если исход расходится хотя бы у одного из методов refine_on.
+        """
+
+        if level == 0:
+            S = 2 ** self.levels
+            grid = np.zeros(self.shape, dtype=bool)
+            grid[::S, ::S, ::S] = True
+            return {m: np.flatnonzero(grid & (self.status[m] == STATUS_NOT_SOLVED)) for m in self.methods}
+
+        if refine_on is None:
+            flats = {m: self._split_nodes(level, self.solved([m]), [m]) for m in self.methods}
+        else:
+            joint = self._split_nodes(level, self.solved(), list(refine_on))
+            flats = {m: joint for m in self.methods}
+        return {m: flat[self.status[m].ravel()[flat] == STATUS_NOT_SOLVED] for m, flat in flats.items()}
+
+
+    def success_map(self, method: str) -> np.ndarray:
+        """
+        Исход (сошёлся ли метод) во всех узлах самой подробной решётки: в нерешённых узлах - исход вершины ячейки
+        самого подробного уровня, в которой узел лежит (внутри неразделённых ячеек исход во всех вершинах одинаков).
+        """
+
+        success = self.status[method] == STATUS_CONVERGED
+        solved = self.status[method] != STATUS_NOT_SOLVED
+        result = np.zeros(self.shape, dtype=bool)
+        for level in range(self.levels + 1):
+            S = 2 ** (self.levels - level)
+            index = np.ix_(*(np.arange(n) // S * S for n in self.shape))  # нижняя вершина ячейки с шагом S
+            known = solved[index]
+            result[known] = success[index][known]
+        return result
+
+
+    def save(self, filename: str) -> None:
+        """ Записывает карту в .npz (сначала во временный файл, чтобы прерванная запись не испортила старую карту). """
+
+        arrays = {'meta': np.array(json.dumps(self.meta))}
+        for m in self.methods:
+            arrays.update({f'{m}_status': self.status[m], f'{m}_iterations': self.iterations[m], f'{m}_residual': self.residual[m]})
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        with open(filename + '.tmp', 'wb') as f:
+            f.write(buffer.getvalue())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(filename + '.tmp', filename)
+
+
+    def merge_from(self, filename: str) -> int:
+        """
+        Переносит результаты из сохранённой карты с теми же диапазонами, грубой сеткой и настройками решения (уровней в ней
+        может быть меньше - тогда её узлы вкладываются в текущую решётку; больше - тогда берутся только общие узлы).
+        Методы, которых нет в текущей карте, пропускаются. Возвращает число перенесённых решённых узлов.
+        """
+
+        with np.load(filename) as data:
+            meta = json.loads(str(data['meta']))
+            for key in ('x_range', 'y_range', 'base_shape', 'settings'):
+                if (tuple(meta[key]) if isinstance(meta[key], list) else meta[key]) != getattr(self, key):
+                    raise ValueError(f"Карта '{filename}' построена с другим параметром {key}: {meta[key]}")
+            diff = self.levels - meta['levels']
+            merged = 0
+            for m in self.methods:
+                if f'{m}_status' not in data:
+                    continue
+                if diff >= 0:  # старая решётка реже: её узел i - это узел i * 2^diff новой
+                    target = tuple(slice(None, None, 2 ** diff) for _ in range(3))
+                    source = (slice(None),) * 3
+                else:          # старая решётка подробнее: берём каждый 2^-diff-й её узел
+                    target = (slice(None),) * 3
+                    source = tuple(slice(None, None, 2 ** -diff) for _ in range(3))
+                self.status[m][target] = data[f'{m}_status'][source]
+                self.iterations[m][target] = data[f'{m}_iterations'][source]
+                self.residual[m][target] = data[f'{m}_residual'][source]
+                merged += int(np.sum(self.status[m] != STATUS_NOT_SOLVED))
+        return merged
+
+
+    def invalidate(self, method: str) -> None:
+        """ Забывает результаты метода (например, после его изменения), чтобы пересчитать их при следующем построении. """
+
+        self.status[method][:] = STATUS_NOT_SOLVED
+        self.iterations[method][:] = 0
+        self.residual[method][:] = np.nan
+
+
+
+# --- Решение узлов в пуле процессов ---
+
+def solve_node(row, methods=tuple(METHODS), budget=None):
+    """
+    Задача для run_tasks: строка (номер узла, x, y, theta цели, затем по флагу на каждый метод methods - решать ли им).
+    Возвращает (номер узла, [(метод, статус, итерации, норма невязки), ...]).
+    """
+
+    goal = State(float(row[1]), float(row[2]), float(row[3]), 0.0)
+    results = []
+    for method, needed in zip(methods, row[4:]):
+        if needed:
+            result = METHODS[method](START, goal, budget=budget, **SOLVE_PARAMS)
+            results.append((method, result.status, result.iterations, result.residual_norm))
+    return int(row[0]), results
+
+
+def build(reach: ReachabilityMap, filename: str, workers: int = cpu_count(), refine_on=None, budget=None, seed_table=None,
+          chunk_size=None, save_interval: float = 30.0) -> int:
+    """
+    Достраивает карту reach уровень за уровнем, решая узлы в пуле из workers процессов (refine_on - см.
+    ReachabilityMap.candidates). Карта сохраняется в filename после каждого уровня и не реже раза в save_interval секунд.
+    Возвращает число решённых в этом запуске задач (пар метод - узел).
+    """
+
+    total = 0
+    for level in range(reach.levels + 1):
+        todo = reach.candidates(level, refine_on)
+        flat = np.unique(np.concatenate([todo[m] for m in reach.methods]))
+        if len(flat) == 0:
+            continue
+        needed = np.stack([np.isin(flat, todo[m]) for m in reach.methods], axis=1)  # какие методы решают каждый узел
+        rows = np.column_stack([flat, reach.goals(flat), needed])
+        task = partial(solve_node, methods=tuple(reach.methods), budget=budget)
+
+        last_save = time.monotonic()
+        results = run_tasks(rows, task, workers=workers, chunk_size=chunk_size, warmup=partial(warm_up_solvers, seed_table))
+        for node, solved in tqdm(results, total=len(rows), desc=f"уровень {level}"):
+            index = np.unravel_index(node, reach.shape)
+            for method, status, iterations, residual in solved:
+                reach.status[method][index] = status
+                reach.iterations[method][index] = iterations
+                with np.errstate(over='ignore'):  # невязка разошедшегося решения не помещается в float32 - станет inf
+                    reach.residual[method][index] = residual
+            if time.monotonic() - last_save >= save_interval:
+                reach.save(filename)
+                last_save = time.monotonic()
+        reach.save(filename)
+        total += int(np.sum(needed))
+    return total
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Построение адаптивных карт достижимости методов генерации примитивов.")
+    parser.add_argument('--output', default='reachability.npz', help="Файл карты (.npz); если он есть, решённые узлы переиспользуются.")
+    parser.add_argument('--levels', type=int, default=3, help="Число уровней сгущения сетки.")
+    parser.add_argument('--base', type=int, nargs=3, default=[11, 11, 12], metavar=('NX', 'NY', 'NTHETA'), help="Грубая сетка: узлов по x, y и направлений.")
+    parser.add_argument('--range', type=float, default=5.0, help="Цели в квадрате [-range, range] x [-range, range].")
+    parser.add_argument('--methods', nargs='+', choices=list(METHODS), default=list(METHODS), help="Методы, для которых строится карта.")
+    parser.add_argument('--refine-on', nargs='+', choices=list(METHODS), default=None, help="Совместное сгущение: ячейки делятся для всех методов по расхождению исхода этих методов (по умолчанию каждый метод сгущается по своему исходу).")
+    parser.add_argument('--invalidate', nargs='+', choices=list(METHODS), default=[], help="Пересчитать результаты этих методов (например, после их изменения).")
+    parser.add_argument('--workers', type=int, default=cpu_count(), help="Количество параллельных процессов.")
+    parser.add_argument('--chunk-size', type=int, default=None, help="Размер порции задач для процесса (по умолчанию подбирается автоматически).")
+    parser.add_argument('--seed-table', default=None, help="Таблица начальных приближений (.npz), загружаемая в каждый процесс.")
+    parser.add_argument('--early-stop', action='store_true', help="Досрочно прекращать поиск, если решение явно не будет найдено.")
+    args = parser.parse_args()
+
+    settings = {'solve_params': SOLVE_PARAMS, 'early_stop': args.early_stop,
+                'seed_table': os.path.abspath(args.seed_table) if args.seed_table else None}
+    reach = ReachabilityMap((-args.range, args.range), (-args.range, args.range), args.base, args.levels, args.methods, settings)
+    if os.path.exists(args.output):
+        print(f"Переиспользуются результаты из '{args.output}': {reach.merge_from(args.output)} решённых узлов.")
+    for method in args.invalidate:
+        reach.invalidate(method)
+
+    t_start = time.perf_counter()
+    solved = build(reach, args.output, args.workers, args.refine_on, SolveBudget() if args.early_stop else None,
+                   args.seed_table, args.chunk_size)
+    full = int(np.prod(reach.shape))
+
+    print("\n" + "="*40 + "\nКАРТА ДОСТИЖИМОСТИ ПОСТРОЕНА\n" + "="*40)
+    uniform = full * len(reach.methods)  # столько задач решала бы равномерная сетка той же подробности
+    total = sum(int(np.sum(reach.status[m] != STATUS_NOT_SOLVED)) for m in reach.methods)
+    print(f"Решётка {reach.shape[0]}x{reach.shape[1]}x{reach.shape[2]} ({full} узлов), решено в этом запуске: {solved} задач "
+          f"за {time.perf_counter() - t_start:.1f} сек.")
+    print(f"Всего решено {total} задач из {uniform} для равномерной сетки ({total / uniform * 100:.1f}%).")
+    for method in reach.methods:
+        status = reach.status[method]
+        known = status != STATUS_NOT_SOLVED
+        codes, counts = np.unique(status[known], return_counts=True)
+        print(f"{method}: решено {np.sum(known)} узлов ({np.sum(known) / full * 100:.1f}% равномерной сетки), "
+              f"доля достижимых целей {reach.success_map(method).mean() * 100:.2f}%, "
+              + ", ".join(f"{STATUS_NAMES[c]}: {n}" for c, n in zip(codes, counts)))
+    print(f"Карта сохранена в '{args.output}'")
+    print("="*40)
@@ -0,0 +1,119 @@
+""" Потоковая запись результатов экспериментов: дописываемый CSV, продолжение прерванного запуска и итоговая статистика на лету. """
+
+import csv
+import os
+import time
+import numpy as np
+
+
+
+def read_completed(filename, key_fields, on_row=None):
+    """
+    Читает уже записанные результаты прерванного запуска.
+    Возвращает множество ключей выполненных задач (кортежей значений key_fields в виде строк).
+    Недописанная последняя строка (запуск оборвался посреди записи) отрезается от файла.
+    on_row - необязательная функция, которая вызывается для каждой прочитанной строки (словаря), например чтобы
+    дополнить итоговую статистику уже посчитанными результатами.
+    """
+    completed = set()
+    if not os.path.exists(filename):
+        return completed
+
+    with open(filename, 'rb') as f:
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    if end < len(data):  # обрезаем оборванную строку
+        with open(filename, 'r+b') as f:
+            f.truncate(end)
+
+    with open(filename, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            completed.add(tuple(row[field] for field in key_fields))
+            if on_row is not None:
+                on_row(row)
+    return completed
+
+
+
+class ResultWriter:
+    """
+    Дописывает результаты в CSV по мере их поступления. Данные сбрасываются на диск (flush + fsync) каждые
+    flush_every строк или flush_interval секунд, так что при падении или Ctrl-C теряется не больше последней порции.
+    Заголовок пишется, только если файл новый (или пустой).
+    """
+
+    def __init__(self, filename, fieldnames, flush_every=1000, flush_interval=5.0):
+        self.filename = filename
+        new_file = not os.path.exists(filename) or os.path.getsize(filename) == 0
+        self.file = open(filename, 'a', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
+        if new_file:
+            self.writer.writeheader()
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.pending += 1
+        if self.pending >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+class RunningStats:
+    """
+    Итоговая статистика без хранения всех значений: число задач, число успехов, среднее (по Уэлфорду) и медиана
+    по логарифмической гистограмме (bins_per_decade корзин на порядок, относительная погрешность медианы ~ 1 / bins_per_decade).
+    """
+
+    def __init__(self, low=1e-7, high=1e4, bins_per_decade=200):
+        self.total = 0
+        self.successes = 0
+        self.count = 0
+        self.mean = 0.0
+        self.log_low = np.log10(low)
+        self.bins_per_decade = bins_per_decade
+        self.histogram = np.zeros(int(round((np.log10(high) - self.log_low) * bins_per_decade)) + 1, dtype=np.int64)
+
+    def add(self, success, value=None):
+        """ Учитывает одну задачу; value (например, время решения) - только для успешных. """
+        self.total += 1
+        if not success:
+            return
+        self.successes += 1
+        if value is None:
+            return
+        self.count += 1
+        self.mean += (value - self.mean) / self.count
+        index = int((np.log10(max(value, 10 ** self.log_low)) - self.log_low) * self.bins_per_decade)
+        self.histogram[min(index, len(self.histogram) - 1)] += 1
+
+    @property
+    def success_rate(self):
+        return self.successes / self.total if self.total else 0.0
+
+    @property
+    def median(self):
+        if self.count == 0:
+            return None
+        index = int(np.searchsorted(np.cumsum(self.histogram), (self.count + 1) / 2))
+        return 10 ** (self.log_low + (index + 0.5) / self.bins_per_decade)  # середина корзины
@@ -1,18 +1,21 @@
 """ Эксперимент по сравнению методов генерации примитивов движения. """
 
 import numpy as np
-import time
 import os
 import argparse
-import csv
-from multiprocessing import Pool, cpu_count
+from multiprocessing import cpu_count
 from tqdm import tqdm
+from functools import partial
 import sys
-sys.path.append("../common/") 
+HERE = os.path.dirname(os.path.abspath(__file__))  # пути от расположения скрипта, а не от текущей директории
+sys.path.append(os.path.join(HERE, "../common/"))
 from PRIM_structs import State
-sys.path.append("../trajectory-generation/")
+sys.path.append(os.path.join(HERE, "../trajectory-generation/"))
 from trajectory_optimization import optimization_Newton
 from baseline_trajectory_optimization import baseline_optimization_Newton
+from result_stream import ResultWriter, RunningStats, read_completed
+from PRIM_profiling import snapshot, format_report
+from task_pool import run_tasks, warm_up_solvers
 
 
 
@@ -69,38 +72,27 @@ def run_single_test(args):
     }
 
     # Baseline метод
-    try:
-        t_start = time.time()
-        steps, traj = baseline_optimization_Newton(start, goal, iters=iters, lr=lr, eps=eps)
-        t_end = time.time()
-        result_dict['baseline_success'] = True
-        result_dict['baseline_time'] = t_end - t_start
-        result_dict['baseline_params'] = f"{traj.a},{traj.b},{traj.c},{traj.length}"
-        result_dict['baseline_steps'] = steps
-    except:  # Вырожденная матрица или другая ошибка
-        result_dict['baseline_success'] = False
-        result_dict['baseline_time'] = -1
-        result_dict['baseline_params'] = "Error"
-        result_dict['baseline_steps'] = -1
+    result = baseline_optimization_Newton(start, goal, iters=iters, lr=lr, eps=eps)
+    result_dict['baseline_success'] = result.converged
+    result_dict['baseline_time'] = result.wall_time if result.converged else -1
+    result_dict['baseline_params'] = f"{result.traj.a},{result.traj.b},{result.traj.c},{result.traj.length}" if result.converged else "Error"
+    result_dict['baseline_steps'] = result.iterations if result.converged else -1
 
     # Proposed метод
-    try:
-        t_start = time.time()
-        steps, traj = optimization_Newton(start, goal, iters=iters, lr=lr, eps=eps)
-        t_end = time.time()
-        result_dict['proposed_success'] = True
-        result_dict['proposed_time'] = t_end - t_start
-        result_dict['proposed_params'] = f"{traj.k1},{traj.k2},{traj.log_length}"
-        result_dict['proposed_steps'] = steps
-    except:
-        result_dict['proposed_success'] = False
-        result_dict['proposed_time'] = -1
-        result_dict['proposed_params'] = "Error"
-        result_dict['proposed_steps'] = -1
+    result = optimization_Newton(start, goal, iters=iters, lr=lr, eps=eps)
+    result_dict['proposed_success'] = result.converged
+    result_dict['proposed_time'] = result.wall_time if result.converged else -1
+    result_dict['proposed_params'] = f"{result.traj.k1},{result.traj.k2},{result.traj.log_length}" if result.converged else "Error"
+    result_dict['proposed_steps'] = result.iterations if result.converged else -1
         
     return result_dict
 
 
+def run_row_test(row):
+    """ То же, что run_single_test, для строки таблицы задач (id, start: x, y, theta, k, goal: x, y, theta, k) из task_pool. """
+    return run_single_test((int(row[0]), State(*row[1:5].tolist()), State(*row[5:9].tolist())))
+
+
 
 # --- Основная логика скрипта ---
 
@@ -110,6 +102,13 @@ if __name__ == "__main__":
     parser.add_argument('--input', default='test_cases.txt', help="Файл с тестовыми сценариями.")
     parser.add_argument('--output', default='results.csv', help="Файл для сохранения детальных результатов (в формате CSV).")
     parser.add_argument('--workers', type=int, default=cpu_count(), help="Количество параллельных процессов для запуска.")
+    parser.add_argument('--resume', action='store_true', help="Продолжить прерванный запуск: пропустить задачи, уже записанные в --output.")
+    parser.add_argument('--chunk-size', type=int, default=None, help="Размер порции задач для процесса (по умолчанию подбирается автоматически).")
+    parser.add_argument('--pin-cpus', action='store_true', help="Привязать каждый процесс к отдельному ядру.")
+    parser.add_argument('--seed-table', default=None, help="Таблица начальных приближений (.npz), загружаемая в каждый процесс.")
+    parser.add_argument('--flush-every', type=int, default=1000, help="Сбрасывать результаты на диск каждые N задач (и не реже раза в 5 секунд).")
+    parser.add_argument('--profile', action='store_true', help="Учитывать время по стадиям решателя (квадратура, смена параметризации, матрица Якоби, шаг Ньютона) и вывести их разбивку.")
+    parser.add_argument('--profile-output', default=None, help="Сохранить общий для всех процессов результат cProfile в этот файл (формат pstats).")
     
     args = parser.parse_args()
 
@@ -124,53 +123,59 @@ if __name__ == "__main__":
             sys.exit(1)
             
         experiments = load_experiments(args.input)
-        # Добавляем ID к каждому тесту для удобства логирования
-        tasks = [(i, start, goal) for i, (start, goal) in enumerate(experiments)]
-
-        print(f"Запуск {len(tasks)} тестов на {args.workers} процессах...")
-        
-        all_results = []
-        with Pool(processes=args.workers) as pool:
-            # Используем tqdm для отображения прогресс-бара
-            for result in tqdm(pool.imap_unordered(run_single_test, tasks), total=len(tasks)):
-                all_results.append(result)
-
-        # Сортируем результаты по ID на всякий случай
-        all_results.sort(key=lambda x: x['id'])
-
-        # Сохранение детальной статистики в CSV
-        print(f"Сохранение результатов в '{args.output}'...")
         fieldnames = [
             'id', 'start_x', 'start_y', 'start_theta', 'start_k', 'goal_x', 'goal_y', 'goal_theta', 'goal_k',
             'baseline_success', 'baseline_time', 'baseline_params', 'baseline_steps',
             'proposed_success', 'proposed_time', 'proposed_params', 'proposed_steps'
         ]
-        with open(args.output, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for res in all_results:
-                writer.writerow(res)
+        # Итоговая статистика считается на лету, результаты не копятся в памяти
+        baseline_stats, proposed_stats = RunningStats(), RunningStats()
+        def account(res):
+            baseline_stats.add(str(res['baseline_success']) == 'True', float(res['baseline_time']))
+            proposed_stats.add(str(res['proposed_success']) == 'True', float(res['proposed_time']))
+
+        completed = set()
+        if args.resume:
+            completed = read_completed(args.output, ['id'], on_row=account)
+            print(f"Продолжение запуска: {len(completed)} тестов уже выполнено.")
+        elif os.path.exists(args.output):
+            os.remove(args.output)  # новый запуск перезаписывает файл результатов
+
+        # Таблица задач: ID теста (для удобства логирования), начальное и целевое состояния
+        tasks = np.array([[i, start.x, start.y, start.theta, start.k, goal.x, goal.y, goal.theta, goal.k]
+                          for i, (start, goal) in enumerate(experiments) if (str(i),) not in completed]).reshape(-1, 9)
 
-        # Подведение итоговой статистики
-        baseline_success = sum(1 for r in all_results if r['baseline_success'])
-        proposed_success = sum(1 for r in all_results if r['proposed_success'])
-        
-        baseline_times = [r['baseline_time'] for r in all_results if r['baseline_success']]
-        proposed_times = [r['proposed_time'] for r in all_results if r['proposed_success']]
+        print(f"Запуск {len(tasks)} тестов на {args.workers} процессах...")
 
+        # Результаты дописываются в CSV по мере готовности (в порядке завершения, а не по ID)
+        results = run_tasks(tasks, run_row_test, workers=args.workers, chunk_size=args.chunk_size, pin_cpus=args.pin_cpus,
+                            warmup=partial(warm_up_solvers, args.seed_table), profile=args.profile,
+                            profile_output=args.profile_output)
+        with ResultWriter(args.output, fieldnames, flush_every=args.flush_every) as writer:
+            # Используем tqdm для отображения прогресс-бара
+            for result in tqdm(results, total=len(tasks)):
+                writer.write(result)
+                account(result)
+        print(f"Результаты сохранены в '{args.output}'.")
+
+        # Подведение итоговой статистики
         print("\n" + "="*40)
         print("ИТОГОВАЯ СТАТИСТИКА")
         print("="*40)
 
         print(f"\n--- Baseline-метод ---")
-        print(f"Success Rate: {baseline_success / len(all_results) * 100:.2f}%")
-        if baseline_times:
-            print(f"Среднее время: {np.mean(baseline_times):.4f} сек.")
-            print(f"Медианное время: {np.median(baseline_times):.4f} сек.")
+        print(f"Success Rate: {baseline_stats.success_rate * 100:.2f}%")
+        if baseline_stats.count:
+            print(f"Среднее время: {baseline_stats.mean:.4f} сек.")
+            print(f"Медианное время: {baseline_stats.median:.4f} сек.")
 
         print(f"\n--- Предложенный метод ---")
-        print(f"Success Rate: {proposed_success / len(all_results) * 100:.2f}%")
-        if proposed_times:
-            print(f"Среднее время: {np.mean(proposed_times):.4f} сек.")
-            print(f"Медианное время: {np.median(proposed_times):.4f} сек.")
+        print(f"Success Rate: {proposed_stats.success_rate * 100:.2f}%")
+        if proposed_stats.count:
+            print(f"Среднее время: {proposed_stats.mean:.4f} сек.")
+            print(f"Медианное время: {proposed_stats.median:.4f} сек.")
         print("\n" + "="*40)
+        if args.profile:
+            print("\nВремя по стадиям (сумма по всем процессам):\n" + format_report(snapshot()))
+        if args.profile_output:
+            print(f"Результат cProfile сохранён в '{args.profile_output}' (просмотр: python -m pstats {args.profile_output})")
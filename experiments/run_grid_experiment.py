@@ -2,17 +2,23 @@
 
 import numpy as np
 import argparse
-import csv
-from multiprocessing import Pool, cpu_count
+import os
+from multiprocessing import cpu_count
+from functools import partial
 from tqdm import tqdm
 import sys
 
 try:
-    sys.path.append("../common/")
-    sys.path.append("../trajectory-generation/")
+    HERE = os.path.dirname(os.path.abspath(__file__))  # пути от расположения скрипта, а не от текущей директории
+    sys.path.append(os.path.join(HERE, "../common/"))
+    sys.path.append(os.path.join(HERE, "../trajectory-generation/"))
     from PRIM_structs import State
     from trajectory_optimization import optimization_Newton
     from baseline_trajectory_optimization import baseline_optimization_Newton
+    from divergence import SolveBudget
+    from result_stream import ResultWriter, RunningStats, read_completed
+    from PRIM_profiling import snapshot, format_report
+    from task_pool import run_tasks, warm_up_solvers
 except ImportError as e:
     print(f"Ошибка импорта модулей: {e}")
     sys.exit(1)
@@ -44,8 +50,9 @@ def generate_grid_tasks():
 
 
 
-def run_single_grid_test(args):
-    """Выполняет один тест для обоих методов. Предназначена для worker'а внутри одного потока."""
+def run_single_grid_test(args, budget=None):
+    """Выполняет один тест для обоих методов. Предназначена для worker'а внутри одного потока.
+    budget - признаки досрочной остановки (SolveBudget) для заведомо недостижимых целей."""
     cell_i, cell_j, angle_idx, start, goal = args
     iters, lr, eps = 300, 0.1, 1e-2
     result_dict = {
@@ -55,61 +62,71 @@ def run_single_grid_test(args):
     }
 
     # --- Baseline метод ---
-    try:
-        steps, traj = baseline_optimization_Newton(start, goal, iters=iters, lr=lr, eps=eps)
-        if traj:
-            result_dict['baseline_success'] = True
-        else:
-            result_dict['baseline_success'] = False
-    except:
-        result_dict['baseline_success'] = False
+    result_dict['baseline_success'] = baseline_optimization_Newton(start, goal, iters=iters, lr=lr, eps=eps, budget=budget).converged
 
     # --- Proposed метод ---
-    try:
-        # Распаковываем кортеж (steps, traj) или ловим TypeError, если вернулся None
-        steps, traj = optimization_Newton(start, goal, iters=iters, lr=lr, eps=eps)
-        if traj:
-            result_dict['proposed_success'] = True
-        else: # Явный случай, когда traj is None
-            result_dict['proposed_success'] = False
-    except:
-        result_dict['proposed_success'] = False
+    result_dict['proposed_success'] = optimization_Newton(start, goal, iters=iters, lr=lr, eps=eps, budget=budget).converged
         
     return result_dict
 
 
+def run_row_grid_test(row, budget=None):
+    """ То же, что run_single_grid_test, для строки таблицы задач (cell_i, cell_j, angle_idx, start (4 числа), goal (4 числа)). """
+    cell_i, cell_j, angle_idx = map(int, row[:3])
+    return run_single_grid_test((cell_i, cell_j, angle_idx, State(*row[3:7].tolist()), State(*row[7:11].tolist())), budget)
+
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Запуск эксперимента по исследованию достижимости на сетке.")
     parser.add_argument('--output', default='grid_results_corrected.csv', help="CSV-файл для сохранения результатов.")
     parser.add_argument('--workers', type=int, default=cpu_count(), help="Количество параллельных процессов.")
+    parser.add_argument('--resume', action='store_true', help="Продолжить прерванный запуск: пропустить задачи, уже записанные в --output.")
+    parser.add_argument('--chunk-size', type=int, default=None, help="Размер порции задач для процесса (по умолчанию подбирается автоматически).")
+    parser.add_argument('--pin-cpus', action='store_true', help="Привязать каждый процесс к отдельному ядру.")
+    parser.add_argument('--seed-table', default=None, help="Таблица начальных приближений (.npz), загружаемая в каждый процесс.")
+    parser.add_argument('--flush-every', type=int, default=1000, help="Сбрасывать результаты на диск каждые N задач (и не реже раза в 5 секунд).")
+    parser.add_argument('--profile', action='store_true', help="Учитывать время по стадиям решателя (квадратура, смена параметризации, матрица Якоби, шаг Ньютона) и вывести их разбивку.")
+    parser.add_argument('--profile-output', default=None, help="Сохранить общий для всех процессов результат cProfile в этот файл (формат pstats).")
+    parser.add_argument('--early-stop', action='store_true', help="Досрочно прекращать поиск, если решение явно не будет найдено.")
     
     args = parser.parse_args()
 
     tasks = generate_grid_tasks()
     print(f"Сгенерировано {len(tasks)} тестовых сценариев с коррекцией углов.")
 
-    print(f"Запуск тестов на {args.workers} процессах...")
-    all_results = []
-    with Pool(processes=args.workers) as pool:
-        for result in tqdm(pool.imap_unordered(run_single_grid_test, tasks), total=len(tasks)):
-            all_results.append(result)
-
-    print(f"Сохранение результатов в '{args.output}'...")
     fieldnames = ['cell_i', 'cell_j', 'angle_idx', 'baseline_success', 'proposed_success']
-    all_results.sort(key=lambda r: (r['cell_i'], r['cell_j'], r['angle_idx']))
-    
-    with open(args.output, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(all_results)
-    
-    baseline_success_count = sum(1 for r in all_results if r['baseline_success'])
-    proposed_success_count = sum(1 for r in all_results if r['proposed_success'])
-    total_count = len(all_results)
-    
+    baseline_stats, proposed_stats = RunningStats(), RunningStats()
+    def account(res):
+        baseline_stats.add(str(res['baseline_success']) == 'True')
+        proposed_stats.add(str(res['proposed_success']) == 'True')
+
+    completed = set()
+    if args.resume:
+        completed = read_completed(args.output, fieldnames[:3], on_row=account)
+        print(f"Продолжение запуска: {len(completed)} тестов уже выполнено.")
+    elif os.path.exists(args.output):
+        os.remove(args.output)
+    tasks = np.array([[i, j, a, start.x, start.y, start.theta, start.k, goal.x, goal.y, goal.theta, goal.k]
+                      for i, j, a, start, goal in tasks if (str(i), str(j), str(a)) not in completed]).reshape(-1, 11)
+
+    budget = SolveBudget() if args.early_stop else None
+    print(f"Запуск {len(tasks)} тестов на {args.workers} процессах...")
+    # Результаты дописываются в CSV по мере готовности (в порядке завершения)
+    results = run_tasks(tasks, partial(run_row_grid_test, budget=budget), workers=args.workers, chunk_size=args.chunk_size,
+                        pin_cpus=args.pin_cpus, warmup=partial(warm_up_solvers, args.seed_table),
+                        profile=args.profile, profile_output=args.profile_output)
+    with ResultWriter(args.output, fieldnames, flush_every=args.flush_every) as writer:
+        for result in tqdm(results, total=len(tasks)):
+            writer.write(result)
+            account(result)
+
     print("\n" + "="*40 + "\nЭКСПЕРИМЕНТ ЗАВЕРШЕН\n" + "="*40)
-    print(f"Baseline Success Rate: {baseline_success_count / total_count * 100:.2f}%")
-    print(f"Proposed Success Rate: {proposed_success_count / total_count * 100:.2f}%")
+    print(f"Baseline Success Rate: {baseline_stats.success_rate * 100:.2f}%")
+    print(f"Proposed Success Rate: {proposed_stats.success_rate * 100:.2f}%")
     print(f"Результаты сохранены в {args.output}")
     print("="*40)
+    if args.profile:
+        print("\nВремя по стадиям (сумма по всем процессам):\n" + format_report(snapshot()))
+    if args.profile_output:
+        print(f"Результат cProfile сохранён в '{args.profile_output}' (просмотр: python -m pstats {args.profile_output})")
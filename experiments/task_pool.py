@@ -0,0 +1,162 @@
+""" Параллельное выполнение большого числа коротких задач: общая память вместо пересылки объектов и адаптивные порции задач. """
+
+import os
+import time
+import cProfile
+import pstats
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import Value, cpu_count
+from multiprocessing.shared_memory import SharedMemory
+
+
+
+# --- Состояние процесса-обработчика (заполняется один раз при его запуске) ---
+
+_worker_shm = None   # разделяемая память с таблицей задач (ссылку нужно держать, пока процесс жив)
+_worker_rows = None  # таблица задач: массив (N, C) поверх разделяемой памяти, без копирования
+_worker_profile = False   # учитывать ли время по стадиям (common/PRIM_profiling.py)
+_worker_cprofile = False  # профилировать ли порции задач cProfile
+
+
+def _init_worker(shm_name, shape, pin_counter, warmup, profile=False, cprofile=False):
+    global _worker_shm, _worker_rows, _worker_profile, _worker_cprofile
+    _worker_shm = SharedMemory(name=shm_name)
+    _worker_rows = np.ndarray(shape, dtype=np.float64, buffer=_worker_shm.buf)
+    if pin_counter is not None and hasattr(os, 'sched_setaffinity'):  # привязка процесса к своему ядру (только Linux)
+        with pin_counter.get_lock():
+            cpu = pin_counter.value
+            pin_counter.value += 1
+        cpus = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cpus[cpu % len(cpus)]})
+    if warmup is not None:  # однократная подготовка процесса (импорты, таблицы начальных приближений и т.п.)
+        warmup()
+    _worker_profile, _worker_cprofile = profile, cprofile
+    if profile:  # подготовка выше в статистику не попадает
+        import PRIM_profiling
+        PRIM_profiling.enable()
+        PRIM_profiling.reset()
+
+
+class _ProfileData:
+    # данные cProfile, пересланные из процесса-обработчика, в виде, который принимает pstats.Stats
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def warm_up_solvers(seed_table=None):
+    """
+    Типичная подготовка процесса-обработчика: загрузка таблицы начальных приближений (если задан путь к ней, см.
+    trajectory-generation/seed_table.py) и одна короткая генерация, чтобы заранее посчитать узлы квадратуры.
+    Передаётся в run_tasks как warmup (например, через functools.partial).
+    """
+    from PRIM_structs import State
+    from trajectory_optimization import optimization_Newton, set_seed_table
+    if seed_table is not None:
+        from seed_table import load_seed_table
+        set_seed_table(load_seed_table(seed_table))
+    optimization_Newton(State(0.0, 0.0, 0.0), State(1.0, 0.0, 0.0), iters=1)
+
+
+def _run_range(task_fn, lo, hi):
+    # выполняет задачи с номерами строк lo..hi-1; возвращает результаты, затраченное время и статистику профилирования
+    # этой порции (по стадиям и cProfile; None, если профилирование выключено)
+    stages, profile_data = None, None
+    if _worker_profile:
+        import PRIM_profiling
+        task_fn = PRIM_profiling.timed(task_fn, "task")  # собственное время "task" - всё, что вне стадий решателя
+    profiler = cProfile.Profile() if _worker_cprofile else None
+    if profiler:
+        profiler.enable()
+    t_start = time.perf_counter()
+    results = [task_fn(_worker_rows[i]) for i in range(lo, hi)]
+    elapsed = time.perf_counter() - t_start
+    if profiler:
+        profiler.disable()
+        profiler.create_stats()
+        profile_data = profiler.stats
+    if _worker_profile:
+        stages = PRIM_profiling.snapshot(reset=True)
+    return results, elapsed, stages, profile_data
+
+
+
+def run_tasks(rows, task_fn, workers=None, chunk_size=None, target_chunk_time=0.5, pin_cpus=False, warmup=None,
+              profile=False, profile_output=None):
+    """
+    Выполняет task_fn(row) для каждой строки таблицы задач rows в пуле процессов и выдаёт результаты по мере готовности
+    (в порядке завершения порций).
+
+    Таблица (N, C) чисел кладётся один раз в разделяемую память, а процессам передаются только диапазоны номеров строк
+    (lo, hi) - без сериализации объектов State на каждую задачу. Если размер порции chunk_size не задан, он подбирается
+    на лету: порция должна выполняться примерно target_chunk_time секунд (по измеренному среднему времени задачи),
+    но не больше, чем нужно для равномерной загрузки процессов до конца работы.
+
+        rows: массив (N, C) или список строк одинаковой длины (все значения - числа),
+        task_fn: функция от строки (массив (C,)), объявленная на уровне модуля (её передают в процессы),
+        workers: число процессов (None - cpu_count()),
+        chunk_size: фиксированный размер порции (None - адаптивный),
+        pin_cpus: привязать каждый процесс к отдельному ядру,
+        warmup: функция без аргументов, которая вызывается один раз при запуске каждого процесса,
+        profile: учитывать время по стадиям решателя (common/PRIM_profiling.py) во всех процессах; статистика процессов
+                 складывается в статистику текущего процесса (PRIM_profiling.snapshot() после выполнения всех задач),
+        profile_output: файл, в который после выполнения всех задач сохраняется общий по всем процессам результат cProfile
+                        (формат pstats).
+    """
+
+    rows = np.ascontiguousarray(rows, dtype=np.float64)
+    n = len(rows)
+    if n == 0:
+        return
+    workers = cpu_count() if workers is None else max(1, workers)
+    if profile:
+        import PRIM_profiling
+    profile_total = None  # общий результат cProfile (pstats.Stats)
+    shm = SharedMemory(create=True, size=max(rows.nbytes, 1))
+    try:
+        np.ndarray(rows.shape, dtype=np.float64, buffer=shm.buf)[:] = rows
+        pin_counter = Value('i', 0) if pin_cpus else None
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(shm.name, rows.shape, pin_counter, warmup, profile, profile_output is not None)) as executor:
+            next_row, pending = 0, set()
+            recent = deque(maxlen=4 * workers)  # (задач, секунд) последних порций - для оценки времени задачи
+
+            def next_chunk():
+                if chunk_size is not None:
+                    return chunk_size
+                if not recent:
+                    return 1  # первые порции минимальные: время задачи ещё не известно
+                per_task = sum(t for _, t in recent) / max(sum(c for c, _ in recent), 1)
+                balanced = max(1, (n - next_row) // (2 * workers))  # хвост работы делится между всеми процессами
+                return int(max(1, min(target_chunk_time / max(per_task, 1e-9), balanced)))
+
+            try:
+                while next_row < n or pending:
+                    while next_row < n and len(pending) < 2 * workers:  # держим по две порции на процесс
+                        hi = min(n, next_row + next_chunk())
+                        pending.add(executor.submit(_run_range, task_fn, next_row, hi))
+                        next_row = hi
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results, elapsed, stages, profile_data = future.result()
+                        recent.append((len(results), elapsed))
+                        if stages is not None:
+                            PRIM_profiling.merge(stages)
+                        if profile_data is not None:
+                            if profile_total is None:
+                                profile_total = pstats.Stats(_ProfileData(profile_data))
+                            else:
+                                profile_total.add(pstats.Stats(_ProfileData(profile_data)))
+                        yield from results
+            finally:
+                for future in pending:
+                    future.cancel()
+        if profile_total is not None:
+            profile_total.dump_stats(profile_output)
+    finally:
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+for folder in ("../common/", "../trajectory-generation/", "../experiments/"):
+    sys.path.append(os.path.join(HERE, folder))
@@ -0,0 +1,30 @@
+""" Пакетный метод Ньютона против решения задач по одной. """
+
+import numpy as np
+from PRIM_structs import *
+from trajectory_optimization import optimization_Newton, optimization_Newton_batch, newton_directions_batch
+from run_grid_experiment import generate_grid_tasks
+from test_quadrature import ITERS, EPS, LR
+
+
+def test_batch_matches_single_on_grid_tasks():
+    # среди этих задач есть сходящиеся, расходящиеся и с вырожденной матрицей Якоби; пакет и одиночные решения должны
+    # совпадать до последнего бита, иначе хаотичные итерации на длинных целях расходятся по-разному
+    tasks = list(generate_grid_tasks())[::20]
+    starts, goals = [task[3] for task in tasks], [task[4] for task in tasks]
+    status, steps, params = optimization_Newton_batch(starts, goals, ITERS, EPS, LR, return_status=True)
+    assert len(set(status.tolist())) >= 3
+    for k, (start, goal) in enumerate(zip(starts, goals)):
+        result = optimization_Newton(start, goal, ITERS, EPS, LR)
+        assert (result.status, result.iterations) == (status[k], steps[k]), f"задача {k}"
+        if result.converged:
+            assert np.array_equal(result.params, params[k])
+
+
+def test_singular_rows_fall_back_to_least_squares():
+    J = np.stack([np.eye(3), np.ones((3, 3)), 2 * np.eye(3)])
+    residual = np.array([[1.0, 2.0, 3.0], [1.0, 2.0, 3.0], [2.0, 4.0, 6.0]])
+    singular = np.zeros(3, dtype=bool)
+    directions = newton_directions_batch(J, residual, singular)
+    assert list(singular) == [False, True, False]
+    assert np.allclose(directions, [[1, 2, 3], [2 / 3, 2 / 3, 2 / 3], [1, 2, 3]])
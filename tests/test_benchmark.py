@@ -0,0 +1,23 @@
+""" Сравнение замеров benchmark.py. """
+
+from benchmark import compare_results
+
+
+def _run(backend, have_numba, fast_solve):
+    return {'meta': {'fast_backend': backend, 'have_numba': have_numba},
+            'micro_us': {'fast_solve': fast_solve, 'final_state': 12.0}}
+
+
+def test_compare_skips_fast_solve_across_backends():
+    # движок numpy в десятки раз медленнее Numba - это не регрессия кода
+    rows = compare_results(_run('numba', True, 300.0), _run('numpy', False, 20000.0))
+    assert [row[0] for row in rows] == ['micro_us.final_state']
+    rows = compare_results(_run('numpy', False, 20000.0), _run('numpy', False, 30000.0))
+    assert ('micro_us.fast_solve', 20000.0, 30000.0, 0.5, True) in rows
+
+
+def test_compare_treats_runs_without_have_numba_as_different():
+    old = _run('numpy', False, 20000.0)
+    del old['meta']['have_numba']  # замер, сделанный до появления поля
+    rows = compare_results(old, _run('numpy', False, 20000.0))
+    assert 'micro_us.fast_solve' not in [row[0] for row in rows]
@@ -0,0 +1,120 @@
+""" Векторизованная проверка примитивов на столкновения против проверки каждого примитива по отдельности. """
+
+import numpy as np
+import pytest
+from PRIM_structs import *
+from PRIM_footprint import compute_footprints
+from PRIM_library import save_library, load_library
+import PRIM_collision
+from PRIM_collision import CollisionChecker, VehicleFootprint, footprint_cells, _sampled_states
+from trajectory_optimization import optimization_Newton_batch
+
+
+RESOLUTION = 0.5
+
+
+def _primitives() -> PrimitiveArray:
+    # небольшой control set из начала координат; с крупным шагом часть задач не решается (несошедшиеся примитивы)
+    angles = [0.0, 0.5, -0.7, 1.2]
+    goals = [State(x, y, theta, 0.0) for x, y in [(2.0, 0.0), (2.0, 1.0), (1.5, -1.5), (-1.0, 2.0), (0.5, 3.0)]
+             for theta in angles]
+    starts = [State(0.0, 0.0, 0.0, 0.0)] * len(goals)
+    status, steps, params = optimization_Newton_batch(starts, goals, 15, 1e-2, 0.5, return_status=True)
+    prims = PrimitiveArray.from_batch(starts, goals, status, steps, params)
+    assert 0 < np.sum(prims["status"] == STATUS_CONVERGED) < len(prims)
+    return prims
+
+
+def _brute_force(cells_of, grid, starts, ids, outside_free):
+    # каждый примитив из каждой стартовой клетки - по клетке
+    height, width = grid.shape
+    free = np.zeros((len(starts), len(ids)), dtype=bool)
+    for s, (ix, iy) in enumerate(starts):
+        for j, i in enumerate(ids):
+            cells = cells_of(i)
+            if cells is None or len(cells) == 0:
+                continue
+            ok = True
+            for dx, dy in cells:
+                x, y = ix + dx, iy + dy
+                if 0 <= x < width and 0 <= y < height:
+                    ok = ok and not grid[y, x]
+                else:
+                    ok = ok and outside_free
+            free[s, j] = ok
+    return free
+
+
+def _starts(grid, rng, count=30):
+    height, width = grid.shape
+    inner = np.column_stack([rng.integers(0, width, count), rng.integers(0, height, count)])
+    edges = [(0, 0), (width - 1, height - 1), (0, height // 2), (width - 1, 3), (width // 2, 0), (5, height - 1)]
+    return np.concatenate([inner, edges])
+
+
+@pytest.fixture
+def prims():
+    return _primitives()
+
+
+@pytest.mark.parametrize("footprint", [None, VehicleFootprint.disc(0.3), VehicleFootprint.rectangle(1.2, 0.6, rear=0.3)])
+@pytest.mark.parametrize("outside_free", [False, True])
+def test_check_matches_brute_force(prims, footprint, outside_free, monkeypatch):
+    monkeypatch.setattr(PRIM_collision, "CHECK_CHUNK_ELEMENTS", 2000)  # несколько проходов по стартовым клеткам
+    rng = np.random.default_rng(3)
+    grid = rng.random((24, 30)) < 0.08
+    starts = _starts(grid, rng)
+    checker = CollisionChecker(prims, RESOLUTION, footprint)
+    shape = VehicleFootprint.disc(0.0) if footprint is None else footprint
+
+    def cells_of(i):
+        if prims["status"][i] != STATUS_CONVERGED:
+            return None
+        return footprint_cells(_sampled_states(prims, i, RESOLUTION / 4), prims["start"][i, :2], RESOLUTION, shape)
+
+    everything = np.arange(len(prims))
+    expected = _brute_force(cells_of, grid, starts, everything, outside_free)
+    free = checker.check(grid, starts, outside_free=outside_free)
+    assert np.array_equal(free, expected)
+    assert np.any(free) and not np.all(free[:, prims["status"] == STATUS_CONVERGED])
+    assert not np.any(free[:, prims["status"] != STATUS_CONVERGED])  # несошедшиеся всегда недопустимы
+
+    subset = rng.permutation(len(prims))[:9]
+    assert np.array_equal(checker.check(grid, starts, subset, outside_free), expected[:, subset])
+    assert np.array_equal(checker.check_node(grid, starts[-1], subset, outside_free), expected[-1, subset])
+
+
+def test_outside_cells_are_occupied_by_default(prims):
+    checker = CollisionChecker(prims, RESOLUTION)
+    grid = np.zeros((6, 6), dtype=bool)
+    corner = checker.check_node(grid, (0, 0))
+    converged = prims["status"] == STATUS_CONVERGED
+    # из угла пустой карты все примитивы, уходящие за её пределы, запрещены, а при outside_free - разрешены все сошедшиеся
+    assert np.any(~corner[converged])
+    assert np.array_equal(checker.check_node(grid, (0, 0), outside_free=True), converged)
+
+
+def test_stored_footprints_match_recomputation(prims, tmp_path):
+    radius = 0.3
+    stored = compute_footprints(prims, RESOLUTION, radius)
+    filename = str(tmp_path / "library.bin")
+    save_library(filename, prims, sample_ds=RESOLUTION / 4, footprints=stored)
+    library = load_library(filename)
+
+    from_library = CollisionChecker(library, RESOLUTION, VehicleFootprint.disc(radius))
+    recomputed = CollisionChecker(prims, RESOLUTION, VehicleFootprint.disc(radius))
+    for i in np.flatnonzero(prims["status"] == STATUS_CONVERGED):  # сохранённые клетки используются без пересчёта
+        lo = np.sum(from_library.counts[:i])
+        assert np.array_equal(from_library.cells[lo:lo + from_library.counts[i]], stored.cells(i))
+
+    rng = np.random.default_rng(5)
+    grid = rng.random((24, 30)) < 0.08
+    starts = _starts(grid, rng)
+    for outside_free in (False, True):
+        free = from_library.check(grid, starts, outside_free=outside_free)
+        assert np.array_equal(free, _brute_force(stored.cells, grid, starts, np.arange(len(prims)), outside_free))
+        assert np.array_equal(free, recomputed.check(grid, starts, outside_free=outside_free))
+
+    # другой радиус агента - сохранённые клетки не подходят, они пересчитываются по ломаным из библиотеки
+    other = CollisionChecker(library, RESOLUTION, VehicleFootprint.disc(0.1))
+    assert np.array_equal(other.cells, CollisionChecker(prims, RESOLUTION, VehicleFootprint.disc(0.1)).cells)
@@ -0,0 +1,26 @@
+""" Запасной портфель стратегий: бюджет по умолчанию и отмена попыток в пуле процессов. """
+
+import threading
+import fallback
+from fallback import FallbackSolver, _JobCancelled
+
+
+class _Job:
+    def __init__(self, value):
+        self.value = value
+
+
+def test_default_budget_is_not_shared():
+    first, second = FallbackSolver(), FallbackSolver()
+    assert first.budget is not second.budget
+
+
+def test_pooled_cancel_keeps_callers_cancel(monkeypatch):
+    monkeypatch.setattr(fallback, "_current_job", _Job(3))
+    outer = threading.Event()
+    cancel = _JobCancelled(3, outer)
+    assert not cancel.is_set()
+    outer.set()
+    assert cancel.is_set()                      # отмена вызывающим
+    assert _JobCancelled(2).is_set()            # задачу уже решили - попытка отменяется
+    assert not _JobCancelled(3, None).is_set()
@@ -0,0 +1,71 @@
+""" Компилируемые функции fast_newton.py против эталонных функций trajectory_optimization.py. """
+
+import numpy as np
+import pytest
+from PRIM_structs import *
+from trajectory_optimization import optimization_Newton, optimization_Newton_batch, calc_residual_and_Jacobian_batch
+import fast_newton
+from test_quadrature import ITERS, EPS, LR, _grid_task
+
+
+def _grid_problems():
+    # длинные закрученные траектории, на которых нужно сгущение разбиения квадратуры (см. test_quadrature.py)
+    tasks = [_grid_task(*cell) for cell in [(1, 2, 0), (8, 2, 0), (3, 1, 2)]]
+    starts = states_to_array([start for start, _ in tasks])
+    goals = states_to_array([goal for _, goal in tasks])
+    return starts, goals, np.zeros((len(tasks), 3))
+
+
+def test_kernels_match_reference_on_random_problems():
+    # без Numba функции выполняются как обычные python-функции - это всё равно проверка их кода
+    check = fast_newton.check_kernels(count=10)
+    assert check["status_mismatches"] == 0 and check["single_status_mismatches"] == 0
+    assert check["steps_mismatches"] == 0
+    assert check["residual"] < 1e-10 and check["jacobian"] < 1e-10
+    assert check["params"] < 1e-10 and check["single_params"] < 1e-10
+
+
+def test_kernels_on_grid_goals():
+    starts, goals, params = _grid_problems()
+    rule = fast_newton._kernel_rule(None)
+
+    residual, J = np.empty((len(params), 3)), np.empty((len(params), 3, 3))
+    fast_newton._residual_and_jacobian_many(starts, goals, params, rule, residual, J)
+    ref_residual, ref_J = calc_residual_and_Jacobian_batch(starts, goals, params)
+    assert np.allclose(residual, ref_residual, rtol=1e-12, atol=1e-12)
+    assert np.allclose(J, ref_J, rtol=1e-10, atol=1e-10)
+
+    found, status, steps = params.copy(), np.zeros(len(params), dtype=np.int64), np.zeros(len(params), dtype=np.int64)
+    fast_newton._solve_many(starts, goals, found, rule, ITERS, EPS, LR, status, steps)
+    ref_status, ref_steps, ref_found = optimization_Newton_batch(starts, goals, ITERS, EPS, LR, jacobian="exact",
+                                                                 init_params=params, return_status=True)
+    assert list(status) == list(ref_status) and list(steps) == list(ref_steps)
+    converged = status == STATUS_CONVERGED
+    assert np.any(converged)
+    assert np.allclose(found[converged], ref_found[converged], rtol=0, atol=1e-9)
+
+    for start, goal, init in zip(starts, goals, params):
+        single, history = init.copy(), np.empty(ITERS)
+        code, count = fast_newton._solve_one(start, goal, single, rule, ITERS, EPS, LR, history)
+        ref = optimization_Newton(State(*start), State(*goal), ITERS, EPS, LR, jacobian="exact", init_params=init)
+        assert (code == STATUS_CONVERGED) == ref.converged and count == ref.iterations
+        if ref.converged:
+            assert np.allclose(single, ref.params, rtol=0, atol=1e-9)
+            assert np.allclose(history[:count], ref.residual_history, rtol=1e-6, atol=1e-12)
+
+
+def test_check_equivalence_refuses_reference_backend():
+    with pytest.raises(ValueError):
+        fast_newton.check_equivalence(count=5, backend="numpy")
+    if not fast_newton.HAVE_NUMBA:  # "auto" без Numba - тоже эталонные функции
+        with pytest.raises(ValueError):
+            fast_newton.check_equivalence(count=5)
+
+
+@pytest.mark.skipif(not fast_newton.HAVE_NUMBA, reason="Numba не установлен")
+def test_compiled_backend_matches_reference():
+    check = fast_newton.check_equivalence(count=100, backend="numba")
+    assert check["status_mismatches"] == 0 and check["single_status_mismatches"] == 0
+    assert check["steps_mismatches"] == 0
+    assert check["residual"] < 1e-10 and check["jacobian"] < 1e-10
+    assert check["params"] < 1e-8 and check["single_params"] < 1e-8
@@ -0,0 +1,51 @@
+""" Сжатие заметаемых клеток сериями и обратный индекс по клеткам. """
+
+import numpy as np
+from PRIM_structs import *
+from PRIM_footprint import rle_encode, rle_decode, compute_footprints, Footprints, RUN_DTYPE
+from trajectory_optimization import optimization_Newton_batch
+
+
+def _sorted(cells: np.ndarray) -> np.ndarray:
+    cells = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+    return cells[np.lexsort((cells[:, 0], cells[:, 1]))]
+
+
+def test_rle_round_trip():
+    rng = np.random.default_rng(0)
+    for size in [0, 1, 5, 60, 400]:
+        cells = np.unique(rng.integers(-12, 12, (size, 2)), axis=0).reshape(-1, 2)
+        runs = rle_encode(cells)
+        assert runs.dtype == RUN_DTYPE and runs.shape[1] == 3
+        assert np.all(runs[:, 2] > 0) and np.sum(runs[:, 2]) == len(cells)
+        assert np.array_equal(_sorted(rle_decode(runs)), _sorted(cells))
+    # сплошная строка сжимается в одну серию
+    assert rle_encode(np.array([[3, -2], [1, -2], [2, -2]])).tolist() == [[-2, 1, 3]]
+
+
+def _footprints() -> Footprints:
+    starts = [State(0.0, 0.0, 0.0, 0.0)] * 8
+    goals = [State(2.0, y, theta, 0.0) for y in (-1.0, 0.0, 1.0, 2.0) for theta in (0.0, 0.6)]
+    status, steps, params = optimization_Newton_batch(starts, goals, 300, 1e-2, 0.1, return_status=True)
+    prims = PrimitiveArray.from_batch(starts, goals, status, steps, params)
+    prims.data["status"][3] = STATUS_FAILED  # несошедшийся примитив - пустой footprint
+    return compute_footprints(prims, resolution=0.5, radius=0.2)
+
+
+def test_touching_and_blocked_match_decoded_cells():
+    footprints = _footprints()
+    decoded = [set(map(tuple, footprints.cells(i).tolist())) for i in range(len(footprints))]
+    assert len(decoded[3]) == 0 and all(decoded[i] for i in range(len(footprints)) if i != 3)
+
+    everything = set().union(*decoded)
+    for cell in sorted(everything) + [(100, 100), (-50, 3)]:
+        expected = [i for i, cells in enumerate(decoded) if cell in cells]
+        assert sorted(footprints.touching(*cell).tolist()) == expected
+
+    rng = np.random.default_rng(1)
+    candidates = np.array(sorted(everything))
+    for count in [0, 1, 3, 10]:
+        occupied = candidates[rng.choice(len(candidates), count, replace=False)]
+        occupied = np.concatenate([occupied, [[40, -40]]])  # клетка, которую не задевает ни один примитив
+        expected = [bool(cells & set(map(tuple, occupied.tolist()))) for cells in decoded]
+        assert footprints.blocked(occupied).tolist() == expected
@@ -0,0 +1,70 @@
+""" Точные матрицы Якоби (через чувствительности) против конечных разностей. """
+
+import numpy as np
+import pytest
+from PRIM_structs import *
+from trajectory_optimization import (get_residual, calc_Jacobian_matrix, calc_residual_and_Jacobian,
+                                     calc_residual_and_Jacobian_batch)
+from baseline_trajectory_optimization import baseline_get_residual, baseline_calc_residual_and_Jacobian
+
+
+def _random_problems(count, seed=0):
+    rng = np.random.default_rng(seed)
+    starts = np.column_stack([rng.normal(0, 1, count), rng.normal(0, 1, count), rng.uniform(-np.pi, np.pi, count),
+                              rng.uniform(-0.3, 0.3, count)])
+    goals = np.column_stack([rng.uniform(-5, 5, count), rng.uniform(-5, 5, count), rng.uniform(-np.pi, np.pi, count),
+                             rng.uniform(-0.3, 0.3, count)])
+    params = np.column_stack([rng.normal(0, 0.3, (count, 2)), rng.uniform(0.0, 2.0, count)])
+    return starts, goals, params
+
+
+def _relative_error(J, reference):
+    return np.max(np.abs(J - reference)) / max(np.max(np.abs(reference)), 1.0)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_curve_jacobian_matches_finite_differences(seed):
+    starts, goals, params = _random_problems(1, seed)
+    traj = ShortTrajectory(State(*starts[0]), State(*goals[0]))
+    residual, J = calc_residual_and_Jacobian(traj, params[0])
+    assert np.allclose(residual, get_residual(traj.set_curve_params(*params[0])), rtol=0, atol=1e-12)
+    assert _relative_error(J, calc_Jacobian_matrix(traj, params[0], dk=1e-5, dl=1e-5)) < 1e-6
+
+
+def test_curve_jacobian_batch_matches_single():
+    starts, goals, params = _random_problems(50)
+    residual, J = calc_residual_and_Jacobian_batch(starts, goals, params)
+    for i in range(len(params)):
+        traj = ShortTrajectory(State(*starts[i]), State(*goals[i]))
+        single_residual, single_J = calc_residual_and_Jacobian(traj, params[i])
+        assert np.allclose(residual[i], single_residual, rtol=0, atol=1e-12)
+        assert np.allclose(J[i], single_J, rtol=1e-12, atol=1e-12)
+
+
+def test_curve_jacobian_single_on_invalid_params_is_not_finite():
+    starts, goals, _ = _random_problems(1)
+    params = np.array([[0.1, 0.2, 800.0]])  # длина exp(800) - переполнение, как и в пакетной версии
+    with np.errstate(all='ignore'):
+        residual, J = calc_residual_and_Jacobian(ShortTrajectory(State(*starts[0]), State(*goals[0])), params[0])
+        batch_residual, batch_J = calc_residual_and_Jacobian_batch(starts, goals, params)
+    assert not np.all(np.isfinite(residual)) and not np.all(np.isfinite(J))
+    assert not np.all(np.isfinite(batch_residual)) and not np.all(np.isfinite(batch_J))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_coef_jacobian_matches_finite_differences(seed):
+    starts, goals, params = _random_problems(1, seed)
+    a, b, c, length = curve_to_coef_params(starts[0, 3], params[0, 0], params[0, 1], goals[0, 3], params[0, 2])
+    coef_params = np.array([a, b, c, length])
+    traj = ShortTrajectory(State(*starts[0]), State(*goals[0]))
+    residual, J = baseline_calc_residual_and_Jacobian(traj, coef_params)
+    assert np.allclose(residual, baseline_get_residual(traj.set_coef_params(*coef_params)), rtol=0, atol=1e-12)
+
+    steps = 1e-5 * np.maximum(np.abs(coef_params), 1.0)  # центральные разности по a, b, c, length
+    reference = np.empty((4, 4))
+    for j, step in enumerate(steps):
+        shift = np.eye(4)[j] * step
+        plus = baseline_get_residual(traj.set_coef_params(*(coef_params + shift)))
+        minus = baseline_get_residual(traj.set_coef_params(*(coef_params - shift)))
+        reference[:, j] = (plus - minus) / (2 * step)
+    assert _relative_error(J, reference) < 1e-5  # погрешность самих разностей по c доходит до ~1e-6
@@ -0,0 +1,91 @@
+""" Бинарная библиотека примитивов: запись, чтение и отбраковка испорченных файлов. """
+
+import numpy as np
+import pytest
+import struct
+from PRIM_structs import *
+from PRIM_footprint import compute_footprints
+from PRIM_library import save_library, load_library, HEADER_FORMAT, HEADER_SIZE, LIBRARY_VERSION
+from trajectory_optimization import optimization_Newton_batch
+
+
+SAMPLE_DS = 0.25
+
+
+def _primitives() -> PrimitiveArray:
+    # с крупным шагом и 20 итерациями часть задач не решается; несошедшиеся примитивы получают пустую ломаную и пустой footprint
+    starts = [State(0.0, 0.0, 0.0, 0.0), State(1.0, 2.0, 0.5, 0.1), State(0.0, 0.0, 0.0, 0.0), State(-1.0, 0.0, 1.0, 0.0)]
+    goals = [State(3.0, 1.0, 0.3, 0.0), State(4.0, 1.0, -0.2, 0.0), State(-2.0, 1.0, 3.0, 0.0), State(1.0, 2.5, 1.2, 0.0)]
+    status, steps, params = optimization_Newton_batch(starts, goals, 20, 1e-2, 0.5, return_status=True)
+    prims = PrimitiveArray.from_batch(starts, goals, status, steps, params)
+    assert 0 < np.sum(prims["status"] == STATUS_CONVERGED) < len(prims)
+    return prims
+
+
+@pytest.fixture
+def saved(tmp_path):
+    prims = _primitives()
+    footprints = compute_footprints(prims, resolution=0.5, radius=0.2)
+    filename = str(tmp_path / "library.bin")
+    save_library(filename, prims, sample_ds=SAMPLE_DS, footprints=footprints)
+    return filename, prims, footprints
+
+
+def test_round_trip(saved):
+    filename, prims, footprints = saved
+    library = load_library(filename)
+    assert len(library) == len(prims)
+    for name in PRIMITIVE_DTYPE.names:
+        assert np.array_equal(library.primitives[name], prims[name], equal_nan=name not in ("status", "iterations")), name
+
+    assert library.has_samples and library.sample_ds == SAMPLE_DS
+    for i in range(len(prims)):
+        expected = np.zeros((0, 4))
+        if prims["status"][i] == STATUS_CONVERGED:
+            expected = np.column_stack(prims.trajectory(i).sample_states(SAMPLE_DS))
+        assert np.array_equal(library.samples(i), expected)
+
+    loaded = library.footprints
+    assert (loaded.resolution, loaded.radius) == (footprints.resolution, footprints.radius)
+    assert np.array_equal(loaded.offsets, footprints.offsets) and np.array_equal(loaded.runs, footprints.runs)
+    for i in range(len(prims)):
+        assert np.array_equal(loaded.cells(i), footprints.cells(i))
+
+
+def test_round_trip_without_optional_sections(tmp_path):
+    prims = _primitives()
+    filename = str(tmp_path / "library.bin")
+    save_library(filename, prims)
+    library = load_library(filename)
+    assert not library.has_samples and library.sample_ds is None and library.footprints is None
+    assert np.array_equal(library.primitives["k1"], prims["k1"], equal_nan=True)
+
+
+def _patch_header(filename, **fields):
+    names = ["magic", "version", "record_size", "count", "samples_offset", "samples_count", "sample_ds",
+             "footprints_offset", "footprints_count", "resolution", "radius"]
+    with open(filename, "r+b") as f:
+        header = dict(zip(names, struct.unpack(HEADER_FORMAT, f.read(HEADER_SIZE))))
+        header.update(fields)
+        f.seek(0)
+        f.write(struct.pack(HEADER_FORMAT, *[header[name] for name in names]))
+
+
+@pytest.mark.parametrize("fields", [{"magic": b"NOTALIB\0"}, {"version": LIBRARY_VERSION - 1},
+                                    {"version": LIBRARY_VERSION + 1}, {"record_size": 8}])
+def test_bad_header_is_rejected(saved, fields):
+    filename = saved[0]
+    _patch_header(filename, **fields)
+    with pytest.raises(ValueError):
+        load_library(filename)
+
+
+@pytest.mark.parametrize("keep", [HEADER_SIZE // 2, HEADER_SIZE + 10, -8])
+def test_truncated_file_is_rejected(saved, keep):
+    filename = saved[0]
+    with open(filename, "rb") as f:
+        data = f.read()
+    with open(filename, "wb") as f:
+        f.write(data[:keep])
+    with pytest.raises(ValueError):
+        load_library(filename)
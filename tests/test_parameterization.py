@@ -0,0 +1,30 @@
+""" Переходы между параметризациями: (k1, k2, log_length) <-> (a, b, c, length). """
+
+import numpy as np
+from PRIM_structs import *
+
+
+def test_curve_coef_round_trip():
+    rng = np.random.default_rng(0)
+    k0, k1, k2, kf = rng.uniform(-1.0, 1.0, (4, 1000))
+    log_length = rng.uniform(-2.0, 3.0, 1000)
+
+    a, b, c, length = curve_to_coef_params(k0, k1, k2, kf, log_length)
+    back = coef_to_curve_params(k0, a, b, c, length)
+    assert np.allclose(np.stack(back), np.stack([k1, k2, kf, log_length]), rtol=0, atol=1e-10)
+
+    forward = curve_to_coef_params(k0, *back)
+    assert np.allclose(np.stack(forward), np.stack([a, b, c, length]), rtol=1e-10, atol=1e-10)
+
+
+def test_curve_coef_scalar_matches_array():
+    a, b, c, length = curve_to_coef_params(0.1, -0.2, 0.3, 0.05, 0.7)
+    arrays = curve_to_coef_params(np.array([0.1]), np.array([-0.2]), np.array([0.3]), np.array([0.05]), np.array([0.7]))
+    assert np.allclose([a, b, c, length], np.concatenate(arrays), rtol=0, atol=1e-15)
+
+
+def test_curve_params_are_knot_curvatures():
+    # k1, k2, kf - кривизна траектории в точках L/3, 2L/3, L
+    traj = ShortTrajectory(State(0.0, 0.0, 0.0, 0.2), State(3.0, 1.0, 0.5, -0.1)).set_curve_params(0.4, -0.3, 1.1)
+    length = np.exp(1.1)
+    assert np.allclose([traj.k(length / 3), traj.k(2 * length / 3), traj.k(length)], [0.4, -0.3, -0.1], atol=1e-12)
@@ -0,0 +1,42 @@
+""" Совместная генерация цепочки спиралей через путевые точки. """
+
+import numpy as np
+import pytest
+from PRIM_structs import *
+from path_solver import PathSolver
+
+
+def _values(state: State) -> list:
+    return [state.x, state.y, state.theta, state.k]
+
+
+def _waypoints(count: int = 50) -> list:
+    # точки на синусоиде с углами касательной
+    xs = np.linspace(0.0, 20.0, count)
+    return [State(x, 2 * np.sin(x / 3), np.arctan(2 / 3 * np.cos(x / 3)), 0.0) for x in xs]
+
+
+@pytest.mark.parametrize("free_headings", [False, True])
+def test_chain_through_50_waypoints_is_continuous(free_headings):
+    points = _waypoints()
+    result = PathSolver(free_headings=free_headings).solve(points)
+    assert result.converged
+    segments = result.segments
+    assert len(segments) == len(points) - 1
+
+    first, last = segments[0].state(0.0), segments[-1].state(segments[-1].length)
+    assert np.allclose(_values(first), _values(points[0]), atol=1e-6)
+    assert np.allclose(_values(last), _values(points[-1]), atol=1e-5)
+    for left, right, point in zip(segments[:-1], segments[1:], points[1:-1]):
+        end, begin = left.state(left.length), right.state(0.0)
+        assert np.allclose([end.x, end.y], [point.x, point.y], atol=1e-5)
+        assert np.allclose(_values(end), _values(begin), atol=1e-5)
+        L = left.length  # k'(s) = a + 2 b s + 3 c s^2 непрерывна на стыке
+        assert np.isclose(left.a + 2 * left.b * L + 3 * left.c * L ** 2, right.a, atol=1e-5)
+
+
+def test_repeated_waypoint_is_rejected():
+    points = _waypoints(6)
+    points.insert(3, points[3])
+    with pytest.raises(ValueError):
+        PathSolver().solve(points)
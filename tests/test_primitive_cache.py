@@ -0,0 +1,50 @@
+""" Кэш примитивов: телеметрия при промахе и попадании, повёрнутые и отражённые запросы. """
+
+import numpy as np
+from PRIM_structs import *
+from trajectory_optimization import optimization_Newton
+from primitive_cache import PrimitiveCache
+from test_quadrature import ITERS, EPS, LR
+
+
+def _rotate(start: State, goal: State, angle: float, shift: tuple) -> tuple:
+    c, s = np.cos(angle), np.sin(angle)
+    move = lambda p: State(c * p.x - s * p.y + shift[0], s * p.x + c * p.y + shift[1], p.theta + angle, p.k)
+    return move(start), move(goal)
+
+
+def test_miss_returns_solver_telemetry_and_hit_zeroes_it():
+    cache = PrimitiveCache(iters=ITERS, eps=EPS, lr=LR)
+    start, goal = State(0.0, 0.0, 0.0, 0.1), State(4.0, -1.5, -0.6, 0.0)
+    miss = cache(start, goal)
+    direct = optimization_Newton(start, goal, ITERS, EPS, LR)
+    assert miss.converged and cache.misses == 1
+    assert miss.wall_time > 0 and miss.integrations > 0 and miss.jacobian_builds > 0
+    assert (miss.iterations, miss.integrations, miss.jacobian_builds) == \
+           (direct.iterations, direct.integrations, direct.jacobian_builds)
+    assert len(miss.residual_history) == len(direct.residual_history)
+    assert np.allclose(miss.params, direct.params, atol=1e-9)
+
+    hit = cache(*_rotate(start, goal, 1.3, (5.0, -2.0)))
+    assert cache.hits == 1
+    assert (hit.wall_time, hit.integrations, hit.jacobian_builds) == (0.0, 0, 0)
+    assert hit.residual_history == [miss.residual_norm]
+    assert np.allclose(hit.params, miss.params, atol=1e-9)
+
+
+def test_mirrored_query_maps_params_back():
+    start, goal = State(0.0, 0.0, 0.0, 0.1), State(4.0, 1.5, 0.6, -0.2)
+    mirrored_start, mirrored_goal = State(0.0, 0.0, 0.0, -0.1), State(4.0, -1.5, -0.6, 0.2)
+    direct = optimization_Newton(start, goal, ITERS, EPS, LR)
+    for first, second in [((start, goal), (mirrored_start, mirrored_goal)),
+                          ((mirrored_start, mirrored_goal), (start, goal))]:
+        cache = PrimitiveCache(iters=ITERS, eps=EPS, lr=LR)
+        a, b = cache(*first), cache(*second)
+        assert cache.misses == 1 and cache.hits == 1
+        assert a.integrations > 0 and b.integrations == 0
+        assert np.allclose(a.params[:2], -b.params[:2], atol=1e-9) and np.isclose(a.params[2], b.params[2])
+        # траектория возвращается в системе координат запроса
+        for (_, g), result in [(first, a), (second, b)]:
+            end = result.traj.state(result.traj.length)
+            assert np.allclose([end.x, end.y, end.theta], [g.x, g.y, g.theta], atol=1e-2)
+    assert np.allclose(PrimitiveCache(iters=ITERS, eps=EPS, lr=LR)(start, goal).params, direct.params, atol=1e-9)
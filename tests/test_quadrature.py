@@ -0,0 +1,94 @@
+""" Точность интегрирования координат и проверка найденных решений (ложные успехи на длинных закрученных траекториях). """
+
+import numpy as np
+import pytest
+from PRIM_structs import *
+from trajectory_optimization import optimization_Newton, optimization_Newton_batch, get_residual
+from baseline_trajectory_optimization import baseline_optimization_Newton
+from run_grid_experiment import generate_grid_tasks
+
+
+ITERS, EPS, LR = 300, 1e-2, 0.1  # как в run_grid_experiment.py
+
+
+def _grid_task(cell_i, cell_j, angle_idx):
+    for i, j, a, start, goal in generate_grid_tasks():
+        if (i, j, a) == (cell_i, cell_j, angle_idx):
+            return start, goal
+
+
+def _quad_residual_norm(start, goal, params):
+    traj = ShortTrajectory(start, goal, QuadIntegrator()).set_curve_params(*params)
+    return float(np.linalg.norm(get_residual(traj)))
+
+
+@pytest.mark.parametrize("cell", [(1, 2, 0), (8, 2, 0)])
+def test_long_trajectory_success_is_real(cell):
+    # раньше 64 фиксированных узлов не разрешали траекторию длиной ~70 с поворотом на ~60 рад, и метод "сходился"
+    # с ошибкой конца 0.33 (в 33 раза больше eps)
+    start, goal = _grid_task(*cell)
+    result = optimization_Newton(start, goal, ITERS, EPS, LR)
+    assert result.status in (STATUS_CONVERGED, STATUS_INACCURATE, STATUS_MAX_ITER)
+    if result.converged:
+        assert _quad_residual_norm(start, goal, result.params) <= EPS
+
+    status, _, params = optimization_Newton_batch([start], [goal], ITERS, EPS, LR, return_status=True)
+    if status[0] == STATUS_CONVERGED:
+        assert _quad_residual_norm(start, goal, params[0]) <= EPS
+
+
+@pytest.mark.parametrize("cell", [(1, 2, 0), (8, 2, 0)])
+def test_unresolved_quadrature_is_not_reported_as_converged(cell):
+    # без сгущения разбиения невязка, которую видит метод, ложная - проверка с контролем точности её отбраковывает
+    start, goal = _grid_task(*cell)
+    coarse = GaussLegendreIntegrator(max_phase=None)
+    result = optimization_Newton(start, goal, ITERS, EPS, LR, integrator=coarse)
+    assert result.status == STATUS_INACCURATE and result.traj is None
+    status, _, _ = optimization_Newton_batch([start], [goal], ITERS, EPS, LR, integrator=coarse, return_status=True)
+    assert status[0] == STATUS_INACCURATE
+
+
+def test_baseline_unresolved_quadrature_is_not_reported_as_converged():
+    # та же ложная сходимость в первой параметризации: стартуем из ложного решения (a, b, c, length), найденного грубой
+    # квадратурой, - базовый метод "сходится" за итерацию, а проверка с контролем точности это отбраковывает
+    start, goal = _grid_task(1, 2, 0)
+    coarse = GaussLegendreIntegrator(max_phase=None)
+    found = ShortTrajectory(start, goal, coarse).set_curve_params(*optimization_Newton(start, goal, ITERS, EPS, LR,
+                                                                                       integrator=coarse).params)
+    result = baseline_optimization_Newton(start, goal, ITERS, EPS, LR, integrator=coarse,
+                                          init_params=[found.a, found.b, found.c, found.length])
+    assert result.status == STATUS_INACCURATE and result.traj is None
+    assert result.residual_history[-1] <= EPS
+
+    result = baseline_optimization_Newton(State(0.0, 0.0, 0.0, 0.0), State(3.0, 1.0, 0.3, 0.0))
+    assert result.converged and result.traj is not None
+
+
+def test_phase_refinement_matches_quad():
+    rng = np.random.default_rng(0)
+    coefs = np.column_stack([rng.uniform(-np.pi, np.pi, 20), rng.normal(0, 1, 20), rng.normal(0, 0.05, 20),
+                             rng.normal(0, 1e-3, 20), rng.normal(0, 1e-5, 20)])  # поворот до сотен радиан
+    lengths = rng.uniform(1.0, 60.0, 20)
+    integrator = GaussLegendreIntegrator()
+    xs, ys = integrator.integrate_batch(coefs, lengths)
+    ref_x, ref_y = QuadIntegrator(limit=1000).integrate_batch(coefs, lengths)
+    assert np.max(np.abs(xs - ref_x)) < 1e-8 and np.max(np.abs(ys - ref_y)) < 1e-8
+    for c, s, x, y in zip(coefs, lengths, xs, ys):  # одиночные вызовы выбирают то же разбиение, что пакетные
+        assert np.allclose(integrator.integrate(c, s), (x, y), rtol=0, atol=1e-12)
+    assert list(integrator.segments_for(coefs, lengths)) == [integrator.segments_for(c, s) for c, s in zip(coefs, lengths)]
+
+
+def test_single_integral_is_bit_identical_to_batch_row():
+    # быстрый путь одной траектории (без _refine) делает те же операции, что пакетный, - на этом держится совпадение
+    # одиночного и пакетного метода Ньютона
+    rng = np.random.default_rng(1)
+    coefs = np.column_stack([rng.uniform(-np.pi, np.pi, 200), rng.normal(0, 1, 200), rng.normal(0, 0.1, 200),
+                             rng.normal(0, 1e-2, 200), rng.normal(0, 1e-3, 200)])
+    lengths = rng.uniform(0.1, 40.0, 200)
+    for integrator in (GaussLegendreIntegrator(), SimpsonIntegrator()):
+        segments = integrator.segments_for(coefs, lengths)
+        assert len(set(segments.tolist())) > 1  # есть и обычные, и сгущённые разбиения
+        xs, ys = integrator.integrate_batch(coefs, lengths)
+        for k in range(len(lengths)):
+            assert integrator.integrate(coefs[k], lengths[k]) == (xs[k], ys[k])
+            assert integrator.segments_for(coefs[k], lengths[k]) == segments[k]
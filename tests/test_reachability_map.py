@@ -0,0 +1,33 @@
+""" Адаптивная карта достижимости: каждый метод сгущается по своей границе успеха. """
+
+import numpy as np
+from PRIM_structs import STATUS_CONVERGED, STATUS_MAX_ITER, STATUS_NOT_SOLVED
+from reachability_map import ReachabilityMap
+
+
+def _fill(reach, refine_on=None):
+    # построение без решателя: "proposed" сходится при x < 0.3 (чистая граница), "baseline" - в случайных узлах
+    rng = np.random.default_rng(0)
+    noise = rng.random(reach.shape) < 0.5
+    truth = {'proposed': reach.goals(np.arange(np.prod(reach.shape)))[:, 0].reshape(reach.shape) < 0.3, 'baseline': noise}
+    for level in range(reach.levels + 1):
+        for method, flat in reach.candidates(level, refine_on).items():
+            index = np.unravel_index(flat, reach.shape)
+            reach.status[method][index] = np.where(truth[method][index], STATUS_CONVERGED, STATUS_MAX_ITER)
+    return truth
+
+
+def test_noisy_method_does_not_refine_the_other():
+    reach = ReachabilityMap(base_shape=(5, 5, 4), levels=3)
+    truth = _fill(reach)
+    full = np.prod(reach.shape)
+    proposed = np.sum(reach.status['proposed'] != STATUS_NOT_SOLVED)
+    assert proposed < 0.2 * full                                           # только окрестность границы x = 0.3
+    assert np.array_equal(reach.success_map('proposed'), truth['proposed'])
+    assert np.sum(reach.status['baseline'] != STATUS_NOT_SOLVED) > proposed  # шумный метод сгущается сам по себе
+
+
+def test_joint_refinement_solves_same_nodes():
+    reach = ReachabilityMap(base_shape=(5, 5, 4), levels=2)
+    _fill(reach, refine_on=['baseline'])
+    assert np.array_equal(reach.status['proposed'] != STATUS_NOT_SOLVED, reach.status['baseline'] != STATUS_NOT_SOLVED)
@@ -0,0 +1,69 @@
+""" Потоковая запись результатов: продолжение оборванного запуска и итоговая статистика на лету. """
+
+import numpy as np
+from result_stream import ResultWriter, RunningStats, read_completed
+
+
+FIELDNAMES = ['id', 'success', 'time']
+
+
+def _run(filename, tasks, resume):
+    # тот же порядок действий, что в run_experiment.py: пропускаем выполненные задачи, остальные дописываем
+    completed = read_completed(filename, ['id']) if resume else set()
+    todo = [task for task in tasks if (str(task),) not in completed]
+    with ResultWriter(filename, FIELDNAMES, flush_every=3) as writer:
+        for task in todo:
+            writer.write({'id': task, 'success': task % 3 != 0, 'time': 0.5 * task})
+    return todo
+
+
+def test_truncated_last_line_is_dropped_and_task_is_rerun(tmp_path):
+    filename = str(tmp_path / "results.csv")
+    assert _run(filename, range(5), resume=False) == list(range(5))
+    with open(filename, 'a', newline='') as f:
+        f.write('5,True,2.')  # запуск оборвался посреди записи задачи 5
+
+    completed = read_completed(filename, ['id'])
+    assert completed == {(str(task),) for task in range(5)}
+    with open(filename, 'rb') as f:
+        assert f.read().endswith(b'\n')  # оборванная строка отрезана
+
+    assert _run(filename, range(8), resume=True) == [5, 6, 7]
+    rows = []
+    read_completed(filename, ['id'], on_row=rows.append)
+    assert [row['id'] for row in rows] == [str(task) for task in range(8)]
+    assert rows[5] == {'id': '5', 'success': 'True', 'time': '2.5'}
+
+
+def test_resume_of_file_with_only_partial_header(tmp_path):
+    filename = str(tmp_path / "results.csv")
+    with open(filename, 'w', newline='') as f:
+        f.write('id,succ')
+    assert read_completed(filename, ['id']) == set()
+    assert _run(filename, range(3), resume=True) == [0, 1, 2]
+    rows = []
+    read_completed(filename, ['id'], on_row=rows.append)
+    assert [row['id'] for row in rows] == ['0', '1', '2']
+
+
+def test_running_stats_match_numpy():
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(mean=-4.0, sigma=1.5, size=2001)
+    success = rng.random(len(values)) < 0.8
+    stats = RunningStats()
+    for ok, value in zip(success, values):
+        stats.add(ok, value)
+
+    assert stats.total == len(values) and stats.successes == np.sum(success)
+    assert np.isclose(stats.success_rate, np.mean(success))
+    assert np.isclose(stats.mean, np.mean(values[success]), rtol=1e-12)
+    # медиана - середина корзины гистограммы шириной 1/200 порядка (~1.2%)
+    assert np.isclose(stats.median, np.median(values[success]), rtol=0.006)
+
+    small = RunningStats()
+    for value in [3.0, 1.0, 2.0, 10.0, 0.5]:
+        small.add(True, value)
+    small.add(False)
+    assert np.isclose(small.mean, np.mean([3.0, 1.0, 2.0, 10.0, 0.5]), rtol=1e-12)
+    assert np.isclose(small.median, 2.0, rtol=0.006)
+    assert RunningStats().median is None
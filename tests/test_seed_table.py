@@ -0,0 +1,52 @@
+""" Таблица начальных приближений: зеркальная симметрия по dy. """
+
+import numpy as np
+import pytest
+from PRIM_structs import *
+from seed_table import build_seed_table
+from trajectory_optimization import optimization_Newton
+
+
+DX, DTHETA, K0 = np.linspace(1.0, 4.0, 4), np.linspace(-0.6, 0.6, 5), (-0.1, 0.0, 0.1)
+
+
+@pytest.fixture(scope="module")
+def tables():
+    mirrored = build_seed_table(DX, np.linspace(0.0, 2.0, 3), DTHETA, K0, eps=1e-6)
+    full = build_seed_table(DX, np.linspace(-2.0, 2.0, 5), DTHETA, K0, eps=1e-6)
+    return mirrored, full
+
+
+def _mirror(start: State, goal: State) -> tuple:
+    # отражение относительно оси направления start (start с нулевым углом направления в начале координат)
+    return State(start.x, start.y, start.theta, -start.k), State(goal.x, -goal.y, -goal.theta, -goal.k)
+
+
+def test_mirrored_lookup_matches_direct(tables):
+    mirrored, full = tables
+    assert mirrored.mirrored and not full.mirrored
+    assert mirrored.coverage() == 1.0 and full.coverage() == 1.0
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        start = State(0.0, 0.0, 0.0, rng.uniform(-0.1, 0.1))
+        goal = State(rng.uniform(1.0, 4.0), rng.uniform(0.1, 2.0), rng.uniform(-0.6, 0.6), 0.0)
+        direct, reflected = mirrored.lookup(start, goal), mirrored.lookup(*_mirror(start, goal))
+        assert direct is not None and reflected is not None
+        assert np.allclose(reflected, direct * [-1, -1, 1])
+        # полная таблица хранит обе половины: в отражённой половине приближение то же (с точностью решения)
+        assert np.allclose(reflected, full.lookup(*_mirror(start, goal)), atol=1e-3)
+
+
+def test_mirrored_node_is_a_solution():
+    table = build_seed_table(DX[:2], np.linspace(0.0, 1.0, 2), DTHETA[1:4], (0.0,), eps=1e-6)
+    start, goal = State(0.0, 0.0, 0.0, 0.0), State(DX[1], -1.0, -DTHETA[1], 0.0)  # в отражении - узел (DX[1], 1, DTHETA[1])
+    seed = table.lookup(start, goal)
+    solution = optimization_Newton(start, goal, 300, 1e-6, 0.1, jacobian="exact")
+    assert seed is not None and solution.converged
+    assert np.allclose(seed, solution.params, atol=1e-3)
+
+
+@pytest.mark.parametrize("axes", [{"dtheta": np.linspace(0.0, 1.0, 3)}, {"k0": (0.0, 0.1)}, {"kf": (0.05,)}])
+def test_asymmetric_axes_are_rejected_with_mirroring(axes):
+    with pytest.raises(AssertionError):
+        build_seed_table(DX[:2], np.linspace(0.0, 1.0, 2), **{"dtheta": DTHETA, **axes})
@@ -3,9 +3,14 @@
 """
 
 import numpy as np
+import time
 import sys
 sys.path.append("../common/")
 from PRIM_structs import *
+from newton_steps import StepController, residual_norm
+from divergence import SolveBudget, DivergenceMonitor
+from PRIM_profiling import register_stages
+from trajectory_optimization import VERIFY_INTEGRATOR
 
 
 
@@ -25,7 +30,7 @@ def baseline_calc_Jacobian_matrix(traj: ShortTrajectory, params: np.ndarray, dk:
     """
 
     a, b, c, length = params
-    traj = ShortTrajectory(traj.start, traj.goal)
+    traj = ShortTrajectory(traj.start, traj.goal, traj.integrator)
     
     dF_p = baseline_get_residual(traj.set_coef_params(a+dk, b, c, length))
     dF_m = baseline_get_residual(traj.set_coef_params(a-dk, b, c, length))
@@ -47,28 +52,128 @@ def baseline_calc_Jacobian_matrix(traj: ShortTrajectory, params: np.ndarray, dk:
 
 
 
-def baseline_optimization_Newton(start: State, goal: State, iters: int = 2000, eps: float = 1e-2, lr: float = 0.03, redraw_trajectory = None) -> ShortTrajectory:
+def baseline_calc_residual_and_Jacobian(traj: ShortTrajectory, params: np.ndarray):
     """
-    Аналогично предыдущей функции, но использует базовую параметризацию.
+    Невязка и точная матрица Якоби (4 на 4) по параметрам a, b, c, length за один проход интегрирования
+    (аналог calc_residual_and_Jacobian для первой параметризации). Производные конечных x, y по коэффициентам - это
+    моменты int_0^L s^m sin/cos(theta(s)) ds, производные по длине L - значения подынтегральных функций в конце траектории.
+    """
+
+    a, b, c, length = params
+    traj.set_coef_params(a, b, c, length)
+    coefs = traj.theta_coefs()
+    moments_cos, moments_sin = traj.integrator.moments_batch(coefs.reshape(1, -1), np.array([length]))
+    moments_cos, moments_sin = moments_cos[0], moments_sin[0]
+
+    theta_f, k_f = traj.theta(length), traj.k(length)
+    residual = np.array([traj.goal.x - (traj.start.x + moments_cos[0]),
+                         traj.goal.y - (traj.start.y + moments_sin[0]),
+                         traj.goal.theta - theta_f,
+                         traj.goal.k - k_f])
+
+    degrees = np.array([2, 3, 4])
+    d_final = np.array([np.append(-moments_sin[degrees] / degrees, np.cos(theta_f)),      # производные x(L) по a, b, c, length
+                        np.append(moments_cos[degrees] / degrees, np.sin(theta_f)),       # y(L)
+                        np.append(length ** degrees / degrees, k_f),                      # theta(L)
+                        np.append(length ** (degrees - 1), a + 2*b*length + 3*c*length**2)])  # k(L)
+    return residual, -d_final
+
+
+
+def baseline_verify_converged(start: State, goal: State, params: np.ndarray, eps: float) -> bool:
+    """
+    Проверка найденного решения (a, b, c, length), как verify_converged в trajectory_optimization.py: невязка,
+    пересчитанная с контролем точности интегрирования (VERIFY_INTEGRATOR), не больше eps.
+    """
+
+    with np.errstate(all='ignore'):
+        try:
+            traj = ShortTrajectory(start, goal, VERIFY_INTEGRATOR).set_coef_params(*params)
+        except AssertionError:
+            return False
+        return bool(residual_norm(baseline_get_residual(traj)) <= eps)
+
+
+
+def baseline_optimization_Newton(start: State, goal: State, iters: int = 2000, eps: float = 1e-2, lr: float = 0.03, redraw_trajectory = None,
+                                 integrator = None, jacobian: str = "numeric", init_params = None,
+                                 step: str = "fixed", trace = None, budget: SolveBudget = None) -> SolveResult:
+    """
+    Аналогично предыдущей функции, но использует базовую параметризацию
+    (начальное приближение init_params, если задано, - это a, b, c, length; стратегии шага step - см. newton_steps.py,
+    досрочная остановка budget - см. divergence.py).
+    Возвращает SolveResult, как и optimization_Newton (в том числе STATUS_INACCURATE, если найденное решение не
+    подтвердилось проверкой baseline_verify_converged).
     """
     
-    traj =  ShortTrajectory(start, goal)
-    params = np.array([0.0, 0.0, 0.0, 1.0])  # начальные параметры траектории (первая параметризация): a, b, c, length
+    assert jacobian in ("numeric", "exact"), "Неизвестный способ вычисления матрицы Якоби!"
+    traj =  ShortTrajectory(start, goal, integrator)
+    params = np.array([0.0, 0.0, 0.0, 1.0]) if init_params is None else np.array(init_params, dtype=float)  # начальные параметры траектории (первая параметризация): a, b, c, length
+
+    probe = ShortTrajectory(start, goal, integrator)
+    controller = StepController(step, lambda p: baseline_get_residual(probe.set_coef_params(*p)), lr=lr)
+    monitor = None if budget is None else DivergenceMonitor(budget, states_to_array([start]), states_to_array([goal]))
+
+    t_start = time.perf_counter()
+    status = STATUS_MAX_ITER
+    history = []
+    integrations, jacobian_builds = 0, 0
 
     steps = 0
     for i in range(iters):
         steps += 1
-        curr_diff = baseline_get_residual(traj.set_coef_params(*params))
-        J = baseline_calc_Jacobian_matrix(traj, params)
-        params -= lr * np.linalg.inv(J) @ curr_diff
+        try:
+            if jacobian == "exact":
+                curr_diff, J = baseline_calc_residual_and_Jacobian(traj, params)
+                integrations += 1
+            else:
+                curr_diff = baseline_get_residual(traj.set_coef_params(*params))
+                J = baseline_calc_Jacobian_matrix(traj, params)
+                integrations += 9  # невязка + 8 сдвинутых траекторий
+            jacobian_builds += 1
+        except AssertionError:  # например, длина стала отрицательной
+            status = STATUS_DIVERGED
+            break
 
-        if np.sum(curr_diff ** 2) ** 0.5 <= eps:  # если норма невязки достаточно мала, можно останавливать поиск
+        norm = residual_norm(curr_diff)
+        history.append(norm)
+        if not (np.isfinite(norm) and np.all(np.isfinite(J))):
+            status = STATUS_DIVERGED
             break
+        if monitor is not None and norm > eps:
+            verdict = monitor.check_single(params, norm, J, integrations + controller.residual_evals, time.perf_counter() - t_start)
+            if verdict:
+                status = verdict
+                break
+
+        params = controller.step(params, curr_diff, J)
+
+        if norm <= eps:  # если норма невязки достаточно мала, можно останавливать поиск
+            status = STATUS_CONVERGED
+            break
+        if trace:
+            trace(i, params, norm)
         if redraw_trajectory:
             redraw_trajectory(traj, i)
 
-    else:
-        print("Невозможно найти траекторию! Метод Ньютона не сошёлся!")
-        return None
+    if status == STATUS_MAX_ITER and controller.last_singular:
+        status = STATUS_SINGULAR
+    integrations += controller.residual_evals
+
+    found = None
+    if status == STATUS_CONVERGED:
+        try:
+            found = traj.set_coef_params(*params)  # возвращаем найденную траекторию (с найденными параметрами)
+        except AssertionError:  # последний шаг увёл длину в недопустимую область
+            status = STATUS_DIVERGED
+    if status == STATUS_CONVERGED and not baseline_verify_converged(start, goal, params, eps):
+        status, found = STATUS_INACCURATE, None
+    return SolveResult(status, found, params, steps, history, time.perf_counter() - t_start, integrations, jacobian_builds)
+
+
 
-    return steps, traj.set_coef_params(*params)  # возвращаем найденную траекторию (с найденными параметрами)
+# стадии профилирования (см. common/PRIM_profiling.py)
+register_stages(sys.modules[__name__], {
+    "baseline_get_residual": "residual",
+    "baseline_calc_Jacobian_matrix": "jacobian", "baseline_calc_residual_and_Jacobian": "jacobian",
+})
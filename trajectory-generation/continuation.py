@@ -0,0 +1,159 @@
+"""
+Генерация примитивов на сетке целевых состояний методом продолжения (continuation).
+
+Метод Ньютона по умолчанию стартует из нулевых параметров, и для далёких или сильно повёрнутых целей ему требуется
+много итераций (или он вовсе не сходится). Но на плотной сетке целей (как в generate_grid_tasks или при построении control set)
+у каждой цели есть уже решённые соседи, и их параметры k1, k2, log_length - очень хорошее начальное приближение.
+Поэтому цели обходятся "волной" от самой простой (соседние цели подряд), а каждая задача стартует с параметров ближайшей
+уже решённой цели (ближайшая ищется KD-деревом по (x, y, theta, k)). Если из такого приближения решить не удалось,
+делается обычная попытка из нулей.
+"""
+
+import heapq
+import numpy as np
+from scipy.spatial import cKDTree
+from typing import Optional
+import sys
+sys.path.append("../common/")
+from PRIM_structs import *
+from trajectory_optimization import optimization_Newton
+
+
+
+class SolvedIndex:
+    """
+    KD-дерево по уже решённым целям (в масштабированных координатах), в которое можно добавлять точки по одной.
+    cKDTree неизменяемо, поэтому новые точки сначала копятся в небольшом "хвосте" (в нём ближайшая ищется перебором),
+    а дерево перестраивается, когда хвост становится больше самого дерева - в сумме это O(N log N) на N добавлений.
+    """
+
+    def __init__(self) -> None:
+        self._tree = None
+        self._tree_points = np.zeros((0, 4))
+        self._tree_values = []
+        self._tail_points = []
+        self._tail_values = []
+
+    def __len__(self) -> int:
+        return len(self._tree_values) + len(self._tail_values)
+
+    def add(self, point: np.ndarray, value) -> None:
+        self._tail_points.append(point)
+        self._tail_values.append(value)
+        if len(self._tail_points) > max(len(self._tree_values), 16):
+            self._tree_points = np.vstack([self._tree_points, self._tail_points])
+            self._tree_values += self._tail_values
+            self._tree = cKDTree(self._tree_points)
+            self._tail_points, self._tail_values = [], []
+
+    def nearest(self, point: np.ndarray):
+        """ Возвращает пару (расстояние, значение) для ближайшей добавленной точки (или (inf, None), если точек нет). """
+        best_dist, best_value = np.inf, None
+        if self._tree is not None:
+            best_dist, i = self._tree.query(point)
+            best_value = self._tree_values[i]
+        if self._tail_points:
+            dists = np.linalg.norm(np.array(self._tail_points) - point, axis=1)
+            i = int(np.argmin(dists))
+            if dists[i] < best_dist:
+                best_dist, best_value = dists[i], self._tail_values[i]
+        return best_dist, best_value
+
+
+
+def continuation_order(points: np.ndarray, root: int, neighbors: int = 8) -> np.ndarray:
+    """
+    Порядок обхода точек "волной" от root: каждой следующей берётся необработанная точка, ближайшая к уже обработанным
+    (алгоритм Прима на графе ближайших соседей). Так каждая цель (кроме первой) решается, когда её сосед уже решён.
+
+        points: (N, d) масштабированные координаты целей,
+        root: номер точки, с которой начинается обход,
+        neighbors: число ближайших соседей в графе.
+    """
+
+    n = len(points)
+    tree = cKDTree(points)
+    dists, nbrs = tree.query(points, k=min(neighbors + 1, n))
+    dists, nbrs = dists.reshape(n, -1), nbrs.reshape(n, -1)
+
+    visited = np.zeros(n, dtype=bool)
+    order, heap = [], [(0.0, root)]
+    next_unvisited = 0
+    while len(order) < n:
+        if not heap:  # граф соседей несвязен - продолжаем с любой необработанной точки
+            while visited[next_unvisited]:
+                next_unvisited += 1
+            heap.append((np.inf, next_unvisited))
+        _, i = heapq.heappop(heap)
+        if visited[i]:
+            continue
+        visited[i] = True
+        order.append(i)
+        for d, j in zip(dists[i], nbrs[i]):
+            if not visited[j]:
+                heapq.heappush(heap, (d, j))
+    return np.array(order)
+
+
+
+def continuation_solve(start: State, goals, weights=(1.0, 1.0, 1.0, 1.0), neighbors: int = 8,
+                       max_seed_distance: Optional[float] = None, cold_fallback: bool = True,
+                       solver=optimization_Newton, **solver_kwargs) -> PrimitiveArray:
+    """
+    Генерирует примитивы из start во все цели goals, обходя их волной и используя решения соседних целей как начальное приближение.
+
+        start: общее начальное состояние,
+        goals: список целевых состояний State (или массив (N, 4)),
+        weights: веса координат x, y, theta, k в расстоянии между целями,
+        neighbors: число соседей в графе обхода,
+        max_seed_distance: если ближайшая решённая цель дальше, стартуем из нулей (None - без ограничения),
+        cold_fallback: делать ли попытку из нулей, если из приближения соседа решить не удалось,
+        solver, solver_kwargs: функция генерации примитива (с параметром init_params и результатом SolveResult,
+                               как у optimization_Newton) и её параметры.
+
+    Возвращает PrimitiveArray в том же порядке, что и goals (iterations - суммарное число итераций всех попыток).
+    """
+
+    goals_arr = states_to_array(goals)
+    n = len(goals_arr)
+    prims = PrimitiveArray(n)
+    if n == 0:
+        return prims
+    scale = np.asarray(weights, dtype=float)
+    points = goals_arr * scale
+
+    # начинаем с цели, ближайшей к короткому прямому движению из start - для неё холодный старт самый надёжный:
+    easy = np.array([start.x + np.cos(start.theta), start.y + np.sin(start.theta), start.theta, start.k]) * scale
+    root = int(np.argmin(np.linalg.norm(points - easy, axis=1)))
+
+    solved = SolvedIndex()
+    for i in continuation_order(points, root, neighbors):
+        goal = State(*goals_arr[i].tolist())
+        dist, seed = solved.nearest(points[i])
+        if max_seed_distance is not None and dist > max_seed_distance:
+            seed = None
+
+        attempts = [seed] if seed is not None else []
+        if seed is None or cold_fallback:
+            attempts.append(None)
+
+        result, iterations = None, 0
+        for init_params in attempts:
+            result = solver(start, goal, init_params=init_params, **solver_kwargs)
+            iterations += result.iterations
+            if result.converged:
+                break
+
+        row = prims.data[i]
+        row["start"] = [start.x, start.y, start.theta, start.k]
+        row["goal"] = goals_arr[i]
+        row["iterations"] = iterations
+        row["status"] = result.status
+        if not result.converged:
+            continue
+        traj = result.traj
+        row["a"], row["b"], row["c"], row["length"] = traj.a, traj.b, traj.c, traj.length
+        row["k1"], row["k2"], row["log_length"] = traj.k1, traj.k2, traj.log_length
+        row["curvature_cost"] = curvature_cost(traj.k0, traj.a, traj.b, traj.c, traj.length)
+        solved.add(points[i], (traj.k1, traj.k2, traj.log_length))
+    return prims
@@ -0,0 +1,232 @@
+"""
+Генерация управляющего набора (control set) примитивов для решётки состояний (state lattice).
+
+В примере primitives_examples.ipynb управляющий набор для 16 направлений собирается вручную: список целей для каждого
+начального направления, а остальные примитивы получаются поворотом на pi/2 и отражением (sym_primitives_show).
+Здесь то же самое сделано в общем виде. Решётка задаётся дискретными направлениями (lattice_headings), шагом сетки
+resolution и уровнями кривизны curvature_levels. Примитив - это движение из начала координат с направлением h0 и кривизной k0
+в клетку (dx, dy) с направлением h1 и кривизной k1, где клетка лежит в окрестности радиуса radius.
+
+Решётка переходит в себя при поворотах на pi/2 и отражениях (группа симметрий квадрата из 8 элементов), а форма примитива
+при этом не меняется (при отражении кривизна меняет знак). Поэтому все движения разбиваются на орбиты этой группы, методом
+Ньютона решается только один представитель каждой орбиты (его начальное направление лежит в канонической октанте [0, pi/4]),
+а остальные примитивы орбиты получаются преобразованием найденных параметров - примерно в 8 раз меньше решений.
+Уникальные задачи решаются параллельно, результат записывается в библиотеку примитивов (см. PRIM_library.py) со стоимостью
+каждого примитива: длиной (столбец length) и интегралом квадрата кривизны (столбец curvature_cost).
+
+Из командной строки:
+    python control_set.py --headings 16 --radius 3 --curvatures -0.5 0 0.5 --footprint-radius 0.3 --output control_set.prim
+"""
+
+import numpy as np
+import argparse
+from multiprocessing import Pool, cpu_count
+from functools import partial
+from typing import Optional
+import sys
+sys.path.append("../common/")
+from PRIM_structs import *
+from PRIM_library import save_library
+from PRIM_footprint import compute_footprints
+from trajectory_optimization import optimization_Newton
+
+
+
+LATTICE_DIRECTIONS = {4: [(1, 0)],                           # целочисленные направления первой четверти: в них решётка
+                      8: [(1, 0), (1, 1)],                   # переходит в себя ровно (как theta_16 в примере)
+                      16: [(1, 0), (2, 1), (1, 1), (1, 2)]}
+
+
+
+def wrap_angle(theta):
+    """ Приводит угол (или массив углов) к диапазону [-pi, pi). """
+    return (theta + np.pi) % (2 * np.pi) - np.pi
+
+
+
+def lattice_headings(num_headings: int) -> np.ndarray:
+    """
+    Дискретные направления решётки в порядке обхода против часовой стрелки, начиная с 0 (углы в [-pi, pi)).
+    Для 4, 8 и 16 направлений это направления целочисленных векторов (как theta_16 в примере), для остальных
+    (кратных 4) - равномерное разбиение окружности.
+    """
+
+    assert num_headings % 4 == 0, "Число направлений должно быть кратно 4 (решётка симметрична относительно поворотов на pi/2)!"
+    if num_headings in LATTICE_DIRECTIONS:
+        quarter = np.array([np.arctan2(dy, dx) for dx, dy in LATTICE_DIRECTIONS[num_headings]])
+        return wrap_angle(np.concatenate([quarter + r * np.pi / 2 for r in range(4)]))
+    return wrap_angle(2 * np.pi * np.arange(num_headings) / num_headings)
+
+
+
+class LatticeSymmetry:
+    """
+    Действие группы симметрий квадрата (повороты на pi/2 и отражение относительно оси x) на движения решётки.
+    Движение - кортеж целых (h0, k0, dx, dy, h1, k1): номера начального и конечного направлений, номера уровней кривизны
+    и смещение в клетках.
+    """
+
+    def __init__(self, num_headings: int, curvature_levels) -> None:
+        levels = np.asarray(curvature_levels, dtype=float)
+        negated = [int(np.argmin(np.abs(levels + k))) for k in levels]
+        assert np.allclose(levels[negated], -levels), "Уровни кривизны должны быть симметричны относительно нуля!"
+        self.num_headings = num_headings
+        self.negated = negated  # номер уровня кривизны -k для каждого уровня k
+
+
+    def apply(self, motion: tuple, rotation: int, reflect: bool) -> tuple:
+        """ Сначала (если reflect) отражение относительно оси x, затем поворот на rotation * pi/2. """
+        h0, k0, dx, dy, h1, k1 = motion
+        n = self.num_headings
+        if reflect:
+            h0, h1, dy = -h0 % n, -h1 % n, -dy
+            k0, k1 = self.negated[k0], self.negated[k1]
+        for _ in range(rotation):
+            dx, dy = -dy, dx
+        shift = rotation * n // 4
+        return (h0 + shift) % n, k0, dx, dy, (h1 + shift) % n, k1
+
+
+    def orbit(self, motion: tuple) -> list:
+        """ Все 8 образов движения (с повторами, если движение переходит в себя). """
+        return [(self.apply(motion, rotation, reflect), rotation, reflect) for reflect in (False, True) for rotation in range(4)]
+
+
+    def canonical(self, motion: tuple) -> tuple:
+        """ Представитель орбиты (наименьший образ; его начальное направление лежит в канонической октанте). """
+        return min(image for image, _, _ in self.orbit(motion))
+
+
+
+def enumerate_motions(headings: np.ndarray, resolution: float, curvature_levels, radius: float,
+                      max_turn: Optional[float] = np.pi / 4, forward: bool = True) -> set:
+    """
+    Представители орбит всех движений решётки, начинающихся в канонической октанте.
+
+        headings: направления решётки (lattice_headings),
+        resolution: шаг сетки,
+        curvature_levels: уровни кривизны (в начале и в конце примитива),
+        radius: радиус окрестности целей (по евклидову расстоянию до центра клетки),
+        max_turn: наибольший поворот |h1 - h0| (None - любой),
+        forward: только цели впереди по направлению движения.
+    """
+
+    n = len(headings)
+    symmetry = LatticeSymmetry(n, curvature_levels)
+    reach = int(np.floor(radius / resolution))
+    cells = [(dx, dy) for dx in range(-reach, reach + 1) for dy in range(-reach, reach + 1)
+             if 0 < np.hypot(dx, dy) * resolution <= radius]
+    num_levels = len(curvature_levels)
+
+    motions = set()
+    for h0 in range(n // 8 + 1):  # каноническая октанта: направления от 0 до pi/4
+        direction = np.array([np.cos(headings[h0]), np.sin(headings[h0])])
+        for h1 in range(n):
+            if max_turn is not None and abs(wrap_angle(headings[h1] - headings[h0])) > max_turn + 1e-9:
+                continue
+            for dx, dy in cells:
+                if forward and direction @ (dx, dy) <= 0:
+                    continue
+                for k0 in range(num_levels):
+                    for k1 in range(num_levels):
+                        motions.add(symmetry.canonical((h0, k0, dx, dy, h1, k1)))
+    return motions
+
+
+
+def _solve_motion(motion: tuple, headings: np.ndarray, resolution: float, levels: np.ndarray, solver, solver_kwargs: dict):
+    h0, k0, dx, dy, h1, k1 = motion
+    theta0 = headings[h0]
+    start = State(0.0, 0.0, theta0, levels[k0])
+    goal = State(dx * resolution, dy * resolution, theta0 + wrap_angle(headings[h1] - theta0), levels[k1])  # поворот кратчайшим путём
+    result = solver(start, goal, **solver_kwargs)
+    return motion, result.status, result.iterations, (result.params if result.converged else None)
+
+
+
+def generate_control_set(num_headings: int = 16, resolution: float = 1.0, curvature_levels=(0.0,), radius: float = 3.0,
+                         max_turn: Optional[float] = np.pi / 4, forward: bool = True, workers: int = 0,
+                         output: Optional[str] = None, sample_ds: Optional[float] = None,
+                         footprint_radius: Optional[float] = None, solver=optimization_Newton, **solver_kwargs) -> PrimitiveArray:
+    """
+    Генерирует управляющий набор решётки: решает представителей орбит и разворачивает их симметриями решётки.
+
+        num_headings: число дискретных направлений (см. lattice_headings),
+        resolution: шаг сетки,
+        curvature_levels: уровни кривизны (должны быть симметричны относительно нуля),
+        radius: радиус окрестности целей,
+        max_turn, forward: отбор целей (см. enumerate_motions),
+        workers: число процессов для решения уникальных задач (0 - в текущем процессе),
+        output: если задан, набор записывается в файл библиотеки примитивов (save_library),
+        sample_ds: шаг заранее посчитанных ломаных в библиотеке (None - без них),
+        footprint_radius: если задан, в библиотеку записываются заметаемые клетки примитивов для агента этого радиуса
+                          на сетке с шагом resolution (см. PRIM_footprint.py),
+        solver, solver_kwargs: функция генерации примитива с интерфейсом optimization_Newton (например, FallbackSolver из
+                               fallback.py) и её параметры (по умолчанию - точная матрица Якоби и iters=300, lr=0.1).
+
+    Возвращает PrimitiveArray со всеми примитивами набора (и несошедшимися, со статусом неудачи): начальное состояние
+    каждого - в начале координат, конечное - в центре клетки назначения.
+    """
+
+    solver_kwargs = {"jacobian": "exact", "iters": 300, "lr": 0.1, **solver_kwargs}
+    headings = lattice_headings(num_headings)
+    levels = np.asarray(curvature_levels, dtype=float)
+    symmetry = LatticeSymmetry(num_headings, levels)
+    unique = sorted(enumerate_motions(headings, resolution, levels, radius, max_turn, forward))
+
+    solve = partial(_solve_motion, headings=headings, resolution=resolution, levels=levels, solver=solver, solver_kwargs=solver_kwargs)
+    if workers > 0:
+        with Pool(processes=workers) as pool:
+            solved = pool.map(solve, unique, chunksize=max(1, len(unique) // (4 * workers)))
+    else:
+        solved = [solve(motion) for motion in unique]
+
+    rows = {}  # движение -> строка набора (образы, совпадающие с уже добавленными, пропускаются)
+    for motion, status, iterations, params in solved:
+        turn = wrap_angle(headings[motion[4]] - headings[motion[0]])  # поворот представителя (при отражении меняет знак)
+        for image, rotation, reflect in symmetry.orbit(motion):
+            if image in rows:
+                continue
+            h0, k0, dx, dy, h1, k1 = image
+            theta0 = headings[h0]
+            row = np.zeros((), dtype=PRIMITIVE_DTYPE)
+            row["start"] = [0.0, 0.0, theta0, levels[k0]]
+            row["goal"] = [dx * resolution, dy * resolution, theta0 + (-turn if reflect else turn), levels[k1]]
+            row["status"], row["iterations"] = status, iterations
+            if params is not None:  # форма примитива при повороте не меняется, а при отражении кривизна меняет знак
+                row["k1"], row["k2"], row["log_length"] = (-params[0], -params[1], params[2]) if reflect else params
+            rows[image] = row
+
+    prims = PrimitiveArray(np.array([rows[motion] for motion in sorted(rows)], dtype=PRIMITIVE_DTYPE))
+    data = prims.data
+    ok = data["status"] == STATUS_CONVERGED
+    data["a"][ok], data["b"][ok], data["c"][ok], data["length"][ok] = curve_to_coef_params(
+        data["start"][ok, 3], data["k1"][ok], data["k2"][ok], data["goal"][ok, 3], data["log_length"][ok])
+    prims.update_costs()
+
+    if output is not None:
+        footprints = None if footprint_radius is None else compute_footprints(prims, resolution, footprint_radius)
+        save_library(output, prims, sample_ds, footprints)
+    return prims
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Генерация управляющего набора примитивов для решётки состояний.")
+    parser.add_argument('--output', default='control_set.prim', help="Файл библиотеки примитивов для сохранения набора.")
+    parser.add_argument('--headings', type=int, default=16, help="Число дискретных направлений решётки.")
+    parser.add_argument('--resolution', type=float, default=1.0, help="Шаг сетки.")
+    parser.add_argument('--curvatures', type=float, nargs='+', default=[0.0], help="Уровни кривизны (симметричные относительно нуля).")
+    parser.add_argument('--radius', type=float, default=3.0, help="Радиус окрестности целей.")
+    parser.add_argument('--max-turn', type=float, default=np.pi / 4, help="Наибольший поворот примитива (радианы).")
+    parser.add_argument('--sample-ds', type=float, default=None, help="Шаг сохраняемых ломаных (по умолчанию ломаные не сохраняются).")
+    parser.add_argument('--footprint-radius', type=float, default=None,
+                        help="Радиус агента для заметаемых клеток (по умолчанию клетки не сохраняются).")
+    parser.add_argument('--workers', type=int, default=cpu_count(), help="Количество параллельных процессов.")
+    args = parser.parse_args()
+
+    prims = generate_control_set(args.headings, args.resolution, args.curvatures, args.radius, args.max_turn,
+                                 workers=args.workers, output=args.output, sample_ds=args.sample_ds,
+                                 footprint_radius=args.footprint_radius)
+    converged = int(np.sum(prims["status"] == STATUS_CONVERGED))
+    print(f"Управляющий набор: {converged} из {len(prims)} примитивов сгенерировано, сохранён в '{args.output}'.")
@@ -0,0 +1,186 @@
+"""
+Ранняя диагностика расхождения метода Ньютона и бюджет на решение одной задачи.
+
+Несошедшаяся задача обычно тратит весь лимит итераций iters (на сетке 10x10 из run_grid_experiment.py при iters=300 это
+больше половины всего времени эксперимента), хотя по её первым итерациям уже видно, что решения не будет. Здесь собраны
+признаки, по которым поиск можно прекратить досрочно, с классификацией причины (коды STATUS_* в PRIM_structs.py):
+    STATUS_BUDGET - исчерпан бюджет задачи: время max_time или число проходов интегрирования max_integrations,
+    STATUS_CANCELLED - поиск отменён извне через cancel (например, задачу уже решила параллельная попытка, см. fallback.py),
+    STATUS_RUNAWAY_LENGTH - длина траектории ушла далеко от расстояния между start и goal (больше чем в max_length_ratio раз
+                            или, наоборот, стала во столько же раз меньше этого расстояния, хотя короче хорды траектория быть не может),
+    STATUS_ILL_CONDITIONED - число обусловленности матрицы Якоби больше max_condition (шаг Ньютона уже ничего не значит),
+    STATUS_WINDING - угол направления вдоль траектории уходит от начального больше, чем требует целевой угол, ещё на max_winding
+                     (траектория накручивает петли),
+    STATUS_STALLED - за последние window итераций лучшая норма невязки не уменьшилась хотя бы в (1 - min_decrease) раз
+                     по сравнению с лучшей до этого (невязка растёт или топчется на месте).
+
+Пороги по умолчанию подобраны на сетке run_grid_experiment.py (iters=300, lr=0.1): на ней они не обрывают ни одной
+сходящейся задачи (кроме одной, сходящейся за 270 итераций), а задачи, исчерпывающие лимит итераций, отсекают в среднем
+через 5-40 итераций. Признак петель по умолчанию выключен: метод Ньютона нередко сходится и к траекториям с
+несколькими петлями, так что это скорее требование к качеству примитива, чем признак расхождения.
+"""
+
+import numpy as np
+import sys
+sys.path.append("../common/")
+from PRIM_structs import *
+from PRIM_profiling import register_stages
+
+
+
+class SolveBudget:
+    """
+    Бюджет и пороги ранней остановки для одной задачи (параметр budget у optimization_Newton, baseline_optimization_Newton
+    и optimization_Newton_batch). Не хранит состояния, поэтому один объект можно передавать во все решения.
+
+        max_time: наибольшее время решения одной задачи в секундах (в пакетном решении - всего пакета; None - без ограничения),
+        max_integrations: наибольшее число проходов интегрирования на задачу (см. SolveResult.integrations; None - без ограничения),
+        window, min_decrease: окно (в итерациях) и требуемое относительное уменьшение лучшей нормы невязки за окно (None - не проверять),
+        max_length_ratio: допустимое отношение длины траектории к расстоянию между start и goal (None - не проверять),
+        max_condition: наибольшее допустимое число обусловленности матрицы Якоби (None - не проверять),
+        max_winding: допустимый (в радианах) уход угла направления сверх разницы начального и целевого углов (None - не проверять),
+        cancel: признак отмены - объект с методом is_set(), например threading.Event (None - поиск не отменяется).
+    """
+
+    def __init__(self, max_time: float = None, max_integrations: int = None, window: int = 20, min_decrease: float = 0.05,
+                 max_length_ratio: float = 50.0, max_condition: float = 1e8, max_winding: float = None, cancel = None) -> None:
+        self.max_time = max_time
+        self.max_integrations = max_integrations
+        self.window = window
+        self.min_decrease = min_decrease
+        self.max_length_ratio = max_length_ratio
+        self.max_condition = max_condition
+        self.max_winding = max_winding
+        self.cancel = cancel
+
+
+
+WINDING_SAMPLES = np.linspace(0.0, 1.0, 17)  # доли длины, в которых проверяется угол направления
+
+
+
+class DivergenceMonitor:
+    """
+    Проверяет признаки расхождения на каждой итерации метода Ньютона, храня между итерациями лучшие нормы невязки.
+    Заводится на одно решение (как StepController) сразу для N задач, для обычного метода Ньютона N = 1.
+
+        budget: пороги SolveBudget,
+        starts, goals: массивы (N, 4) начальных и целевых состояний.
+    """
+
+    def __init__(self, budget: SolveBudget, starts: np.ndarray, goals: np.ndarray) -> None:
+        self.budget = budget
+        self.starts, self.goals = starts, goals
+        chord = np.hypot(goals[:, 0] - starts[:, 0], goals[:, 1] - starts[:, 1])  # короче хорды траектория быть не может
+        if budget.max_length_ratio is not None:
+            self.min_length = chord / budget.max_length_ratio
+            self.max_length = np.maximum(chord, 1.0) * budget.max_length_ratio  # у близких целей (петель) хорда не задаёт масштаб
+        self.turn = np.abs(goals[:, 2] - starts[:, 2])  # поворот, которого требует целевой угол
+
+        n = len(starts)
+        self.best = np.full(n, np.inf)         # лучшая норма невязки до текущего окна
+        self.window_best = np.full(n, np.inf)  # лучшая норма невязки в текущем окне
+        self.count = np.zeros(n, dtype=int)    # число проверенных итераций
+
+
+    def check(self, idx: np.ndarray, coef_params: np.ndarray, norms: np.ndarray, J: np.ndarray, integrations,
+              elapsed: float) -> np.ndarray:
+        """
+        Проверяет задачи idx на текущей итерации. Возвращает массив кодов STATUS_* (0 - продолжаем поиск).
+
+            idx: номера проверяемых задач (M,),
+            coef_params: текущие параметры первой параметризации a, b, c, length этих задач (M, 4),
+            norms: нормы невязки (M,),
+            J: матрицы Якоби (M, 3, 3) или (M, 4, 4),
+            integrations: число уже сделанных проходов интегрирования (число или массив (M,)),
+            elapsed: время с начала решения в секундах.
+        """
+
+        budget = self.budget
+        verdict = np.zeros(len(idx), dtype=int)
+        if budget.cancel is not None and budget.cancel.is_set():
+            verdict[:] = STATUS_CANCELLED
+            return verdict
+
+        def mark(mask, status):
+            verdict[(verdict == 0) & mask] = status
+
+        if budget.max_time is not None and elapsed > budget.max_time:
+            verdict[:] = STATUS_BUDGET
+            return verdict
+        if budget.max_integrations is not None:
+            mark(np.asarray(integrations) >= budget.max_integrations, STATUS_BUDGET)
+
+        a, b, c, length = coef_params.T
+        if budget.max_length_ratio is not None:
+            mark(~((length >= self.min_length[idx]) & (length <= self.max_length[idx])), STATUS_RUNAWAY_LENGTH)  # ловит и nan
+
+        if budget.max_condition is not None:
+            with np.errstate(all="ignore"):
+                cond = np.linalg.cond(J)
+            mark(~(cond <= budget.max_condition), STATUS_ILL_CONDITIONED)
+
+        if budget.max_winding is not None:
+            s = length[:, None] * WINDING_SAMPLES
+            with np.errstate(all="ignore"):
+                turn = (self.starts[idx, 3:] + (a[:, None]/2 + (b[:, None]/3 + c[:, None]/4 * s) * s) * s) * s  # theta(s) - theta0
+                mark(~(np.max(np.abs(turn), axis=1) - self.turn[idx] <= budget.max_winding), STATUS_WINDING)
+
+        if budget.window is not None:
+            self.window_best[idx] = np.minimum(self.window_best[idx], norms)
+            self.count[idx] += 1
+            done = idx[self.count[idx] % budget.window == 0]  # задачи, у которых закончилось очередное окно
+            if len(done):
+                stalled = (self.count[done] > budget.window) & \
+                          (self.window_best[done] > (1 - budget.min_decrease) * self.best[done])
+                mark(np.isin(idx, done[stalled]), STATUS_STALLED)
+                self.best[done] = np.minimum(self.best[done], self.window_best[done])
+                self.window_best[done] = np.inf
+
+        return verdict
+
+
+    def check_single(self, coef_params, norm: float, J: np.ndarray, integrations: int, elapsed: float) -> int:
+        """
+        То же, что check, для единственной задачи (N = 1) на обычных числах (без накладных расходов пакетных операций NumPy,
+        которые на одной задаче сравнимы со стоимостью самой итерации): coef_params - (a, b, c, length), J - одна матрица Якоби.
+        """
+
+        budget = self.budget
+        if budget.cancel is not None and budget.cancel.is_set():
+            return STATUS_CANCELLED
+        if budget.max_time is not None and elapsed > budget.max_time:
+            return STATUS_BUDGET
+        if budget.max_integrations is not None and integrations >= budget.max_integrations:
+            return STATUS_BUDGET
+
+        a, b, c, length = coef_params
+        if budget.max_length_ratio is not None and not (self.min_length[0] <= length <= self.max_length[0]):
+            return STATUS_RUNAWAY_LENGTH
+
+        if budget.max_condition is not None:
+            singular_values = np.linalg.svd(J, compute_uv=False)
+            if not (singular_values[0] <= budget.max_condition * singular_values[-1]):
+                return STATUS_ILL_CONDITIONED
+
+        if budget.max_winding is not None:
+            s = length * WINDING_SAMPLES
+            turn = (self.starts[0, 3] + (a/2 + (b/3 + c/4 * s) * s) * s) * s
+            if not (np.max(np.abs(turn)) - self.turn[0] <= budget.max_winding):
+                return STATUS_WINDING
+
+        if budget.window is not None:
+            self.window_best[0] = min(self.window_best[0], norm)
+            self.count[0] += 1
+            if self.count[0] % budget.window == 0:
+                stalled = self.count[0] > budget.window and self.window_best[0] > (1 - budget.min_decrease) * self.best[0]
+                self.best[0] = min(self.best[0], self.window_best[0])
+                self.window_best[0] = np.inf
+                if stalled:
+                    return STATUS_STALLED
+
+        return 0
+
+
+
+register_stages(DivergenceMonitor, {"check": "divergence_check", "check_single": "divergence_check"})  # см. common/PRIM_profiling.py
@@ -0,0 +1,226 @@
+"""
+Запасной портфель стратегий для трудных пар (start, goal).
+
+Метод Ньютона из нулевого приближения (k1 = k2 = log_length = 0, то есть прямой отрезок единичной длины) не сходится для
+целей сбоку и позади start - это красные секторы на картах достижимости. FallbackSolver сначала делает обычную попытку, а если
+она неудачна, запускает портфель запасных попыток:
+    "arc" - начальное приближение по дуге окружности, касающейся направления в start и проходящей через goal
+            (постоянная кривизна k1 = k2 и длина дуги; на сетке run_grid_experiment.py решает все задачи, на которых
+            не сошлась попытка из нулей),
+    "chord" - прямая длины, равной евклидову расстоянию между start и goal,
+    "long_arc" - та же дуга, но с вдвое большей длиной (для целей, куда проще прийти с разворотом),
+    "homotopy" - гомотопия: сначала решается лёгкая задача (goal с тем углом направления, с которым в него приходит дуга),
+                 затем угол и кривизна в goal за homotopy_steps шагов плавно переводятся в настоящие, и каждая задача
+                 решается из решения предыдущей,
+    "winding" - та же цель с углом goal.theta + 2pi и goal.theta - 2pi (то же положение, но с лишним оборотом; у найденной
+                траектории goal.theta отличается от запрошенного на 2pi, геометрически это то же состояние).
+Запасные попытки (workers > 0) выполняются параллельно в пуле процессов, и первая успешная отменяет остальные (через
+SolveBudget.cancel, см. divergence.py). Заведомо безнадёжные попытки обрываются признаками из divergence.py, поэтому
+портфель стоит немногим больше одной удачной попытки.
+"""
+
+import numpy as np
+import copy
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Optional
+import sys
+sys.path.append("../common/")
+from PRIM_structs import *
+from trajectory_optimization import optimization_Newton
+from divergence import SolveBudget
+
+
+
+FALLBACK_STRATEGIES = ("arc", "chord", "long_arc", "homotopy", "winding")
+
+
+
+def arc_seed(start: State, goal: State):
+    """
+    Дуга окружности, касающаяся направления движения в start и проходящая через положение goal.
+    Возвращает тройку (length, k, theta) - длина дуги, её кривизна и угол направления в конце, или None, если goal совпадает со start.
+    """
+
+    dx, dy = goal.x - start.x, goal.y - start.y
+    chord = np.hypot(dx, dy)
+    if chord < 1e-9:
+        return None
+    phi = (np.arctan2(dy, dx) - start.theta + np.pi) % (2 * np.pi) - np.pi  # угол между направлением в start и хордой
+    if abs(phi) < 1e-9:
+        return chord, 0.0, start.theta
+    length = chord * phi / np.sin(phi) if abs(phi) < np.pi - 1e-3 else np.pi * chord  # дуга опирается на хорду под углом 2 phi
+    return length, 2 * phi / length, start.theta + 2 * phi
+
+
+
+def portfolio_attempts(start: State, goal: State, strategies=FALLBACK_STRATEGIES, homotopy_steps: int = 8) -> list:
+    """
+    Запасные попытки для пары (start, goal): список троек (strategy, goals, init_params), где goals - последовательность
+    целей, решаемых по очереди (каждая из решения предыдущей), init_params - начальное приближение для первой из них.
+    """
+
+    arc = arc_seed(start, goal)
+    attempts = []
+    for strategy in strategies:
+        assert strategy in FALLBACK_STRATEGIES, f"Неизвестная стратегия: {strategy}!"
+        if strategy == "winding":
+            init = [0.0, 0.0, 0.0] if arc is None else [arc[1], arc[1], np.log(arc[0])]
+            for turn in (2 * np.pi, -2 * np.pi):
+                attempts.append((strategy, [State(goal.x, goal.y, goal.theta + turn, goal.k)], init))
+            continue
+        if arc is None:  # цель в той же точке: дуги и хорды нет, остаётся только winding
+            continue
+        length, k, theta = arc
+        if strategy == "arc":
+            attempts.append((strategy, [goal], [k, k, np.log(length)]))
+        elif strategy == "chord":
+            attempts.append((strategy, [goal], [0.0, 0.0, np.log(np.hypot(goal.x - start.x, goal.y - start.y))]))
+        elif strategy == "long_arc":
+            attempts.append((strategy, [goal], [k, k, np.log(2 * length)]))
+        elif strategy == "homotopy":
+            taus = np.linspace(0.0, 1.0, homotopy_steps + 1)[1:]
+            goals = [State(goal.x, goal.y, theta + (goal.theta - theta) * tau, goal.k * tau) for tau in taus]
+            attempts.append((strategy, goals, [k, k, np.log(length)]))
+    return attempts
+
+
+
+def run_attempt(solver, start: State, attempt, solver_kwargs: dict) -> SolveResult:
+    """
+    Выполняет одну попытку портфеля. Возвращает результат решения последней цели последовательности со счётчиками работы,
+    просуммированными по всей последовательности.
+    """
+
+    strategy, goals, params = attempt
+    t_start = time.perf_counter()
+    iterations, integrations, jacobian_builds = 0, 0, 0
+    for goal in goals:
+        result = solver(start, goal, init_params=params, **solver_kwargs)
+        iterations += result.iterations
+        integrations += result.integrations
+        jacobian_builds += result.jacobian_builds
+        if not result.converged:
+            break
+        params = result.params
+    return SolveResult(result.status, result.traj, result.params, iterations, result.residual_history,
+                       time.perf_counter() - t_start, integrations, jacobian_builds, strategy)
+
+
+
+_current_job = None  # в процессе пула: номер задачи, которую сейчас решает FallbackSolver (общий для всех процессов)
+
+
+def _init_worker(current_job) -> None:
+    global _current_job
+    _current_job = current_job
+
+
+class _JobCancelled:
+    """
+    Признак отмены для SolveBudget.cancel: попытки задачи job отменяются, как только FallbackSolver перешёл к другому номеру,
+    а также по исходному признаку отмены бюджета outer (если он был задан).
+    """
+
+    def __init__(self, job: int, outer = None) -> None:
+        self.job = job
+        self.outer = outer
+
+    def is_set(self) -> bool:
+        return _current_job.value != self.job or (self.outer is not None and self.outer.is_set())
+
+
+def _run_pooled_attempt(solver, start: State, attempt, solver_kwargs: dict, job: int) -> SolveResult:
+    budget = copy.copy(solver_kwargs["budget"])  # не меняем бюджет вызывающего: к его признаку отмены добавляется свой
+    budget.cancel = _JobCancelled(job, budget.cancel)
+    return run_attempt(solver, start, attempt, dict(solver_kwargs, budget=budget))
+
+
+
+class FallbackSolver:
+    """
+    Генерация примитива с запасным портфелем стратегий. Вызывается как обычный решатель: solver(start, goal, **kwargs) -> SolveResult,
+    поэтому его можно передать в PrimitiveCache и continuation_solve.
+
+        strategies: стратегии портфеля (подмножество FALLBACK_STRATEGIES; порядок важен при последовательном выполнении),
+        workers: число процессов для параллельных запасных попыток (0 - выполнять их по очереди в текущем процессе),
+        homotopy_steps: число шагов гомотопии,
+        solver: функция генерации примитива с параметрами init_params и budget (как optimization_Newton),
+        budget: признаки досрочной остановки для всех попыток (SolveBudget; None - SolveBudget() с настройками
+                по умолчанию, свой для каждого FallbackSolver; без признаков остановки портфель оплачивает полный лимит
+                итераций каждой неудачной попытки),
+        solver_kwargs: остальные параметры solver (iters, lr, eps, ...).
+
+    У результата strategy - имя стратегии, нашедшей решение (None, если сошлась первая обычная попытка), а счётчики
+    iterations, integrations, jacobian_builds - суммарная работа всех попыток (wall_time - время всего решения).
+    """
+
+    def __init__(self, strategies=FALLBACK_STRATEGIES, workers: int = 0, homotopy_steps: int = 8, solver=optimization_Newton,
+                 budget: Optional[SolveBudget] = None, **solver_kwargs) -> None:
+        self.strategies = tuple(strategies)
+        self.homotopy_steps = homotopy_steps
+        self.solver = solver
+        self.budget = SolveBudget() if budget is None else budget
+        self.solver_kwargs = solver_kwargs
+        self.workers = workers
+        self._executor = None
+        if workers > 0:
+            self._current_job = multiprocessing.RawValue("q", 0)
+            self._executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(self._current_job,))
+
+
+    def __call__(self, start: State, goal: State, **overrides) -> SolveResult:
+        t_start = time.perf_counter()
+        kwargs = {"budget": self.budget, **self.solver_kwargs, **overrides}
+        first = self.solver(start, goal, **kwargs)  # обычная попытка (с init_params, если его передали)
+        if first.converged:
+            return first
+
+        kwargs.pop("init_params", None)
+        attempts = portfolio_attempts(start, goal, self.strategies, self.homotopy_steps)
+        if self._executor is None:
+            results = []
+            for attempt in attempts:
+                results.append(run_attempt(self.solver, start, attempt, kwargs))
+                if results[-1].converged:
+                    break
+        else:
+            results = self._run_parallel(start, attempts, kwargs)
+
+        winner = next((result for result in results if result.converged), first)
+        results.append(first)
+        return SolveResult(winner.status, winner.traj, winner.params, sum(result.iterations for result in results),
+                           winner.residual_history, time.perf_counter() - t_start,
+                           sum(result.integrations for result in results), sum(result.jacobian_builds for result in results),
+                           winner.strategy)
+
+
+    def _run_parallel(self, start: State, attempts: list, kwargs: dict) -> list:
+        job = self._current_job.value
+        if kwargs["budget"] is None:  # отмена работает через бюджет, поэтому он нужен всегда (здесь - без признаков остановки)
+            kwargs = dict(kwargs, budget=SolveBudget(window=None, max_length_ratio=None, max_condition=None))
+        pending = {self._executor.submit(_run_pooled_attempt, self.solver, start, attempt, kwargs, job) for attempt in attempts}
+        results = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            results.extend(future.result() for future in done if not future.cancelled())
+            if any(result.converged for result in results):
+                self._current_job.value = job + 1  # отменяем остальные попытки: начатые остановятся на ближайшей итерации,
+                for future in pending:             # а ещё не начатые не запустятся вовсе
+                    future.cancel()
+        self._current_job.value = job + 1
+        return results
+
+
+    def close(self) -> None:
+        """ Останавливает пул процессов. """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> "FallbackSolver":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,475 @@
+"""
+Ускоренный (компилируемый) вариант метода Ньютона с точной матрицей Якоби для генерации примитивов.
+
+Даже с квадратурой Гаусса-Лежандра и точной матрицей Якоби (см. trajectory_optimization.py) одна итерация метода Ньютона -
+это десятки вызовов NumPy на массивах из трёх чисел и десятков узлов, а накладные расходы интерпретатора на каждый вызов
+больше самих вычислений. Поэтому решение одной задачи занимает миллисекунды, а для запроса примитива на лету (например,
+из планировщика) нужно уложиться в доли миллисекунды.
+
+Здесь те же вычисления записаны скалярными циклами, которые компилирует Numba (если он установлен):
+    подынтегральная функция и квадратура фиксированного порядка - моменты интегралов от cos и sin угла направления
+        за один проход по узлам (как moments_batch),
+    невязка и точная матрица Якоби по параметрам k1, k2, log_length (как calc_residual_and_Jacobian_batch),
+    весь цикл метода Ньютона с шагом "fixed" для одной задачи и для набора задач (как optimization_Newton_batch
+        с jacobian="exact"; задачи набора решаются параллельно).
+Если Numba не установлен, те же функции модуля выполняются векторизованным путём на NumPy из trajectory_optimization.py
+(результаты совпадают с точностью до округлений). Цель в доли миллисекунды на задачу достижима только с Numba: без него
+solve - это optimization_Newton с jacobian="exact", порядка 20 мс на задачу (см. python fast_newton.py и "fast_solve"
+в experiments/benchmark.py).
+
+Способ вычислений (движок) выбирается во время работы: set_backend("numba" | "numpy" | "auto") или временно - контекстным
+менеджером use_backend. По умолчанию используется Numba, если он доступен. Скомпилированные функции работают только
+с квадратурами фиксированного порядка без оценки ошибки (GaussLegendreIntegrator, SimpsonIntegrator с tol=None); с другими
+движками интегрирования (например, эталонным QuadIntegrator) вычисления идут через NumPy. Первый вызов скомпилированной
+функции включает компиляцию (кэшируется на диске), её можно сделать заранее функцией warm_up.
+
+Совпадение скомпилированного движка с эталонными функциями проверяет check_equivalence (или запуск python fast_newton.py);
+движок "numpy" и есть эталонные функции, поэтому для него check_equivalence отказывается работать. Сами компилируемые
+функции (без Numba - как обычные python-функции) сравнивает с эталоном check_kernels.
+"""
+
+import numpy as np
+import math
+import time
+import argparse
+from contextlib import contextmanager
+from typing import Optional
+import sys
+sys.path.append("../common/")
+from PRIM_structs import *
+from PRIM_profiling import register_stages
+import trajectory_optimization
+from trajectory_optimization import optimization_Newton, optimization_Newton_batch, calc_residual_and_Jacobian_batch, verify_converged
+
+try:
+    import numba
+except ImportError:  # Numba не обязателен: без него используется движок "numpy"
+    numba = None
+
+
+
+HAVE_NUMBA = numba is not None
+BACKENDS = ("numba", "numpy")
+
+_backend = "numba" if HAVE_NUMBA else "numpy"
+
+
+def set_backend(name: str) -> None:
+    """ Выбирает движок: "numba", "numpy" или "auto" (Numba, если он установлен, иначе NumPy). """
+
+    global _backend
+    if name == "auto":
+        name = "numba" if HAVE_NUMBA else "numpy"
+    assert name in BACKENDS, f"Неизвестный движок: {name}!"
+    assert name != "numba" or HAVE_NUMBA, "Numba не установлен!"
+    _backend = name
+
+
+def get_backend() -> str:
+    return _backend
+
+
+@contextmanager
+def use_backend(name: str):
+    """ Контекстный менеджер: движок name на время блока. """
+
+    previous = _backend
+    set_backend(name)
+    try:
+        yield
+    finally:
+        set_backend(previous)
+
+
+
+"""
+Компилируемые функции. Без Numba декоратор ничего не делает: функции остаются обычными (очень медленными) python-функциями
+и через движок "numpy" не вызываются.
+"""
+
+
+def _compiled(parallel: bool = False):
+    def decorate(function):
+        if numba is None:
+            return function
+        return numba.njit(cache=True, parallel=parallel, error_model="numpy")(function)  # деление на 0 даёт inf, как в NumPy
+    return decorate
+
+
+_prange = numba.prange if HAVE_NUMBA else range
+
+_M = np.ascontiguousarray(CURVE_TO_COEF_MATRIX)
+_LSTSQ_RCOND = 3 * np.finfo(np.float64).eps  # как rcond=None у np.linalg.lstsq для матрицы 3 на 3
+
+
+@_compiled()
+def _segments_for(c1, c2, c3, c4, length, segments, max_segments, max_phase):
+    # число отрезков составной квадратуры - как FixedQuadratureIntegrator.segments_for (max_phase <= 0 - не сгущать)
+    if max_phase <= 0:
+        return segments
+    limit = max(max_segments, segments)
+    k_max = 0.0
+    for p in range(9):  # те же точки, что FixedQuadratureIntegrator.PHASE_PROBES
+        u = length * (p / 8)
+        k_max = max(k_max, abs(c1 + u * (2 * c2 + u * (3 * c3 + u * 4 * c4))))
+    phase = length * k_max / max_phase / segments
+    if math.isinf(phase):
+        return limit
+    result = segments
+    while result < segments * phase and result < limit:
+        result *= 2
+    return min(result, limit)
+
+
+@_compiled()
+def _residual_and_jacobian(start, goal, params, rule, residual, J):
+    # невязка (3,) и точная матрица Якоби (3, 3) одной задачи (записываются в residual и J); False - недопустимые параметры.
+    # rule - базовая квадратура и параметры разбиения (см. _compiled_rule)
+    nodes, weights, base_segments, max_segments, max_phase = rule
+    k0, kf = start[3], goal[3]
+    length = np.exp(params[2])
+    a = (_M[1, 0] * k0 + _M[1, 1] * params[0] + _M[1, 2] * params[1] + _M[1, 3] * kf) / length
+    b = (_M[2, 0] * k0 + _M[2, 1] * params[0] + _M[2, 2] * params[1] + _M[2, 3] * kf) / length ** 2
+    c = (_M[3, 0] * k0 + _M[3, 1] * params[0] + _M[3, 2] * params[1] + _M[3, 3] * kf) / length ** 3
+    if not (math.isfinite(length) and math.isfinite(a) and math.isfinite(b) and math.isfinite(c)):
+        return False
+    c0, c1, c2, c3, c4 = start[2], k0, a / 2, b / 3, c / 4  # коэффициенты полинома угла направления
+
+    # квадратура: моменты int_0^L u^m cos(theta(u)) du и int_0^L u^m sin(theta(u)) du для m = 0, 2, 3, 4
+    mc0, mc2, mc3, mc4 = 0.0, 0.0, 0.0, 0.0
+    ms0, ms2, ms3, ms4 = 0.0, 0.0, 0.0, 0.0
+    segments = _segments_for(c1, c2, c3, c4, length, base_segments, max_segments, max_phase)
+    for g in range(segments):
+        for i in range(nodes.shape[0]):
+            u = length * (g + nodes[i]) / segments
+            theta = c0 + u * (c1 + u * (c2 + u * (c3 + u * c4)))
+            wc, ws = weights[i] * math.cos(theta), weights[i] * math.sin(theta)
+            u2 = u * u
+            u3 = u2 * u
+            u4 = u3 * u
+            mc0 += wc
+            mc2 += wc * u2
+            mc3 += wc * u3
+            mc4 += wc * u4
+            ms0 += ws
+            ms2 += ws * u2
+            ms3 += ws * u3
+            ms4 += ws * u4
+    scale = length / segments
+    mc0, mc2, mc3, mc4 = mc0 * scale, mc2 * scale, mc3 * scale, mc4 * scale
+    ms0, ms2, ms3, ms4 = ms0 * scale, ms2 * scale, ms3 * scale, ms4 * scale
+
+    theta_f = c0 + length * (c1 + length * (c2 + length * (c3 + length * c4)))
+    residual[0] = goal[0] - (start[0] + mc0)
+    residual[1] = goal[1] - (start[1] + ms0)
+    residual[2] = goal[2] - theta_f
+
+    # производные конечных x, y, theta по (a, b, c) и производные (a, b, c) по (k1, k2, log_length) - как в
+    # calc_residual_and_Jacobian_batch
+    L2 = length * length
+    L3 = L2 * length
+    d_final = ((-ms2 / 2, -ms3 / 3, -ms4 / 4),
+               (mc2 / 2, mc3 / 3, mc4 / 4),
+               (L2 / 2, L3 / 3, L2 * L2 / 4))
+    d_coef = ((_M[1, 1] / length, _M[1, 2] / length, -a),
+              (_M[2, 1] / L2, _M[2, 2] / L2, -2 * b),
+              (_M[3, 1] / L3, _M[3, 2] / L3, -3 * c))
+    end = (math.cos(theta_f), math.sin(theta_f), kf)
+    finite = True
+    for r in range(3):
+        for q in range(3):
+            value = d_final[r][0] * d_coef[0][q] + d_final[r][1] * d_coef[1][q] + d_final[r][2] * d_coef[2][q]
+            if q == 2:
+                value += length * end[r]  # L - верхний предел, dL/dlog_length = L
+            J[r, q] = -value  # невязка = goal - final
+            finite = finite and math.isfinite(value)
+        finite = finite and math.isfinite(residual[r])
+    return finite
+
+
+@_compiled(parallel=True)
+def _residual_and_jacobian_many(starts, goals, params, rule, residual, J):
+    for n in _prange(params.shape[0]):
+        if not _residual_and_jacobian(starts[n], goals[n], params[n], rule, residual[n], J[n]):
+            residual[n, :] = np.nan
+            J[n, :, :] = np.nan
+
+
+@_compiled()
+def _solve_one(start, goal, params, rule, iters, eps, lr, history):
+    # метод Ньютона с шагом "fixed" для одной задачи (params обновляются на месте); возвращает статус и число итераций.
+    # В history (если её длины хватает) пишутся нормы невязки.
+    residual = np.empty(3)
+    J = np.empty((3, 3))
+    singular = False  # была ли матрица Якоби вырождена на последнем шаге
+    for i in range(iters):
+        if not _residual_and_jacobian(start, goal, params, rule, residual, J):
+            return STATUS_DIVERGED, i + 1
+        norm = math.sqrt(residual[0] ** 2 + residual[1] ** 2 + residual[2] ** 2)
+        if i < history.shape[0]:
+            history[i] = norm
+
+        # шаг Ньютона: решение системы 3 на 3 J @ d = residual по правилу Крамера
+        m00 = J[1, 1] * J[2, 2] - J[1, 2] * J[2, 1]
+        m01 = J[1, 0] * J[2, 2] - J[1, 2] * J[2, 0]
+        m02 = J[1, 0] * J[2, 1] - J[1, 1] * J[2, 0]
+        det = J[0, 0] * m00 - J[0, 1] * m01 + J[0, 2] * m02
+        singular = abs(det) <= 1e-300
+        if singular:  # как newton_direction: решение наименьшей нормы методом наименьших квадратов
+            d0, d1, d2 = np.linalg.lstsq(J, residual, _LSTSQ_RCOND)[0]
+        else:
+            r0, r1, r2 = residual[0], residual[1], residual[2]
+            d0 = (r0 * m00 - J[0, 1] * (r1 * J[2, 2] - J[1, 2] * r2) + J[0, 2] * (r1 * J[2, 1] - J[1, 1] * r2)) / det
+            d1 = (J[0, 0] * (r1 * J[2, 2] - J[1, 2] * r2) - r0 * m01 + J[0, 2] * (J[1, 0] * r2 - r1 * J[2, 0])) / det
+            d2 = (J[0, 0] * (J[1, 1] * r2 - r1 * J[2, 1]) - J[0, 1] * (J[1, 0] * r2 - r1 * J[2, 0]) + r0 * m02) / det
+        params[0] -= lr * d0
+        params[1] -= lr * d1
+        params[2] -= lr * d2
+
+        if norm <= eps:
+            return STATUS_CONVERGED, i + 1
+    return (STATUS_SINGULAR if singular else STATUS_MAX_ITER), iters
+
+
+@_compiled(parallel=True)
+def _solve_many(starts, goals, params, rule, iters, eps, lr, status, steps):
+    no_history = np.empty(0)
+    for n in _prange(starts.shape[0]):
+        code, count = _solve_one(starts[n], goals[n], params[n], rule, iters, eps, lr, no_history)
+        status[n] = code
+        steps[n] = count
+
+
+
+"""
+Функции модуля: выбирают движок и квадратуру, готовят массивы и вызывают скомпилированные функции или их аналоги на NumPy.
+"""
+
+
+def _compiled_rule(integrator):
+    # квадратура для скомпилированных функций: узлы и веса одного отрезка, базовое и предельное число отрезков и допустимое
+    # изменение угла на отрезке (None - этот движок интегрирования они не поддерживают или выбран движок "numpy")
+    if _backend != "numba":
+        return None
+    return _kernel_rule(integrator)
+
+
+def _kernel_rule(integrator):
+    integrator = DEFAULT_INTEGRATOR if integrator is None else integrator
+    if not isinstance(integrator, FixedQuadratureIntegrator) or integrator.tol is not None:
+        return None
+    nodes, weights = integrator.nodes(1)
+    max_phase = -1.0 if integrator.max_phase is None else float(integrator.max_phase)
+    return (np.ascontiguousarray(nodes, dtype=float), np.ascontiguousarray(weights, dtype=float),
+            int(integrator.segments), int(integrator.max_segments), max_phase)
+
+
+def residual_and_jacobian_batch(starts: np.ndarray, goals: np.ndarray, params: np.ndarray, integrator = None):
+    """
+    То же, что calc_residual_and_Jacobian_batch: невязки (N, 3) и точные матрицы Якоби (N, 3, 3) для N траекторий
+    (для недопустимых параметров - нечисловые значения), но выбранным движком.
+    """
+
+    rule = _compiled_rule(integrator)
+    if rule is None:
+        return calc_residual_and_Jacobian_batch(starts, goals, params, integrator)
+    starts, goals = np.ascontiguousarray(starts, dtype=float), np.ascontiguousarray(goals, dtype=float)
+    params = np.ascontiguousarray(params, dtype=float).reshape(-1, 3)
+    residual, J = np.empty((len(params), 3)), np.empty((len(params), 3, 3))
+    _residual_and_jacobian_many(starts, goals, params, rule, residual, J)
+    return residual, J
+
+
+def solve(start: State, goal: State, iters: int = 2000, eps: float = 1e-2, lr: float = 0.03, integrator = None,
+          init_params = None) -> SolveResult:
+    """
+    Генерация одного примитива: то же, что optimization_Newton(start, goal, iters, eps, lr, integrator=integrator,
+    jacobian="exact", init_params=init_params) (шаг "fixed"), но выбранным движком. Возвращает SolveResult.
+    """
+
+    rule = _compiled_rule(integrator)
+    if rule is None:
+        return optimization_Newton(start, goal, iters, eps, lr, integrator=integrator, jacobian="exact", init_params=init_params)
+
+    t_start = time.perf_counter()
+    if init_params is None and trajectory_optimization.SEED_TABLE is not None:
+        init_params = trajectory_optimization.SEED_TABLE.lookup(start, goal)
+    params = np.zeros(3) if init_params is None else np.array(init_params, dtype=float).reshape(3)
+    history = np.empty(iters)
+    start_row, goal_row = states_to_array([start]), states_to_array([goal])
+    status, steps = _solve_one(start_row[0], goal_row[0], params, rule, iters, eps, lr, history)
+    history = history[:steps] if status != STATUS_DIVERGED else history[:steps - 1]
+
+    found = None
+    if status == STATUS_CONVERGED:
+        try:
+            found = ShortTrajectory(start, goal, integrator).set_curve_params(*params)
+        except AssertionError:  # последний шаг увёл параметры в недопустимую область
+            status = STATUS_DIVERGED
+    if status == STATUS_CONVERGED and not verify_converged(start_row, goal_row, params.reshape(1, 3), eps)[0]:
+        status, found = STATUS_INACCURATE, None
+    return SolveResult(int(status), found, params, int(steps), history.tolist(), time.perf_counter() - t_start,
+                       int(steps), int(steps))
+
+
+def _mark_inaccurate(status, starts, goals, params, eps) -> None:
+    # проверка сошедшихся решений квадратурой с контролем точности (как в optimization_Newton_batch)
+    done = np.flatnonzero(status == STATUS_CONVERGED)
+    status[done[~verify_converged(starts[done], goals[done], params[done], eps)]] = STATUS_INACCURATE
+
+
+def solve_batch(starts, goals, iters: int = 2000, eps: float = 1e-2, lr: float = 0.03, integrator = None,
+                init_params = None, return_status: bool = False):
+    """
+    Генерация набора примитивов: то же, что optimization_Newton_batch(..., jacobian="exact"), но выбранным движком
+    (задачи решаются параллельно на всех ядрах). Возвращает тройку success (или status), steps, params.
+    """
+
+    rule = _compiled_rule(integrator)
+    if rule is None:
+        return optimization_Newton_batch(starts, goals, iters, eps, lr, integrator, "exact", init_params,
+                                         return_status=return_status)
+
+    starts, goals = states_to_array(starts), states_to_array(goals)
+    assert len(starts) == len(goals), "Число начальных и целевых состояний должно совпадать!"
+    n = len(starts)
+    if init_params is None and trajectory_optimization.SEED_TABLE is not None:
+        init_params = trajectory_optimization.SEED_TABLE.lookup_batch(starts, goals)[0]
+    params = np.zeros((n, 3)) if init_params is None else np.array(init_params, dtype=float).reshape(n, 3)
+    status, steps = np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)
+    _solve_many(np.ascontiguousarray(starts), np.ascontiguousarray(goals), params, rule, iters, eps, lr, status, steps)
+    _mark_inaccurate(status, starts, goals, params, eps)
+    return (status if return_status else status == STATUS_CONVERGED), steps, params
+
+
+def warm_up() -> None:
+    """ Компилирует функции выбранного движка заранее (чтобы первый запрос на лету не ждал компиляции). """
+
+    start, goal = State(0.0, 0.0, 0.0, 0.0), State(2.0, 0.5, 0.3, 0.0)
+    solve(start, goal, iters=5)
+    solve_batch([start, start], [goal, goal], iters=5)
+    residual_and_jacobian_batch(states_to_array([start]), states_to_array([goal]), np.zeros((1, 3)))
+
+
+
+def _random_problems(count: int, seed: int):
+    # случайные задачи в духе run_experiment.py (часть из них не решается - так проверяются и исходы неудач)
+    rng = np.random.default_rng(seed)
+    starts = np.column_stack([np.zeros(count), np.zeros(count), np.zeros(count), rng.uniform(-0.2, 0.2, count)])
+    goals = np.column_stack([rng.uniform(-2.0, 8.0, count), rng.uniform(-6.0, 6.0, count),
+                             rng.uniform(-np.pi, np.pi, count), rng.uniform(-0.2, 0.2, count)])
+    params = np.column_stack([rng.normal(0.0, 0.3, (count, 2)), rng.uniform(0.0, 2.0, count)])
+    return starts, goals, params
+
+
+def _discrepancies(starts, goals, params, iters, eps, lr, residual, J, status, steps, found, singles) -> dict:
+    # наибольшие расхождения с эталонными функциями trajectory_optimization.py; singles - пары (статус, параметры) решений
+    # первых len(singles) задач по одной
+    ref_residual, ref_J = calc_residual_and_Jacobian_batch(starts, goals, params)
+    ref_status, ref_steps, ref_found = optimization_Newton_batch(starts, goals, iters, eps, lr, jacobian="exact",
+                                                                 init_params=params, return_status=True)
+    ref_singles = [optimization_Newton(State(*s), State(*g), iters, eps, lr, jacobian="exact", init_params=p)
+                   for s, g, p in zip(starts[:len(singles)], goals[:len(singles)], params[:len(singles)])]
+
+    same = (status == ref_status) & (status == STATUS_CONVERGED)
+    return {
+        "residual": float(np.nanmax(np.abs(residual - ref_residual))),
+        "jacobian": float(np.nanmax(np.abs(J - ref_J) / np.maximum(np.abs(ref_J), 1.0))),
+        "params": float(np.max(np.abs(found[same] - ref_found[same]), initial=0.0)),
+        "status_mismatches": int(np.sum(status != ref_status)),
+        "steps_mismatches": int(np.sum(steps != ref_steps)),
+        "single_status_mismatches": sum(int(code != q.status) for (code, _), q in zip(singles, ref_singles)),
+        "single_params": max((float(np.max(np.abs(p - q.params))) for (code, p), q in zip(singles, ref_singles)
+                              if code == STATUS_CONVERGED and q.converged), default=0.0),
+    }
+
+
+def check_equivalence(count: int = 200, seed: int = 0, backend: Optional[str] = None, iters: int = 300,
+                      eps: float = 1e-2, lr: float = 0.1) -> dict:
+    """
+    Сравнивает скомпилированный движок (backend - "numba" или None - текущий) с эталонными функциями
+    trajectory_optimization.py на count случайных задачах: невязки и матрицы Якоби в случайных точках (с
+    calc_residual_and_Jacobian_batch), решения набора задач (с optimization_Newton_batch с jacobian="exact") и решения
+    по одной (с optimization_Newton). Возвращает словарь наибольших расхождений; "status_mismatches" и "steps_mismatches" -
+    число задач с разным исходом или числом итераций. Движок "numpy" вызывает сами эталонные функции, и сравнение было бы
+    тавтологией - для него (в том числе когда "auto" выбирает его без Numba) бросается ValueError.
+    """
+
+    name = backend or _backend
+    if name == "auto":
+        name = "numba" if HAVE_NUMBA else "numpy"
+    if name != "numba":
+        raise ValueError(f"Движок '{name}' - это сами эталонные функции, сравнивать не с чем! "
+                         f"Компилируемые функции без Numba проверяет check_kernels.")
+
+    starts, goals, params = _random_problems(count, seed)
+    with use_backend(name):
+        residual, J = residual_and_jacobian_batch(starts, goals, params)
+        status, steps, found = solve_batch(starts, goals, iters, eps, lr, init_params=params, return_status=True)
+        singles = [solve(State(*s), State(*g), iters, eps, lr, init_params=p)
+                   for s, g, p in zip(starts[:20], goals[:20], params[:20])]
+    return _discrepancies(starts, goals, params, iters, eps, lr, residual, J, status, steps, found,
+                          [(r.status, r.params) for r in singles])
+
+
+def check_kernels(count: int = 20, seed: int = 0, iters: int = 300, eps: float = 1e-2, lr: float = 0.1,
+                  problems: Optional[tuple] = None) -> dict:
+    """
+    То же сравнение, что check_equivalence, но _residual_and_jacobian_many, _solve_many и _solve_one вызываются напрямую,
+    независимо от выбранного движка: с Numba - скомпилированные, без него - как обычные python-функции (медленно, поэтому
+    задач по умолчанию немного). problems - свои задачи (starts, goals, params) вместо случайных.
+    """
+
+    if problems is None:
+        problems = _random_problems(count, seed)
+    starts, goals, params = (np.ascontiguousarray(a, dtype=float) for a in problems)
+    rule, n = _kernel_rule(None), len(params)
+
+    residual, J = np.empty((n, 3)), np.empty((n, 3, 3))
+    found, status, steps = params.copy(), np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)
+    single_found, single_status = params.copy(), np.zeros(n, dtype=np.int64)
+    with np.errstate(all="ignore"):  # скомпилированные функции тоже молча дают inf и nan (error_model="numpy")
+        _residual_and_jacobian_many(starts, goals, params, rule, residual, J)
+        _solve_many(starts, goals, found, rule, iters, eps, lr, status, steps)
+        for k in range(n):
+            single_status[k], _ = _solve_one(starts[k], goals[k], single_found[k], rule, iters, eps, lr, np.empty(0))
+    _mark_inaccurate(status, starts, goals, found, eps)
+    _mark_inaccurate(single_status, starts, goals, single_found, eps)
+
+    return _discrepancies(starts, goals, params, iters, eps, lr, residual, J, status, steps, found,
+                          list(zip(single_status, single_found)))
+
+
+
+register_stages(sys.modules[__name__], {"residual_and_jacobian_batch": "jacobian"})  # см. common/PRIM_profiling.py
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка совпадения и замер скорости движков метода Ньютона.")
+    parser.add_argument("--backend", choices=["auto"] + list(BACKENDS), default="auto", help="Проверяемый движок.")
+    parser.add_argument("--count", type=int, default=200, help="Число случайных задач.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed случайных задач.")
+    args = parser.parse_args()
+
+    set_backend(args.backend)
+    print(f"движок: {get_backend()} (Numba {'установлен' if HAVE_NUMBA else 'не установлен'})")
+    warm_up()
+    if get_backend() == "numba":
+        check = check_equivalence(args.count, args.seed)
+    else:
+        print("движок numpy - это эталонные функции, цель в доли миллисекунды на задачу без Numba недостижима; "
+              "с эталоном сравниваются компилируемые функции как обычные python-функции (на 20 задачах)")
+        check = check_kernels(min(args.count, 20), args.seed)
+    for name, value in check.items():
+        print(f"{name:26s} {value:.3g}")
+
+    starts, goals, params = _random_problems(args.count, args.seed)
+    t_start = time.perf_counter()
+    results = [solve(State(*s), State(*g), 300, 1e-2, 0.1, init_params=p) for s, g, p in zip(starts, goals, params)]
+    single = (time.perf_counter() - t_start) / args.count
+    t_start = time.perf_counter()
+    solve_batch(starts, goals, 300, 1e-2, 0.1, init_params=params)
+    batch = (time.perf_counter() - t_start) / args.count
+    print(f"одна задача: {single * 1e6:.1f} мкс, в наборе: {batch * 1e6:.1f} мкс на задачу, "
+          f"сошлось {sum(r.converged for r in results)} из {args.count}")
@@ -0,0 +1,166 @@
+"""
+Стратегии шага многомерного метода Ньютона.
+
+В статье шаг делается с фиксированным коэффициентом обучения: params -= lr * inv(J) @ residual. Это слишком осторожно
+вблизи решения (где полный шаг Ньютона сходится квадратично) и слишком смело рядом с вырожденной матрицей Якоби.
+Здесь собраны выбираемые стратегии шага (параметр step в optimization_Newton и baseline_optimization_Newton):
+    "fixed" - как в статье: фиксированная доля lr шага Ньютона,
+    "line_search" - поиск с возвратом: начиная с полного шага, шаг уменьшается вдвое, пока норма невязки не уменьшится достаточно,
+    "lm" - метод Левенберга-Марквардта: шаг Ньютона "смягчается" демпфированием mu, которое уменьшается после удачных
+           шагов и увеличивается после неудачных,
+    "dogleg" - метод доверительной области (dogleg): комбинация шага Ньютона и шага наискорейшего спуска внутри области
+           радиуса radius, который подстраивается по отношению фактического и предсказанного уменьшения невязки.
+Стратегии с контролем убывания невязки сходятся за в разы меньшее число итераций, но монотонный спуск может застрять там,
+где из нулевого приближения нужно "накрутить" петлю, поэтому по умолчанию оставлен шаг "fixed" (такие цели лучше решать
+с хорошим начальным приближением, см. continuation.py).
+Вместо np.linalg.inv везде используется решение системы (np.linalg.solve), а при вырожденной матрице Якоби -
+решение методом наименьших квадратов (np.linalg.lstsq), поэтому вырожденность не обрывает поиск исключением.
+"""
+
+import numpy as np
+from typing import Callable
+import sys
+sys.path.append("../common/")
+from PRIM_profiling import register_stages
+
+
+
+STEP_STRATEGIES = ("fixed", "line_search", "lm", "dogleg")
+
+
+
+def newton_direction(J: np.ndarray, residual: np.ndarray, singular: list = None) -> np.ndarray:
+    """
+    Шаг Ньютона d: решение системы J @ d = residual (при вырожденной J - решение наименьшей нормы методом наименьших квадратов).
+        singular: если передан список, в него дописывается True, когда пришлось прибегнуть к методу наименьших квадратов.
+    """
+
+    try:
+        return np.linalg.solve(J, residual)
+    except np.linalg.LinAlgError:
+        if singular is not None:
+            singular.append(True)
+        return np.linalg.lstsq(J, residual, rcond=None)[0]
+
+
+
+def residual_norm(residual: np.ndarray) -> float:
+    norm = float(np.sum(residual ** 2) ** 0.5)
+    return norm if np.isfinite(norm) else np.inf
+
+
+
+class StepController:
+    """
+    Делает шаги метода Ньютона по выбранной стратегии, храня между итерациями её состояние (демпфирование, радиус).
+
+        strategy: одна из STEP_STRATEGIES,
+        residual_fn: функция, вычисляющая невязку по параметрам (нужна всем стратегиям, кроме "fixed"),
+        lr: коэффициент обучения для стратегии "fixed",
+        max_backtracks: наибольшее число уменьшений шага (или увеличений демпфирования) за одну итерацию.
+    """
+
+    def __init__(self, strategy: str, residual_fn: Callable = None, lr: float = 0.03, max_backtracks: int = 10,
+                 mu: float = 1e-3, radius: float = 1.0) -> None:
+        assert strategy in STEP_STRATEGIES, f"Неизвестная стратегия шага: {strategy}!"
+        assert strategy == "fixed" or residual_fn is not None, "Для этой стратегии нужна функция невязки!"
+        self.strategy = strategy
+        self.residual_fn = residual_fn
+        self.lr = lr
+        self.max_backtracks = max_backtracks
+        self.mu = mu          # демпфирование Левенберга-Марквардта
+        self.radius = radius  # радиус доверительной области
+        self.residual_evals = 0  # сколько дополнительных вычислений невязки понадобилось шагам
+        self.last_singular = False  # была ли матрица Якоби вырождена на последнем шаге
+
+
+    def _direction(self, A: np.ndarray, b: np.ndarray) -> np.ndarray:
+        singular = []
+        direction = newton_direction(A, b, singular)
+        self.last_singular = self.last_singular or bool(singular)
+        return direction
+
+
+    def _trial_norm(self, params: np.ndarray) -> float:
+        self.residual_evals += 1
+        try:
+            return residual_norm(self.residual_fn(params))
+        except AssertionError:  # пробная точка вне допустимой области (например, отрицательная длина) - считаем её худшей
+            return np.inf
+
+
+    def step(self, params: np.ndarray, residual: np.ndarray, J: np.ndarray) -> np.ndarray:
+        """
+        Возвращает новые параметры по текущим параметрам params, невязке residual и матрице Якоби J в них.
+        """
+
+        self.last_singular = False
+        if self.strategy == "fixed":
+            return params - self.lr * self._direction(J, residual)
+        if self.strategy == "line_search":
+            return self._line_search(params, residual, J)
+        if self.strategy == "lm":
+            return self._levenberg_marquardt(params, residual, J)
+        return self._dogleg(params, residual, J)
+
+
+    def _line_search(self, params, residual, J):
+        direction = self._direction(J, residual)
+        norm = residual_norm(residual)
+        alpha = 1.0
+        for _ in range(self.max_backtracks):
+            trial = params - alpha * direction
+            if self._trial_norm(trial) <= (1 - 1e-4 * alpha) * norm:  # условие достаточного убывания (Армихо)
+                return trial
+            alpha /= 2
+        return params - alpha * direction  # убывания не добились - делаем самый маленький шаг
+
+
+    def _levenberg_marquardt(self, params, residual, J):
+        norm = residual_norm(residual)
+        JtJ, Jtr = J.T @ J, J.T @ residual
+        damping = np.diag(np.diag(JtJ)) + 1e-12 * np.eye(len(params))  # масштабирование Марквардта
+        trial = params
+        for _ in range(self.max_backtracks):
+            trial = params - self._direction(JtJ + self.mu * damping, Jtr)
+            if self._trial_norm(trial) < norm:
+                self.mu = max(self.mu / 3, 1e-12)  # удачный шаг - ближе к шагу Ньютона
+                return trial
+            self.mu *= 4                           # неудачный - ближе к градиентному спуску
+        return trial
+
+
+    def _dogleg(self, params, residual, J):
+        norm = residual_norm(residual)
+        gradient = J.T @ residual  # градиент функции 0.5*||residual||^2 (шаг делается против него)
+        newton = self._direction(J, residual)
+        Jg = J @ gradient
+        cauchy = (gradient @ gradient) / max(Jg @ Jg, 1e-300) * gradient  # минимум квадратичной модели вдоль градиента
+
+        step = params
+        for _ in range(self.max_backtracks):
+            if np.linalg.norm(newton) <= self.radius:
+                d = newton
+            elif np.linalg.norm(cauchy) >= self.radius:
+                d = self.radius / max(np.linalg.norm(cauchy), 1e-300) * cauchy
+            else:  # точка на отрезке от шага Коши до шага Ньютона на границе области
+                diff = newton - cauchy
+                a, b, c = diff @ diff, 2 * cauchy @ diff, cauchy @ cauchy - self.radius ** 2
+                tau = (-b + np.sqrt(max(b * b - 4 * a * c, 0.0))) / (2 * a)
+                d = cauchy + tau * diff
+
+            predicted = norm ** 2 - np.sum((residual - J @ d) ** 2)  # уменьшение ||residual||^2 по линейной модели
+            step = params - d
+            actual = norm ** 2 - self._trial_norm(step) ** 2
+            rho = actual / predicted if predicted > 0 else -1.0
+            if rho < 0.25:
+                self.radius = max(np.linalg.norm(d) / 4, 1e-8)
+            elif rho > 0.75 and np.linalg.norm(d) >= 0.99 * self.radius:
+                self.radius *= 2
+            if rho > 0:
+                return step
+        return step
+
+
+
+register_stages(StepController, {"step": "newton_update"})  # стадия профилирования (см. common/PRIM_profiling.py)
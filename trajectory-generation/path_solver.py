@@ -0,0 +1,295 @@
+"""
+Совместная генерация цепочки кубических спиралей через последовательность путевых точек (waypoints).
+
+Раньше путь через точки P_0, ..., P_m строился m независимыми вызовами optimization_Newton, и кривизна в промежуточных
+точках задавалась заранее (обычно нулём), поэтому на стыках кривизна менялась как угодно резко. PathSolver решает все
+отрезки сразу: кривизны kappa_1, ..., kappa_{m-1} в промежуточных точках (и, если нужно, углы направления в них) - это
+общие свободные переменные соседних отрезков, а у каждого отрезка i свои параметры k1, k2, log_length (вторая
+параметризация, kappa_i и kappa_{i+1} - его кривизны на концах). Кривизна цепочки непрерывна по построению.
+
+Уравнения системы:
+    для каждого отрезка - невязка (x, y, theta) в его конце, как в get_residual (3m уравнений),
+    в каждой промежуточной точке - непрерывность производной кривизны k'(s) (m-1 уравнение),
+    если углы в промежуточных точках свободные - ещё и непрерывность второй производной k''(s) (ещё m-1 уравнение).
+Число уравнений равно числу неизвестных (лишние степени свободы закрываются гладкостью, как у сплайнов).
+
+Каждое уравнение зависит только от параметров своего отрезка и переменных в его концевых точках, поэтому матрица Якоби
+ленточная (блочно-ленточная при порядке переменных "точка 0, отрезок 0, точка 1, отрезок 1, ..."). Она собирается
+разреженной (scipy.sparse), а шаг Ньютона находится разреженным решателем - O(m) на итерацию вместо O(m^3).
+Невязки и производные всех отрезков считаются за один пакетный проход квадратуры (моменты, как в
+calc_residual_and_Jacobian_batch), так что одна итерация для пути из 50 точек занимает доли миллисекунды.
+"""
+
+import numpy as np
+import time
+import scipy.sparse
+import scipy.sparse.linalg
+from typing import List, Optional
+import sys
+sys.path.append("../common/")
+from PRIM_structs import *
+from newton_steps import residual_norm
+from trajectory_optimization import verify_converged
+
+
+
+# строки CURVE_TO_COEF_MATRIX: коэффициенты a, b, c траектории единичной длины через кривизны (k0, k1, k2, kf)
+_A_ROW, _B_ROW, _C_ROW = CURVE_TO_COEF_MATRIX[1], CURVE_TO_COEF_MATRIX[2], CURVE_TO_COEF_MATRIX[3]
+_DK_END_ROW = _A_ROW + 2 * _B_ROW + 3 * _C_ROW  # k'(L) * L через (k0, k1, k2, kf)
+_DDK_END_ROW = 2 * _B_ROW + 6 * _C_ROW          # k''(L) * L^2
+_DDK_START_ROW = 2 * _B_ROW                     # k''(0) * L^2 (k'(0) * L - это _A_ROW)
+
+
+
+class PathResult(SolveResult):
+    """
+    Результат PathSolver.solve: то же, что SolveResult, но вместо одной траектории traj - список отрезков segments
+    (ShortTrajectory, None, если решение не найдено) и путевые точки waypoints с найденными углами и кривизнами.
+    Распаковывается как пара: steps, segments = solver.solve(...).
+    """
+
+    __slots__ = ("segments", "waypoints")
+
+    def __init__(self, status: int, segments: Optional[List[ShortTrajectory]], waypoints: List[State], params: np.ndarray,
+                 iterations: int, residual_history: list, wall_time: float, integrations: int, jacobian_builds: int) -> None:
+        super().__init__(status, None, params, iterations, residual_history, wall_time, integrations, jacobian_builds)
+        self.segments = segments
+        self.waypoints = waypoints
+
+    def __iter__(self):
+        return iter((self.iterations, self.segments))
+
+
+
+class PathSolver:
+    """
+    Метод Ньютона для всей цепочки отрезков сразу.
+
+        free_headings: считать углы направления в промежуточных точках свободными (иначе берутся из путевых точек),
+        iters: наибольшее число итераций,
+        eps: норма невязки всей системы, при которой решение считается найденным,
+        max_backtracks: наибольшее число уменьшений шага вдвое, пока норма невязки не уменьшится (поиск с возвратом,
+                        как стратегия "line_search" в newton_steps.py),
+        integrator: движок интегрирования (None - DEFAULT_INTEGRATOR).
+    """
+
+    def __init__(self, free_headings: bool = False, iters: int = 50, eps: float = 1e-6, max_backtracks: int = 20,
+                 integrator = None) -> None:
+        self.free_headings = free_headings
+        self.iters = iters
+        self.eps = eps
+        self.max_backtracks = max_backtracks
+        self.integrator = DEFAULT_INTEGRATOR if integrator is None else integrator
+
+
+    def _layout(self, m: int) -> None:
+        # номера переменных и уравнений; -1 - величина не является переменной (задана путевой точкой)
+        free = np.zeros(m + 1, dtype=bool)
+        free[1:-1] = True
+        self.theta_var, self.kappa_var = np.full(m + 1, -1), np.full(m + 1, -1)
+        self.seg_var = np.zeros(m, dtype=int)
+        self.smooth_rows = 2 if self.free_headings else 1  # уравнений гладкости в промежуточной точке
+        self.seg_row, self.node_row = np.zeros(m, dtype=int), np.full(m + 1, -1)
+        n_vars, n_rows = 0, 0
+        for i in range(m + 1):
+            if free[i]:
+                if self.free_headings:
+                    self.theta_var[i], n_vars = n_vars, n_vars + 1
+                self.kappa_var[i], n_vars = n_vars, n_vars + 1
+                self.node_row[i], n_rows = n_rows, n_rows + self.smooth_rows
+            if i < m:
+                self.seg_var[i], n_vars = n_vars, n_vars + 3
+                self.seg_row[i], n_rows = n_rows, n_rows + 3
+        assert n_vars == n_rows
+        self.size = n_vars
+
+        # структура разреженной матрицы Якоби (не меняется между итерациями):
+        # отрезок i - строки (x, y, theta) на столбцы (theta_i, k0 = kappa_i, k1, k2, kf = kappa_{i+1}, log_length, theta_{i+1})
+        k = self.seg_var
+        self.seg_cols = np.stack([self.theta_var[:-1], self.kappa_var[:-1], k, k + 1, self.kappa_var[1:], k + 2,
+                                  self.theta_var[1:]], axis=1)
+        # промежуточная точка j - строки гладкости на столбцы (K левого отрезка, его log_length, K правого, его log_length)
+        left, right = k[:-1], k[1:]
+        self.node_cols = np.stack([self.kappa_var[:-2], left, left + 1, self.kappa_var[1:-1], left + 2,
+                                   self.kappa_var[1:-1], right, right + 1, self.kappa_var[2:], right + 2], axis=1)
+
+
+    def _unpack(self, x: np.ndarray, thetas: np.ndarray, kappas: np.ndarray):
+        thetas, kappas = thetas.copy(), kappas.copy()
+        free_theta, free_kappa = self.theta_var >= 0, self.kappa_var >= 0
+        thetas[free_theta] = x[self.theta_var[free_theta]]
+        kappas[free_kappa] = x[self.kappa_var[free_kappa]]
+        params = x[self.seg_var.reshape(-1, 1) + np.arange(3)]  # (m, 3): k1, k2, log_length
+        K = np.stack([kappas[:-1], params[:, 0], params[:, 1], kappas[1:]], axis=1)  # (m, 4): кривизны в 0, L/3, 2L/3, L
+        return thetas, kappas, params, K
+
+
+    def _system(self, x: np.ndarray, points: np.ndarray, thetas: np.ndarray, kappas: np.ndarray, jacobian: bool = True):
+        """ Невязка системы (size,) и (если jacobian) разреженная матрица Якоби в точке x. """
+
+        thetas, kappas, params, K = self._unpack(x, thetas, kappas)
+        m = len(params)
+        a, b, c, L = curve_to_coef_params(K[:, 0], K[:, 1], K[:, 2], K[:, 3], params[:, 2])
+        residual = np.zeros(self.size)
+        if not (np.all(np.isfinite(L)) and np.all(np.isfinite([a, b, c]))):
+            return np.full(self.size, np.nan), None
+
+        coefs = np.stack([thetas[:-1], K[:, 0], a/2, b/3, c/4], axis=1)
+        moments_cos, moments_sin = self.integrator.moments_batch(coefs, L)  # один проход квадратуры по всем отрезкам
+        theta_f = np.polynomial.polynomial.polyval(L, coefs.T, tensor=False)
+        final = np.stack([points[:-1, 0] + moments_cos[:, 0], points[:-1, 1] + moments_sin[:, 0], theta_f], axis=1)
+        residual[self.seg_row.reshape(-1, 1) + np.arange(3)] = np.stack([points[1:, 0], points[1:, 1], thetas[1:]], axis=1) - final
+
+        # гладкость в промежуточных точках: k'(L) левого отрезка = k'(0) правого (и то же для k'')
+        dk_end, dk_start = K @ _DK_END_ROW / L, K @ _A_ROW / L
+        ddk_end, ddk_start = K @ _DDK_END_ROW / L ** 2, K @ _DDK_START_ROW / L ** 2
+        inner = self.node_row[1:-1]
+        residual[inner] = dk_end[:-1] - dk_start[1:]
+        if self.free_headings:
+            residual[inner + 1] = ddk_end[:-1] - ddk_start[1:]
+        if not jacobian:
+            return residual, None
+
+        # производные конца отрезка по (a, b, c) и по переменным отрезка (см. calc_residual_and_Jacobian_batch)
+        degrees = np.array([2, 3, 4])
+        d_final_d_coef = np.stack([-moments_sin[:, degrees] / degrees, moments_cos[:, degrees] / degrees,
+                                   L.reshape(-1, 1) ** degrees / degrees], axis=1)               # (m, 3, 3)
+        inv_powers = L.reshape(-1, 1) ** -np.arange(1, 4)                                       # 1/L, 1/L^2, 1/L^3
+        d_coef_d_K = CURVE_TO_COEF_MATRIX[1:].T[None, :, :] * inv_powers[:, None, :]            # (m, 4, 3)
+        d_final_d_K = np.einsum("nij,nkj->nik", d_final_d_coef, d_coef_d_K)                     # (m, 3, 4)
+        d_final_d_K[:, :, 0] += np.stack([-moments_sin[:, 1], moments_cos[:, 1], L], axis=1)    # k0 входит в theta(s) и напрямую
+        d_final_d_log = d_final_d_coef @ (-np.arange(1, 4) * np.stack([a, b, c], axis=1))[:, :, None]
+        d_final_d_log = d_final_d_log[:, :, 0] + L.reshape(-1, 1) * np.stack([np.cos(theta_f), np.sin(theta_f), K[:, 3]], axis=1)
+        d_final_d_theta0 = np.stack([-moments_sin[:, 0], moments_cos[:, 0], np.ones(m)], axis=1)
+
+        seg_block = np.zeros((m, 3, 7))
+        seg_block[:, :, 0] = -d_final_d_theta0
+        seg_block[:, :, 1:5] = -d_final_d_K
+        seg_block[:, :, 5] = -d_final_d_log
+        seg_block[:, 2, 6] = 1.0  # невязка по углу зависит от угла в конечной точке
+
+        rows = [np.broadcast_to((self.seg_row.reshape(-1, 1) + np.arange(3))[:, :, None], seg_block.shape)]
+        cols = [np.broadcast_to(self.seg_cols[:, None, :], seg_block.shape)]
+        data = [seg_block]
+        if m > 1:
+            node_block = np.zeros((m - 1, self.smooth_rows, 10))
+            Ll, Lr = L[:-1, None], L[1:, None]
+            node_block[:, 0, 0:4] = _DK_END_ROW / Ll
+            node_block[:, 0, 4] = -dk_end[:-1]
+            node_block[:, 0, 5:9] = -_A_ROW / Lr
+            node_block[:, 0, 9] = dk_start[1:]
+            if self.free_headings:
+                node_block[:, 1, 0:4] = _DDK_END_ROW / Ll ** 2
+                node_block[:, 1, 4] = -2 * ddk_end[:-1]
+                node_block[:, 1, 5:9] = -_DDK_START_ROW / Lr ** 2
+                node_block[:, 1, 9] = 2 * ddk_start[1:]
+            rows.append(np.broadcast_to((inner.reshape(-1, 1) + np.arange(self.smooth_rows))[:, :, None], node_block.shape))
+            cols.append(np.broadcast_to(self.node_cols[:, None, :], node_block.shape))
+            data.append(node_block)
+
+        rows, cols, data = (np.concatenate([r.ravel() for r in arrays]) for arrays in (rows, cols, data))
+        keep = cols >= 0  # столбцы заданных (не свободных) величин отбрасываются
+        J = scipy.sparse.csr_matrix((data[keep], (rows[keep], cols[keep])), shape=(self.size, self.size))  # повторы складываются
+        return residual, J
+
+
+    def _initial_guess(self, points: np.ndarray, thetas: np.ndarray, kappas: np.ndarray) -> np.ndarray:
+        # начальное приближение: каждый отрезок - дуга окружности между своими углами направления
+        chord = np.diff(points[:, :2], axis=0)
+        dist = np.hypot(chord[:, 0], chord[:, 1])
+        turn = np.diff(thetas)
+        half = np.clip(np.abs(turn) / 2, 1e-9, np.pi / 2 - 1e-3)
+        length = dist * half / np.sin(half)  # длина дуги окружности с хордой dist и поворотом turn
+        mean_k = turn / length
+
+        x = np.zeros(self.size)
+        x[self.seg_var] = mean_k
+        x[self.seg_var + 1] = mean_k
+        x[self.seg_var + 2] = np.log(length)
+        inner = np.flatnonzero(self.kappa_var >= 0)
+        x[self.kappa_var[inner]] = (mean_k[inner - 1] + mean_k[inner]) / 2
+        if self.free_headings:
+            x[self.theta_var[inner]] = thetas[inner]
+        return x
+
+
+    def solve(self, waypoints, init_params: Optional[np.ndarray] = None) -> PathResult:
+        """
+        Строит цепочку отрезков через путевые точки.
+
+            waypoints: список State (или массив (m+1, 4): x, y, theta, k). Используются координаты всех точек, углы и кривизны
+                       первой и последней точки, а углы промежуточных точек - если free_headings=False (иначе они ищутся,
+                       начиная с направления хорды между соседними точками). Кривизны промежуточных точек всегда ищутся.
+                       Углы разворачиваются так, чтобы соседние отличались меньше чем на pi. Соседние точки не должны
+                       совпадать (иначе ValueError),
+            init_params: начальное приближение - вектор переменных из params прошлого решения (None - дуги окружностей).
+
+        Возвращает PathResult. Найденная цепочка перепроверяется интегрированием с контролем точности (verify_converged):
+        если невязка какого-нибудь отрезка не подтвердилась, статус - STATUS_INACCURATE.
+        """
+
+        points = states_to_array(waypoints)
+        assert len(points) >= 2, "Нужно хотя бы две путевые точки!"
+        m = len(points) - 1
+        chord = np.hypot(*np.diff(points[:, :2], axis=0).T)
+        if not np.all(chord > 0):
+            raise ValueError(f"Совпадающие соседние путевые точки: {np.flatnonzero(~(chord > 0)).tolist()}")
+        self._layout(m)
+
+        thetas, kappas = points[:, 2].copy(), points[:, 3].copy()
+        if self.free_headings and m > 1:  # направление хорды между соседними точками
+            chord = points[2:, :2] - points[:-2, :2]
+            thetas[1:-1] = np.arctan2(chord[:, 1], chord[:, 0])
+        thetas = thetas[0] + np.concatenate([[0.0], np.cumsum((np.diff(thetas) + np.pi) % (2 * np.pi) - np.pi)])
+        x = self._initial_guess(points, thetas, kappas) if init_params is None else np.array(init_params, dtype=float)
+
+        t_start = time.perf_counter()
+        status = STATUS_MAX_ITER
+        history = []
+        integrations, jacobian_builds, steps = 0, 0, 0
+        with np.errstate(all='ignore'):  # переполнения на неудачных пробных шагах отсекаются проверкой на конечность
+            residual, J = self._system(x, points, thetas, kappas)
+            integrations += 1
+            for _ in range(self.iters):
+                norm = residual_norm(residual)
+                history.append(norm)
+                if norm <= self.eps:
+                    status = STATUS_CONVERGED
+                    break
+                if J is None:
+                    status = STATUS_DIVERGED
+                    break
+                steps += 1
+                jacobian_builds += 1
+                direction = scipy.sparse.linalg.spsolve(J.tocsc(), residual)
+                if not np.all(np.isfinite(direction)):
+                    status = STATUS_SINGULAR
+                    break
+
+                alpha = 1.0  # поиск с возвратом: полный шаг Ньютона, пока норма невязки не уменьшится
+                for _ in range(self.max_backtracks):
+                    trial = x - alpha * direction
+                    trial_residual, _ = self._system(trial, points, thetas, kappas, jacobian=False)
+                    integrations += 1
+                    if residual_norm(trial_residual) < norm:
+                        break
+                    alpha /= 2
+                else:
+                    status = STATUS_STALLED
+                    break
+                x = trial
+                residual, J = self._system(x, points, thetas, kappas)
+                integrations += 1
+
+        segments, solved = None, []
+        thetas, kappas, params, _ = self._unpack(x, thetas, kappas)
+        if status == STATUS_CONVERGED:
+            # быстрая квадратура могла не разрешить длинный закрученный отрезок - перепроверяем каждый отрезок
+            nodes = np.stack([points[:, 0], points[:, 1], thetas, kappas], axis=1)
+            if not np.all(verify_converged(nodes[:-1], nodes[1:], params, self.eps)):
+                status = STATUS_INACCURATE
+        if status == STATUS_CONVERGED:
+            solved = [State(px, py, theta, k) for (px, py), theta, k in zip(points[:, :2], thetas, kappas)]
+            segments = [ShortTrajectory(solved[i], solved[i + 1], self.integrator).set_curve_params(*params[i]) for i in range(m)]
+        return PathResult(status, segments, solved, x, steps, history, time.perf_counter() - t_start,
+                          integrations, jacobian_builds)
@@ -0,0 +1,152 @@
+"""
+Кэш сгенерированных примитивов движения.
+
+Планировщик много раз запрашивает одни и те же относительные движения (например, одни и те же примитивы control set
+из разных вершин решётки). Форма примитива при этом зависит только от взаимного расположения start и goal, а не от
+их абсолютных координат: параметры k1, k2, log_length (как и a, b, c, length) не меняются при сдвиге и повороте.
+Поэтому каждый запрос переводится в каноническую систему координат (start в начале координат с нулевым углом
+направления), ключ квантуется, и повторный запрос (в том числе повёрнутый или сдвинутый, как в sym_primitives_show из
+примера) обслуживается из кэша без запуска метода Ньютона. Зеркальное отражение относительно оси направления
+(goal.y -> -goal.y, углы и кривизны меняют знак) тоже сводится к тому же ключу: у отражённого примитива k1, k2 меняют знак.
+"""
+
+import numpy as np
+from collections import OrderedDict
+from typing import Optional
+import sys
+sys.path.append("../common/")
+from PRIM_structs import *
+from trajectory_optimization import optimization_Newton
+
+
+
+ENTRY_BYTES = 320  # примерный объём памяти одной записи кэша (ключ, значение и накладные расходы словаря), байт
+
+
+
+def canonical_goal(start: State, goal: State) -> State:
+    """
+    Целевое состояние в канонической системе координат, где start находится в начале координат с нулевым углом направления.
+    Разность углов не приводится к [-pi, pi], ведь число оборотов (петель) траектории важно.
+    """
+
+    dx, dy = goal.x - start.x, goal.y - start.y
+    cos_t, sin_t = np.cos(start.theta), np.sin(start.theta)
+    return State(cos_t * dx + sin_t * dy, -sin_t * dx + cos_t * dy, goal.theta - start.theta, goal.k)
+
+
+
+class PrimitiveCache:
+    """
+    Мемоизирующий слой перед генератором примитивов с вытеснением давно не использованных записей (LRU).
+
+    Использование: cache = PrimitiveCache(iters=300, lr=0.1); result = cache(start, goal) - результат (SolveResult) такой же,
+    как у optimization_Newton(start, goal, iters=300, lr=0.1). При промахе возвращается настоящий результат решателя
+    (время, число интегрирований и построений матрицы Якоби, история невязки) с параметрами, переведёнными из канонической
+    (и, возможно, отражённой) системы координат обратно к запросу; при попадании в кэш счётчики работы нулевые, а история
+    невязки состоит из одной итоговой невязки. Неудачные решения тоже кэшируются.
+    Счётчики hits, misses, evictions показывают эффективность кэша.
+    """
+
+    def __init__(self, solver=optimization_Newton, quantum: float = 1e-6, max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None, **solver_kwargs) -> None:
+        """
+            solver: функция генерации примитива с интерфейсом optimization_Newton,
+            quantum: шаг квантования координат, углов и кривизн в ключе кэша (запросы, совпадающие с этой точностью,
+                     считаются одинаковыми),
+            max_entries: максимальное число записей (None - без ограничения),
+            max_bytes: ограничение на память кэша (переводится в число записей по оценке ENTRY_BYTES),
+            solver_kwargs: параметры, передаваемые в solver (iters, eps, lr, integrator, ...).
+        """
+
+        self.solver = solver
+        self.quantum = quantum
+        self.solver_kwargs = solver_kwargs
+        limits = [limit for limit in (max_entries, None if max_bytes is None else max_bytes // ENTRY_BYTES) if limit is not None]
+        self.max_entries = min(limits) if limits else None
+        self._entries = OrderedDict()  # ключ -> (status, steps, residual_norm, k1, k2, log_length); для неудачного решения параметры - None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def _key(self, k0: float, goal: State) -> tuple:
+        return tuple(int(v) for v in np.round(np.array([goal.x, goal.y, goal.theta, k0, goal.k]) / self.quantum))
+
+
+    def _canonical_key(self, start: State, goal: State):
+        """
+        Ключ запроса и признак того, что запрос сводится к ключу зеркальным отражением.
+        """
+
+        local = canonical_goal(start, goal)
+        key = self._key(start.k, local)
+        mirrored = self._key(-start.k, State(local.x, -local.y, -local.theta, -local.k))
+        return (mirrored, True) if mirrored < key else (key, False)
+
+
+    def get(self, start: State, goal: State) -> SolveResult:
+        """
+        Возвращает то же, что solver(start, goal): SolveResult с траекторией из start в goal (или с неудачным статусом).
+        """
+
+        key, mirror = self._canonical_key(start, goal)
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            status, steps, norm, k1, k2, log_length = self._entries[key]
+            if status != STATUS_CONVERGED:
+                return SolveResult(status, None, None, steps, [norm], 0.0, 0, 0)
+            return self._result(start, goal, status, np.array([k1, k2, log_length]), mirror, steps, [norm], 0.0, 0, 0)
+
+        self.misses += 1
+        result = self._solve(start, goal, mirror)
+        if result.converged:
+            traj = result.traj
+            self._entries[key] = (result.status, result.iterations, result.residual_norm,
+                                  float(traj.k1), float(traj.k2), float(traj.log_length))
+        else:
+            self._entries[key] = (result.status, result.iterations, result.residual_norm, None, None, None)
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        params = None if result.params is None else np.array(result.params, dtype=float)
+        return self._result(start, goal, result.status, params, mirror, result.iterations, result.residual_history,
+                            result.wall_time, result.integrations, result.jacobian_builds, result.strategy)
+
+    __call__ = get
+
+
+    def _result(self, start: State, goal: State, status: int, params: Optional[np.ndarray], mirror: bool, *telemetry):
+        # параметры k1, k2, log_length найдены в канонической системе координат: у отражённого примитива k1, k2 меняют знак
+        if params is not None and mirror:
+            params[:2] = -params[:2]
+        traj = None
+        if status == STATUS_CONVERGED:
+            traj = ShortTrajectory(start, goal, self.solver_kwargs.get("integrator")).set_curve_params(*params)
+        return SolveResult(status, traj, params, *telemetry)
+
+
+    def _solve(self, start: State, goal: State, mirror: bool):
+        # решаем задачу в канонической системе координат (в отражённом виде, если ключ получен отражением)
+        local = canonical_goal(start, goal)
+        k0 = start.k
+        if mirror:
+            local, k0 = State(local.x, -local.y, -local.theta, -local.k), -k0
+        return self.solver(State(0.0, 0.0, 0.0, k0), local, **self.solver_kwargs)
+
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+    def clear(self) -> None:
+        """ Очищает кэш (счётчики сохраняются). """
+        self._entries.clear()
+
+
+    def stats(self) -> dict:
+        """ Счётчики попаданий и промахов. """
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self._entries),
+                "hit_rate": self.hits / total if total else 0.0}
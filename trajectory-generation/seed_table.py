@@ -0,0 +1,213 @@
+"""
+Таблица начальных приближений для метода Ньютона (lookup table), как в классических планировщиках на полиномиальных спиралях.
+
+Метод Ньютона по умолчанию стартует из нулевых параметров (прямой отрезок единичной длины), и для далёких или сильно
+повёрнутых целей ему требуются десятки итераций. Но параметры решения k1, k2, log_length гладко зависят от взаимного
+расположения start и goal, поэтому их можно заранее (offline) посчитать на сетке и при генерации примитива (online) брать
+начальное приближение интерполяцией - тогда методу Ньютона остаётся всего несколько итераций.
+
+Сетка строится в канонической системе координат (start в начале координат с нулевым углом направления, см.
+primitive_cache.canonical_goal) по пяти осям: dx, dy, dtheta (= goal.theta - start.theta), k0 (= start.k), kf (= goal.k).
+Если все значения оси dy неотрицательны, таблица хранит только половину сетки: запрос с dy < 0 отражается относительно оси
+направления (dy, dtheta, k0, kf меняют знак), а у найденного приближения меняют знак k1 и k2. Поэтому в таком случае оси
+dtheta, k0, kf должны быть симметричны относительно нуля (иначе отражённый запрос попадает мимо решённых узлов).
+
+Таблица хранится в сжатом файле NumPy (.npz): значения осей, параметры решений (float32 - для начального приближения
+этого более чем достаточно) и маска valid узлов, в которых метод Ньютона сошёлся. При интерполяции используются только
+допустимые вершины ячейки (их веса перенормируются), а если таких нет или запрос лежит вне сетки, приближения нет.
+
+Использование: table = build_seed_table(...); table.save("seeds.npz"), а при генерации -
+set_seed_table(load_seed_table("seeds.npz")) (см. trajectory_optimization.py), после чего optimization_Newton и
+optimization_Newton_batch без init_params стартуют из приближения таблицы. Из командной строки:
+    python seed_table.py --output seeds.npz --workers 4
+"""
+
+import numpy as np
+import argparse
+import itertools
+from multiprocessing import Pool, cpu_count
+from functools import partial
+from typing import Optional
+import sys
+sys.path.append("../common/")
+from PRIM_structs import *
+from trajectory_optimization import optimization_Newton
+from continuation import continuation_solve
+
+
+
+SEED_AXES = ("dx", "dy", "dtheta", "k0", "kf")  # оси таблицы (в этом порядке)
+
+
+
+def canonical_queries(starts: np.ndarray, goals: np.ndarray) -> np.ndarray:
+    """
+    Координаты запросов (N, 5) в осях таблицы: dx, dy, dtheta, k0, kf в канонической системе координат start
+    (пакетная версия primitive_cache.canonical_goal).
+        starts, goals: массивы (N, 4) начальных и целевых состояний.
+    """
+
+    dx, dy = goals[:, 0] - starts[:, 0], goals[:, 1] - starts[:, 1]
+    cos_t, sin_t = np.cos(starts[:, 2]), np.sin(starts[:, 2])
+    return np.stack([cos_t * dx + sin_t * dy, -sin_t * dx + cos_t * dy, goals[:, 2] - starts[:, 2], starts[:, 3], goals[:, 3]], axis=1)
+
+
+
+class SeedTable:
+    """
+    Таблица начальных приближений на регулярной (не обязательно равномерной) сетке по осям SEED_AXES.
+
+        axes: кортеж из пяти возрастающих массивов значений осей,
+        params: массив (len(dx), len(dy), len(dtheta), len(k0), len(kf), 3) параметров k1, k2, log_length,
+        valid: булев массив той же формы без последней оси - сошёлся ли метод Ньютона в узле,
+        mirrored: хранится ли только половина сетки с dy >= 0 (определяется по оси dy).
+    """
+
+    __slots__ = ("axes", "params", "valid", "mirrored", "_corners")
+
+    def __init__(self, axes, params: np.ndarray, valid: np.ndarray) -> None:
+        self.axes = tuple(np.asarray(axis, dtype=float).ravel() for axis in axes)
+        assert len(self.axes) == len(SEED_AXES), f"Нужно {len(SEED_AXES)} осей: {', '.join(SEED_AXES)}!"
+        assert all(len(axis) >= 1 and np.all(np.diff(axis) > 0) for axis in self.axes), "Значения осей должны возрастать!"
+        shape = tuple(len(axis) for axis in self.axes)
+        self.params = np.asarray(params, dtype=np.float32).reshape(shape + (3,))
+        self.valid = np.asarray(valid, dtype=bool).reshape(shape)
+        self.mirrored = bool(self.axes[1][0] >= 0)
+        self._corners = np.array(list(itertools.product((0, 1), repeat=len(shape))))  # вершины ячейки: (32, 5)
+
+
+    @property
+    def shape(self) -> tuple:
+        return self.valid.shape
+
+
+    def coverage(self) -> float:
+        """ Доля узлов сетки, в которых есть решение. """
+        return float(np.mean(self.valid)) if self.valid.size else 0.0
+
+
+    def lookup_batch(self, starts, goals, min_weight: float = 1e-6):
+        """
+        Начальные приближения сразу для N пар (start, goal) многолинейной интерполяцией по допустимым вершинам ячейки.
+
+            starts, goals: списки State или массивы (N, 4),
+            min_weight: наименьший суммарный вес допустимых вершин, при котором приближение ещё считается найденным.
+
+        Возвращает пару: params (N, 3) - приближения k1, k2, log_length (для ненайденных - нули) и found (N,) - найдено ли приближение.
+        """
+
+        query = canonical_queries(states_to_array(starts), states_to_array(goals))
+        mirror = self.mirrored & (query[:, 1] < 0)
+        query[mirror, 1:] *= -1  # отражение относительно оси направления: dy, dtheta, k0, kf меняют знак
+
+        n = len(query)
+        lower, upper, weight = np.zeros((n, 5), dtype=int), np.zeros((n, 5), dtype=int), np.zeros((n, 5))
+        inside = np.ones(n, dtype=bool)
+        for d, axis in enumerate(self.axes):
+            q = query[:, d]
+            inside &= (q >= axis[0]) & (q <= axis[-1])
+            if len(axis) == 1:  # ось из одного значения: вершина ячейки одна
+                continue
+            i = np.clip(np.searchsorted(axis, q, side="right") - 1, 0, len(axis) - 2)
+            lower[:, d], upper[:, d] = i, i + 1
+            weight[:, d] = np.clip((q - axis[i]) / (axis[i + 1] - axis[i]), 0.0, 1.0)
+
+        numerator, total = np.zeros((n, 3)), np.zeros(n)
+        for corner in self._corners:
+            index = tuple(np.where(corner, upper, lower).T)
+            w = np.prod(np.where(corner, weight, 1 - weight), axis=1) * self.valid[index]
+            numerator += w[:, None] * self.params[index]
+            total += w
+
+        found = inside & (total > min_weight)
+        params = np.zeros((n, 3))
+        params[found] = numerator[found] / total[found, None]
+        params[mirror, :2] *= -1  # у отражённого примитива k1, k2 меняют знак
+        return params, found
+
+
+    def lookup(self, start: State, goal: State) -> Optional[np.ndarray]:
+        """
+        Начальное приближение (k1, k2, log_length) для одной пары (start, goal) или None, если его нет.
+        """
+
+        params, found = self.lookup_batch([start], [goal])
+        return params[0] if found[0] else None
+
+
+    def save(self, filename: str) -> None:
+        """ Записывает таблицу в сжатый файл NumPy (.npz). """
+        np.savez_compressed(filename, params=self.params, valid=self.valid, **dict(zip(SEED_AXES, self.axes)))
+
+
+
+def load_seed_table(filename: str) -> SeedTable:
+    """
+    Читает таблицу начальных приближений из файла, записанного SeedTable.save.
+        filename: имя файла.
+    """
+
+    with np.load(filename) as data:
+        return SeedTable([data[name] for name in SEED_AXES], data["params"], data["valid"])
+
+
+
+def _solve_slice(k0: float, goals: np.ndarray, solver, solver_kwargs: dict) -> PrimitiveArray:
+    # все цели при одной начальной кривизне k0 - одна волна продолжения (см. continuation.py)
+    return continuation_solve(State(0.0, 0.0, 0.0, k0), goals, solver=solver, **solver_kwargs)
+
+
+def build_seed_table(dx=np.linspace(-5.0, 5.0, 11), dy=np.linspace(0.0, 5.0, 6), dtheta=np.linspace(-np.pi, np.pi, 13),
+                     k0=(0.0,), kf=(0.0,), workers: int = 0, solver=optimization_Newton, **solver_kwargs) -> SeedTable:
+    """
+    Строит таблицу начальных приближений, решая задачи во всех узлах сетки (offline).
+    Задачи с одинаковой начальной кривизной решаются методом продолжения (continuation_solve), поэтому даже далёкие и
+    сильно повёрнутые узлы получают хорошее приближение от уже решённых соседей.
+
+        dx, dy, dtheta, k0, kf: значения осей сетки (если все dy >= 0, таблица использует зеркальную симметрию, и тогда
+                                оси dtheta, k0, kf должны быть симметричны относительно нуля),
+        workers: число процессов (срезы с разной k0 решаются параллельно; 0 - в текущем процессе),
+        solver, solver_kwargs: функция генерации примитива с интерфейсом optimization_Newton и её параметры
+                               (по умолчанию - точная матрица Якоби и iters=300, lr=0.1).
+    """
+
+    solver_kwargs = {"jacobian": "exact", "iters": 300, "lr": 0.1, **solver_kwargs}
+    axes = [np.asarray(axis, dtype=float).ravel() for axis in (dx, dy, dtheta, k0, kf)]
+    dx, dy, dtheta, k0, kf = axes
+    if dy[0] >= 0:
+        asymmetric = [name for name, axis in zip(SEED_AXES[2:], axes[2:]) if not np.allclose(axis, -axis[::-1], atol=1e-12)]
+        assert not asymmetric, f"При зеркальной симметрии (все dy >= 0) оси должны быть симметричны относительно нуля: {', '.join(asymmetric)}!"
+    grid = np.stack(np.meshgrid(dx, dy, dtheta, kf, indexing="ij"), axis=-1).reshape(-1, 4)  # цели одного среза: x, y, theta, k
+
+    solve = partial(_solve_slice, goals=grid, solver=solver, solver_kwargs=solver_kwargs)
+    if workers > 0:
+        with Pool(processes=workers) as pool:
+            slices = pool.map(solve, k0.tolist())
+    else:
+        slices = [solve(k) for k in k0.tolist()]
+
+    shape = (len(dx), len(dy), len(dtheta), len(kf))
+    params = np.stack([np.stack([prims["k1"], prims["k2"], prims["log_length"]], axis=1).reshape(shape + (3,))
+                       for prims in slices], axis=3)  # ось k0 - четвёртая
+    valid = np.stack([(prims["status"] == STATUS_CONVERGED).reshape(shape) for prims in slices], axis=3)
+    return SeedTable(axes, np.where(valid[..., None], params, 0.0), valid)
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Построение таблицы начальных приближений для метода Ньютона.")
+    parser.add_argument('--output', default='seed_table.npz', help="Файл для сохранения таблицы.")
+    parser.add_argument('--dx', type=float, nargs=3, default=[-5.0, 5.0, 11], metavar=('MIN', 'MAX', 'NUM'), help="Сетка по dx.")
+    parser.add_argument('--dy', type=float, nargs=3, default=[0.0, 5.0, 6], metavar=('MIN', 'MAX', 'NUM'),
+                        help="Сетка по dy (при MIN >= 0 используется зеркальная симметрия).")
+    parser.add_argument('--dtheta', type=float, nargs=3, default=[-np.pi, np.pi, 13], metavar=('MIN', 'MAX', 'NUM'), help="Сетка по углу.")
+    parser.add_argument('--k0', type=float, nargs='+', default=[0.0], help="Значения начальной кривизны.")
+    parser.add_argument('--kf', type=float, nargs='+', default=[0.0], help="Значения конечной кривизны.")
+    parser.add_argument('--workers', type=int, default=cpu_count(), help="Количество параллельных процессов.")
+    args = parser.parse_args()
+
+    grid = lambda bounds: np.linspace(bounds[0], bounds[1], int(bounds[2]))
+    table = build_seed_table(grid(args.dx), grid(args.dy), grid(args.dtheta), args.k0, args.kf,
+                             workers=min(args.workers, len(args.k0)))
+    table.save(args.output)
+    print(f"Таблица {table.shape} сохранена в '{args.output}', решено {table.coverage() * 100:.1f}% узлов.")
@@ -16,9 +16,31 @@ start и goal). Это можно сделать многомерным мето
 """
 
 import numpy as np
+import math
+import time
 import sys
 sys.path.append("../common/")
 from PRIM_structs import *
+from newton_steps import StepController, residual_norm, newton_direction
+from divergence import SolveBudget, DivergenceMonitor
+from PRIM_profiling import register_stages
+
+
+
+SEED_TABLE = None  # таблица начальных приближений (см. seed_table.py); None - старт из нулевых параметров
+
+# интегрирование с контролем точности для проверки найденных решений (см. verify_converged)
+VERIFY_INTEGRATOR = GaussLegendreIntegrator(tol=1e-9, max_segments=1 << 14)
+
+
+def set_seed_table(table) -> None:
+    """
+    Загружает таблицу начальных приближений (SeedTable из seed_table.py) для задач, у которых не передан init_params
+    (None - снова стартовать из нулей).
+    """
+
+    global SEED_TABLE
+    SEED_TABLE = table
 
 
 
@@ -56,7 +78,7 @@ def calc_Jacobian_matrix(traj: ShortTrajectory, params: np.ndarray, dk: float =
     """
     
     k1, k2, log_length = params  # текущие параметры
-    traj = ShortTrajectory(traj.start, traj.goal)  # создаём копию (задавая те же состояния) траектории, чтобы не портить имеющуюся
+    traj = ShortTrajectory(traj.start, traj.goal, traj.integrator)  # создаём копию (задавая те же состояния) траектории, чтобы не портить имеющуюся
     
     dF_p = get_residual(traj.set_curve_params(k1+dk, k2, log_length))  # считаем невязки при сдвинутом параметре k1
     dF_m = get_residual(traj.set_curve_params(k1-dk, k2, log_length))
@@ -75,7 +97,9 @@ def calc_Jacobian_matrix(traj: ShortTrajectory, params: np.ndarray, dk: float =
 
 
 
-def optimization_Newton(start: State, goal: State, iters: int = 2000, eps: float = 1e-2, lr: float = 0.03, redraw_trajectory = None) -> ShortTrajectory:
+def optimization_Newton(start: State, goal: State, iters: int = 2000, eps: float = 1e-2, lr: float = 0.03, redraw_trajectory = None,
+                        integrator = None, jacobian: str = "numeric", init_params = None, step: str = "fixed",
+                        trace = None, budget: SolveBudget = None) -> SolveResult:
     """
     Функция многомерного метода Ньютона, которая подбирает параметры траектории.
 
@@ -84,27 +108,380 @@ def optimization_Newton(start: State, goal: State, iters: int = 2000, eps: float
         eps: норма функции невязки, при достижении которой считаем, что траектория уже достаточно точно
              идёт в целевое состояние и останавливаем алгоритм,
         lr: коэффициент обучения, с которым происходит оптимизация (коэффициент alpha в тексте статьи),
-        redraw_trajectory: можно передать функцию для онлайн-отображения процесса генерации траектории.
+        redraw_trajectory: можно передать функцию для онлайн-отображения процесса генерации траектории (вызывается как
+                           redraw_trajectory(traj, i) и строит траекторию - это дорого, для профилирования лучше trace),
+        integrator: движок численного интегрирования координат траектории (None - быстрый движок по умолчанию,
+                    QuadIntegrator() - эталонный адаптивный quad),
+        jacobian: способ вычисления матрицы Якоби: "numeric" - конечными разностями (как в статье),
+                  "exact" - точно, вместе с невязкой за один проход квадратуры (см. calc_residual_and_Jacobian),
+        init_params: начальное приближение (k1, k2, log_length) для метода Ньютона (None - из таблицы начальных приближений,
+                     если она загружена set_seed_table, иначе нули; удачное приближение, например параметры уже решённой
+                     соседней задачи, сильно сокращает число итераций),
+        step: стратегия шага метода Ньютона: "fixed" (доля lr шага Ньютона, как в статье), "line_search", "lm" или "dogleg"
+              (см. newton_steps.py; для них lr не используется),
+        trace: лёгкий обработчик трассировки, вызывается на каждой итерации как trace(i, params, norm), где norm - норма невязки
+               (траектория при этом не строится и не семплируется),
+        budget: бюджет и признаки досрочной остановки SolveBudget (см. divergence.py; None - поиск идёт все iters итераций).
+
+    Возвращает SolveResult: статус решения, найденную траекторию (или None), число итераций, историю нормы невязки и
+    счётчики затраченной работы. Для совместимости его можно распаковать как пару: steps, traj = optimization_Newton(...).
     """
     
-    traj =  ShortTrajectory(start, goal)  # фиксируем траекторию между двумя состояниями
-    params = np.array([0.0, 0.0, 0.0])    # начальные параметры траектории (во второй параметризации): k1, k2, log_length
+    assert jacobian in ("numeric", "exact"), "Неизвестный способ вычисления матрицы Якоби!"
+    traj =  ShortTrajectory(start, goal, integrator)  # фиксируем траекторию между двумя состояниями
+    if init_params is None and SEED_TABLE is not None:
+        init_params = SEED_TABLE.lookup(start, goal)  # None, если для такой пары в таблице приближения нет
+    params = np.array([0.0, 0.0, 0.0]) if init_params is None else np.array(init_params, dtype=float)  # начальные параметры траектории (во второй параметризации): k1, k2, log_length
+
+    probe = ShortTrajectory(start, goal, integrator)  # отдельная траектория для пробных шагов, чтобы не портить traj
+    controller = StepController(step, lambda p: get_residual(probe.set_curve_params(*p)), lr=lr)
+    monitor = None if budget is None else DivergenceMonitor(budget, states_to_array([start]), states_to_array([goal]))
+
+    t_start = time.perf_counter()
+    status = STATUS_MAX_ITER
+    history = []                          # нормы невязки на каждой итерации
+    integrations, jacobian_builds = 0, 0  # счётчики работы
 
     steps = 0
     for i in range(iters):
         steps += 1
-        curr_diff = get_residual(traj.set_curve_params(*params))  # вычисляем текущую невязку: для этого устанавливаем текущие параметры в traj
-        J = calc_Jacobian_matrix(traj, params)  # вычисляем матрицу Якоби в текущих параметрах params
-        params -= lr * np.linalg.inv(J) @ curr_diff  # обновляем параметры многомерным методом Ньютона ->
-                                                     # -> стремимся занулить невязку curr_diff
+        try:
+            if jacobian == "exact":
+                curr_diff, J = calc_residual_and_Jacobian(traj, params)  # невязка и матрица Якоби сразу, за один проход интегрирования
+                integrations += 1
+            else:
+                curr_diff = get_residual(traj.set_curve_params(*params))  # вычисляем текущую невязку: для этого устанавливаем текущие параметры в traj
+                J = calc_Jacobian_matrix(traj, params)  # вычисляем матрицу Якоби в текущих параметрах params
+                integrations += 7                       # невязка + 6 сдвинутых траекторий
+            jacobian_builds += 1
+        except AssertionError:  # недопустимые параметры (например, длина ушла в бесконечность) - дальше искать бессмысленно
+            status = STATUS_DIVERGED
+            break
 
-        if np.sum(curr_diff ** 2) ** 0.5 <= eps:  # если норма невязки достаточно мала, можно останавливать поиск
+        norm = residual_norm(curr_diff)
+        history.append(norm)
+        if not (np.isfinite(norm) and np.all(np.isfinite(J))):
+            status = STATUS_DIVERGED
             break
+        if monitor is not None and norm > eps:  # досрочная остановка, если решения явно не будет
+            verdict = monitor.check_single((traj.a, traj.b, traj.c, traj.length), norm, J,
+                                           integrations + controller.residual_evals, time.perf_counter() - t_start)
+            if verdict:
+                status = verdict
+                break
+
+        params = controller.step(params, curr_diff, J)  # обновляем параметры многомерным методом Ньютона ->
+                                                        # -> стремимся занулить невязку curr_diff
+
+        if norm <= eps:  # если норма невязки достаточно мала, можно останавливать поиск
+            status = STATUS_CONVERGED
+            break
+        if trace:
+            trace(i, params, norm)
         if redraw_trajectory:
             redraw_trajectory(traj, i)  # перерисовываем траекторию (передаём саму траекторию для рисования + номер итерации на всякий случай)
 
-    else:
-        print("Невозможно найти траекторию! Метод Ньютона не сошёлся!")
-        return None
+    if status == STATUS_MAX_ITER and controller.last_singular:
+        status = STATUS_SINGULAR
+    integrations += controller.residual_evals
+
+    found = None
+    if status == STATUS_CONVERGED:
+        try:
+            found = traj.set_curve_params(*params)  # возвращаем найденную траекторию (с найденными параметрами)
+        except AssertionError:  # последний шаг увёл параметры в недопустимую область
+            status = STATUS_DIVERGED
+    if status == STATUS_CONVERGED and not verify_converged(states_to_array([start]), states_to_array([goal]),
+                                                           params.reshape(1, 3), eps)[0]:
+        status, found = STATUS_INACCURATE, None
+    return SolveResult(status, found, params, steps, history, time.perf_counter() - t_start, integrations, jacobian_builds)
+
+
+
+def verify_converged(starts: np.ndarray, goals: np.ndarray, params: np.ndarray, eps: float) -> np.ndarray:
+    """
+    Проверка найденных решений: маска (N,) задач, у которых невязка, пересчитанная с контролем точности интегрирования
+    (VERIFY_INTEGRATOR), не больше eps. Метод Ньютона видит невязку, посчитанную быстрой квадратурой; если квадратура
+    не разрешает траекторию (например, очень длинную и закрученную), маленькая невязка может оказаться ложной.
+
+        starts, goals: массивы (N, 4) начальных и целевых состояний,
+        params: массив (N, 3) найденных параметров k1, k2, log_length,
+        eps: допустимая норма невязки.
+    """
+
+    if len(params) == 0:
+        return np.zeros(0, dtype=bool)
+    with np.errstate(all='ignore'):
+        residual = get_residual_batch(starts, goals, params, VERIFY_INTEGRATOR)
+        return np.sum(residual ** 2, axis=1) ** 0.5 <= eps
+
+
+
+"""
+Пакетная (векторизованная) версия метода Ньютона.
+
+Вместо того чтобы решать задачи (start, goal) по одной в python-цикле, параметры k1, k2, log_length сразу N задач хранятся
+в массиве размера (N, 3). Невязки и матрицы Якоби для всех задач считаются векторными операциями NumPy, а N систем 3 на 3
+решаются одним вызовом np.linalg.solve. Задачи, которые уже сошлись (или разошлись), на каждой итерации маскируются и
+дальше не пересчитываются. Сам метод (шаг, критерий остановки, конечные разности, обработка вырожденной матрицы Якоби)
+повторяет optimization_Newton с шагом "fixed".
+"""
+
+
+def coef_params_batch(starts: np.ndarray, goals: np.ndarray, params: np.ndarray) -> np.ndarray:
+    """
+    Переход от второй параметризации (k1, k2, log_length) к первой (a, b, c, length) сразу для N траекторий
+    (пакетный вызов curve_to_coef_params).
+
+        starts, goals: массивы (N, 4) начальных и целевых состояний (x, y, theta, k),
+        params: массив (N, 3) параметров k1, k2, log_length.
+
+    Возвращает массив (N, 4) параметров a, b, c, length.
+    """
+
+    with np.errstate(all='ignore'):  # на вырожденной длине получим нечисловые значения, они отсеиваются дальше
+        return np.stack(curve_to_coef_params(starts[:, 3], params[:, 0], params[:, 1], goals[:, 3], params[:, 2]), axis=1)
+
+
+def get_residual_batch(starts: np.ndarray, goals: np.ndarray, params: np.ndarray, integrator = None) -> np.ndarray:
+    """
+    Пакетная версия get_residual: невязки (N, 3) по x, y, theta для N траекторий с параметрами params (N, 3).
+
+        starts, goals: массивы (N, 4) начальных и целевых состояний,
+        params: массив (N, 3) параметров k1, k2, log_length,
+        integrator: движок интегрирования (None - DEFAULT_INTEGRATOR).
+    """
+
+    integrator = DEFAULT_INTEGRATOR if integrator is None else integrator
+    a, b, c, length = coef_params_batch(starts, goals, params).T
+    coefs = np.stack([starts[:, 2], starts[:, 3], a/2, b/3, c/4], axis=1)  # коэффициенты полиномов угла направления
+
+    final = np.full((len(params), 3), np.nan)
+    valid = np.all(np.isfinite(coefs), axis=1) & np.isfinite(length)
+    final[valid, 0], final[valid, 1] = integrator.integrate_batch(coefs[valid], length[valid])
+    final[valid, 2] = np.polynomial.polynomial.polyval(length[valid], coefs[valid].T, tensor=False)
+    final[:, :2] += starts[:, :2]
+    return goals[:, :3] - final
+
+
+def calc_Jacobian_matrix_batch(starts: np.ndarray, goals: np.ndarray, params: np.ndarray,
+                               dk: float = 0.001, dl: float = 0.001, integrator = None) -> np.ndarray:
+    """
+    Пакетная версия calc_Jacobian_matrix: матрицы Якоби (N, 3, 3), посчитанные теми же центральными конечными разностями.
+    Все 6 сдвигов параметров для всех N задач собираются в один массив и считаются одним вызовом get_residual_batch.
+    """
+
+    n = len(params)
+    shifts = np.diag([dk, dk, dl])                                       # сдвиги по k1, k2, log_length
+    probes = np.concatenate([params[:, None, :] + shifts, params[:, None, :] - shifts], axis=1).reshape(-1, 3)  # (N*6, 3)
+    residuals = get_residual_batch(np.repeat(starts, 6, axis=0), np.repeat(goals, 6, axis=0), probes, integrator).reshape(n, 6, 3)
+    return ((residuals[:, :3] - residuals[:, 3:]) / np.array([2*dk, 2*dk, 2*dl]).reshape(1, 3, 1)).transpose(0, 2, 1)
+
+
+def newton_directions_batch(J: np.ndarray, residual: np.ndarray, singular: np.ndarray = None) -> np.ndarray:
+    """
+    Шаги Ньютона (N, 3) для N задач: решения систем J[i] @ d[i] = residual[i] (N систем 3 на 3 одним вызовом). Как
+    в newton_direction, при вырожденной J[i] берётся решение наименьшей нормы методом наименьших квадратов.
+        singular: если передан булев массив (N,), в нём отмечаются задачи, для которых пришлось к нему прибегнуть.
+    """
+
+    try:
+        return np.linalg.solve(J, residual[:, :, None])[:, :, 0]
+    except np.linalg.LinAlgError:  # хотя бы одна матрица вырождена - решаем системы по одной
+        directions = np.empty_like(residual)
+        for k in range(len(J)):
+            flags = []
+            directions[k] = newton_direction(J[k], residual[k], flags)
+            if singular is not None:
+                singular[k] = bool(flags)
+        return directions
+
+
+def optimization_Newton_batch(starts, goals, iters: int = 2000, eps: float = 1e-2, lr: float = 0.03, integrator = None,
+                              jacobian: str = "numeric", init_params = None, budget: SolveBudget = None,
+                              return_status: bool = False):
+    """
+    Пакетный многомерный метод Ньютона: подбирает параметры сразу для N пар (start, goal).
+
+        starts, goals: списки состояний State (или массивы (N, 4): x, y, theta, k) одинаковой длины,
+        iters, eps, lr: как в optimization_Newton,
+        integrator: движок интегрирования (None - DEFAULT_INTEGRATOR),
+        jacobian: "numeric" (конечные разности) или "exact" (см. calc_residual_and_Jacobian_batch),
+        init_params: начальные приближения (N, 3) параметров k1, k2, log_length (None - из таблицы set_seed_table, если
+                     она загружена, иначе нули),
+        budget: бюджет и признаки досрочной остановки SolveBudget (см. divergence.py): задачи, которые явно не сойдутся,
+                снимаются с решения сразу, а не после iters итераций (max_time ограничивает время всего пакета),
+        return_status: вернуть вместо success массив кодов STATUS_* с причиной неудачи каждой задачи.
+
+    Возвращает тройку массивов:
+        success: (N,) - сошёлся ли метод для каждой задачи (или status: (N,) - коды STATUS_*, если return_status),
+        steps: (N,) - число сделанных итераций,
+        params: (N, 3) - найденные параметры k1, k2, log_length (для несошедшихся задач - последние значения).
+    """
+
+    assert jacobian in ("numeric", "exact"), "Неизвестный способ вычисления матрицы Якоби!"
+    starts, goals = states_to_array(starts), states_to_array(goals)
+    assert len(starts) == len(goals), "Число начальных и целевых состояний должно совпадать!"
+
+    n = len(starts)
+    if init_params is None and SEED_TABLE is not None:
+        init_params = SEED_TABLE.lookup_batch(starts, goals)[0]  # где приближения нет - нули
+    params = np.zeros((n, 3)) if init_params is None else np.array(init_params, dtype=float).reshape(n, 3)  # начальные параметры
+    steps = np.zeros(n, dtype=int)
+    status = np.full(n, STATUS_MAX_ITER)
+    active = np.ones(n, dtype=bool)     # задачи, которые ещё решаются
+    last_singular = np.zeros(n, dtype=bool)  # была ли матрица Якоби вырождена на последнем шаге (как StepController.last_singular)
+    monitor = None if budget is None else DivergenceMonitor(budget, starts, goals)
+    per_step = 1 if jacobian == "exact" else 7  # проходов интегрирования на итерацию
+    t_start = time.perf_counter()
+
+    for i in range(iters):
+        idx = np.flatnonzero(active)
+        if len(idx) == 0:
+            break
+        steps[idx] += 1
+
+        with np.errstate(all='ignore'):  # переполнения на разошедшихся задачах ловим ниже по нечисловым значениям
+            if jacobian == "exact":
+                curr_diff, J = calc_residual_and_Jacobian_batch(starts[idx], goals[idx], params[idx], integrator)
+            else:
+                curr_diff = get_residual_batch(starts[idx], goals[idx], params[idx], integrator)
+                J = calc_Jacobian_matrix_batch(starts[idx], goals[idx], params[idx], integrator=integrator)
+
+            ok = np.all(np.isfinite(curr_diff), axis=1) & np.all(np.isfinite(J), axis=(1, 2))
+            status[idx[~ok]] = STATUS_DIVERGED
+            active[idx[~ok]] = False
+            idx, curr_diff, J = idx[ok], curr_diff[ok], J[ok]
+            norms = np.sum(curr_diff ** 2, axis=1) ** 0.5
+            converged = norms <= eps
+
+            if monitor is not None:  # досрочная остановка задач, которые явно не сойдутся
+                verdict = monitor.check(idx, coef_params_batch(starts[idx], goals[idx], params[idx]), norms, J,
+                                        steps[idx] * per_step, time.perf_counter() - t_start)
+                verdict[converged] = 0
+                stop = verdict > 0
+                status[idx[stop]] = verdict[stop]
+                active[idx[stop]] = False
+                idx, curr_diff, J, converged = idx[~stop], curr_diff[~stop], J[~stop], converged[~stop]
+
+            singular = np.zeros(len(idx), dtype=bool)
+            params[idx] -= lr * newton_directions_batch(J, curr_diff, singular)
+            last_singular[idx] = singular
+
+        status[idx[converged]] = STATUS_CONVERGED
+        active[idx[converged]] = False
+
+    status[(status == STATUS_MAX_ITER) & last_singular] = STATUS_SINGULAR  # как в optimization_Newton
+    done = np.flatnonzero(status == STATUS_CONVERGED)
+    status[done[~verify_converged(starts[done], goals[done], params[done], eps)]] = STATUS_INACCURATE
+    success = status == STATUS_CONVERGED
+    return (status if return_status else success), steps, params
+
+
+
+"""
+Точная матрица Якоби (через чувствительности).
+
+Угол направления theta(s) = theta0 + k0*s + a/2*s^2 + b/3*s^3 + c/4*s^4 линеен по коэффициентам a, b, c, поэтому
+    d theta(s) / da = s^2/2,   d theta(s) / db = s^3/3,   d theta(s) / dc = s^4/4,
+и производные координат конца траектории x(L) = x0 + int_0^L cos(theta(s)) ds, y(L) = y0 + int_0^L sin(theta(s)) ds по
+коэффициентам - это интегралы той же подынтегральной функции, взвешенные степенями s (моменты, см. moments_batch):
+    dx(L) / da = -1/2 * int_0^L s^2 sin(theta(s)) ds,   dy(L) / da = 1/2 * int_0^L s^2 cos(theta(s)) ds   (и аналогично для b, c).
+Зависимость от длины L как от верхнего предела даёт ещё слагаемые cos(theta(L)), sin(theta(L)) и k(L) = kf.
+
+Связь (k1, k2, log_length) -> (a, b, c) при фиксированной длине линейна (CURVE_TO_COEF_MATRIX), а при изменении длины
+коэффициенты при s^j масштабируются как 1/L^j, поэтому d(a, b, c) / d log_length = -(a, 2b, 3c). Итого невязка и вся матрица
+Якоби считаются по одному набору значений cos и sin в узлах квадратуры - вместо 7 построений траектории с конечными разностями.
+"""
+
+
+def calc_residual_and_Jacobian_batch(starts: np.ndarray, goals: np.ndarray, params: np.ndarray, integrator = None):
+    """
+    Невязки (N, 3) и точные матрицы Якоби (N, 3, 3) по параметрам k1, k2, log_length сразу для N траекторий.
+
+        starts, goals: массивы (N, 4) начальных и целевых состояний,
+        params: массив (N, 3) параметров k1, k2, log_length,
+        integrator: движок интегрирования (None - DEFAULT_INTEGRATOR).
+    """
+
+    integrator = DEFAULT_INTEGRATOR if integrator is None else integrator
+    n = len(params)
+    a, b, c, length = coef_params_batch(starts, goals, params).T
+    coefs = np.stack([starts[:, 2], starts[:, 3], a/2, b/3, c/4], axis=1)
+
+    residual, J = np.full((n, 3), np.nan), np.full((n, 3, 3), np.nan)
+    valid = np.all(np.isfinite(coefs), axis=1) & np.isfinite(length)
+    coefs, L = coefs[valid], length[valid]
+    moments_cos, moments_sin = integrator.moments_batch(coefs, L)  # единственный проход квадратуры
+
+    theta_f = np.polynomial.polynomial.polyval(L, coefs.T, tensor=False)  # угол направления в конце траектории
+    residual[valid] = goals[valid, :3] - np.stack([starts[valid, 0] + moments_cos[:, 0],
+                                                   starts[valid, 1] + moments_sin[:, 0],
+                                                   theta_f], axis=1)
+
+    # производные конечных x, y, theta по коэффициентам (a, b, c): (M, 3, 3)
+    degrees = np.array([2, 3, 4])
+    d_final_d_coef = np.stack([-moments_sin[:, degrees] / degrees,
+                               moments_cos[:, degrees] / degrees,
+                               L.reshape(-1, 1) ** degrees / degrees], axis=1)
+
+    # производные коэффициентов (a, b, c) по параметрам (k1, k2, log_length): (M, 3, 3)
+    inv_powers = L.reshape(-1, 1) ** -np.arange(1, 4)  # 1/L, 1/L^2, 1/L^3
+    d_coef_d_params = np.stack([CURVE_TO_COEF_MATRIX[1:, 1] * inv_powers,
+                                CURVE_TO_COEF_MATRIX[1:, 2] * inv_powers,
+                                -np.arange(1, 4) * np.stack([a, b, c], axis=1)[valid]], axis=2)
+
+    d_final = d_final_d_coef @ d_coef_d_params
+    d_final[:, :, 2] += L.reshape(-1, 1) * np.stack([np.cos(theta_f), np.sin(theta_f), goals[valid, 3]], axis=1)  # L - верхний предел, dL/dlog_length = L
+    J[valid] = -d_final  # невязка = goal - final
+    return residual, J
+
+
+_D_COEF = CURVE_TO_COEF_MATRIX[1:, 1:3].tolist()  # производные (a, b, c) * L^j по k1, k2 (обычными числами - так быстрее)
+
+
+def calc_residual_and_Jacobian(traj: ShortTrajectory, params: np.ndarray):
+    """
+    Невязка (как get_residual) и точная матрица Якоби (вместо calc_Jacobian_matrix) в точке params за один проход интегрирования.
+    Траектории traj при этом устанавливаются параметры params. Вычисления те же, что в calc_residual_and_Jacobian_batch,
+    но для одной траектории: коэффициенты берутся из traj, а моменты считаются одним вызовом integrator.moments.
+
+        traj: траектория между фиксированными состояниями start, goal,
+        params: вектор текущих значений параметров траектории k1, k2, log_length.
+    """
+
+    traj.set_curve_params(*params)
+    a, b, c, L = float(traj.a), float(traj.b), float(traj.c), float(traj.length)
+    coefs = [traj.start.theta, traj.k0, a/2, b/3, c/4]
+    if not all(map(math.isfinite, coefs + [L])):  # как в пакетной версии: для недопустимых параметров - нечисловые значения
+        return np.full(3, np.nan), np.full((3, 3), np.nan)
+    moments_cos, moments_sin = traj.integrator.moments(coefs, L)  # единственный проход квадратуры
+    mc, ms = moments_cos.tolist(), moments_sin.tolist()
+
+    theta_f = coefs[0] + L * (coefs[1] + L * (coefs[2] + L * (coefs[3] + L * coefs[4])))  # угол направления в конце траектории
+    residual = np.array([traj.goal.x - (traj.start.x + mc[0]), traj.goal.y - (traj.start.y + ms[0]), traj.goal.theta - theta_f])
+
+    # производные конечных x, y, theta по коэффициентам (a, b, c) и коэффициентов по параметрам (k1, k2, log_length)
+    L2 = L * L
+    L3 = L2 * L
+    d_final_d_coef = np.array([[-ms[2] / 2, -ms[3] / 3, -ms[4] / 4],
+                               [mc[2] / 2, mc[3] / 3, mc[4] / 4],
+                               [L2 / 2, L3 / 3, L2 * L2 / 4]])
+    d_coef_d_params = np.array([[_D_COEF[0][0] / L, _D_COEF[0][1] / L, -a],
+                                [_D_COEF[1][0] / L2, _D_COEF[1][1] / L2, -2 * b],
+                                [_D_COEF[2][0] / L3, _D_COEF[2][1] / L3, -3 * c]])
+    d_final = d_final_d_coef @ d_coef_d_params
+    end = (math.cos(theta_f), math.sin(theta_f)) if math.isfinite(theta_f) else (math.nan, math.nan)  # math.cos(inf) - исключение
+    d_final[:, 2] += (L * end[0], L * end[1], L * traj.goal.k)  # L - верхний предел, dL/dlog_length = L
+    return residual, -d_final  # невязка = goal - final
+
+
 
-    return steps, traj.set_curve_params(*params)  # возвращаем найденную траекторию (с найденными параметрами)
+# стадии профилирования (см. common/PRIM_profiling.py)
+register_stages(sys.modules[__name__], {
+    "coef_params_batch": "reparameterization",
+    "get_residual": "residual", "get_residual_batch": "residual",
+    "calc_Jacobian_matrix": "jacobian", "calc_Jacobian_matrix_batch": "jacobian",
+    "calc_residual_and_Jacobian": "jacobian", "calc_residual_and_Jacobian_batch": "jacobian",
+    "newton_directions_batch": "newton_update",
+})